@@ -0,0 +1,62 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import asyncio
+import sys
+
+from telemetrix import telemetrix_aio
+
+"""
+Setup a pin for digital output 
+and toggle the pin 5 times using the asyncio client.
+"""
+
+# some globals
+DIGITAL_PIN = 13  # the board LED
+
+
+async def blink(my_board, pin):
+    """
+    This function will to toggle a digital pin.
+
+    :param my_board: a TelemetrixAIO instance
+    :param pin: pin to be controlled
+    """
+    await my_board.start_aio()
+
+    # set the pin mode
+    my_board.set_pin_mode_digital_output(pin)
+
+    # toggle the pin 4 times and exit
+    for x in range(4):
+        print('ON')
+        my_board.digital_write(pin, 1)
+        await asyncio.sleep(1)
+        print('OFF')
+        my_board.digital_write(pin, 0)
+        await asyncio.sleep(1)
+
+    await my_board.shutdown()
+
+
+# Create a TelemetrixAIO instance.
+board = telemetrix_aio.TelemetrixAIO()
+try:
+    asyncio.run(blink(board, DIGITAL_PIN))
+except KeyboardInterrupt:
+    board.shutdown()
+    sys.exit(0)
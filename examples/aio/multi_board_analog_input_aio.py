@@ -0,0 +1,92 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import asyncio
+import sys
+import time
+
+from telemetrix import telemetrix_aio
+
+"""
+Monitor an analog input pin on several boards from a single event loop.
+
+Each board must have its Telemetrix4Arduino sketch configured with a
+unique arduino_instance_id. The callback is a coroutine function.
+"""
+
+# arduino_instance_id of each board
+INSTANCE_IDS = [1, 2]
+
+ANALOG_PIN = 2  # arduino pin number (A2)
+
+# Callback data indices
+CB_PIN_MODE = 0
+CB_PIN = 1
+CB_VALUE = 2
+CB_TIME = 3
+
+
+def make_callback(instance_id):
+    """
+    Create a coroutine callback that identifies the board.
+
+    :param instance_id: arduino_instance_id of the board
+    """
+
+    async def the_callback(data):
+        """
+        A callback function to report data changes.
+
+        :param data: [pin_mode, pin, current reported value, timestamp]
+        """
+        date = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(data[CB_TIME]))
+        print(f'Board: {instance_id} Pin: {data[CB_PIN]} Value: {data[CB_VALUE]} '
+              f'Time Stamp: {date}')
+
+    return the_callback
+
+
+async def analog_in(my_boards, pin):
+    """
+    Start all boards and monitor an analog pin on each.
+
+    :param my_boards: a list of TelemetrixAIO instances
+    :param pin: Arduino pin number
+    """
+    # Boards are started one at a time so that each serial port
+    # search skips the ports already claimed by previous boards.
+    for my_board in my_boards:
+        await my_board.start_aio()
+
+    for my_board in my_boards:
+        my_board.set_pin_mode_analog_input(
+            pin, differential=5,
+            callback=make_callback(my_board.arduino_instance_id))
+
+    print('Enter Control-C to quit.')
+    while True:
+        await asyncio.sleep(1)
+
+
+boards = [telemetrix_aio.TelemetrixAIO(arduino_instance_id=instance_id)
+          for instance_id in INSTANCE_IDS]
+try:
+    asyncio.run(analog_in(boards, ANALOG_PIN))
+except KeyboardInterrupt:
+    for board in boards:
+        board.shutdown()
+    sys.exit(0)
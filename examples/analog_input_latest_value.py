@@ -0,0 +1,61 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import sys
+import time
+
+from telemetrix import telemetrix
+
+"""
+Monitor a fast changing analog input pin without handling every report.
+The main loop polls the latest value of one pin, and the callback
+of another pin is called at most twice a second with its latest value.
+"""
+
+POLLED_PIN = 2  # arduino pin number (A2)
+CALLBACK_PIN = 3  # arduino pin number (A3)
+
+# Callback data indices
+CB_PIN_MODE = 0
+CB_PIN = 1
+CB_VALUE = 2
+CB_TIME = 3
+
+
+def the_callback(data):
+    """
+    :param data: [pin_mode, pin, current reported value, timestamp]
+    """
+    print(f'Callback Pin: {data[CB_PIN]} Value: {data[CB_VALUE]}')
+
+
+board = telemetrix.Telemetrix()
+
+board.set_callback_rate_limit(2)
+
+board.set_pin_mode_analog_input(POLLED_PIN)
+board.set_pin_mode_analog_input(CALLBACK_PIN, callback=the_callback)
+
+print('Enter Control-C to quit.')
+try:
+    while True:
+        time.sleep(1)
+        print(f'Polled Pin: {POLLED_PIN} Value: {board.analog_value(POLLED_PIN)}')
+except KeyboardInterrupt:
+    board.shutdown()
+    sys.exit(0)
@@ -0,0 +1,78 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import sys
+import time
+
+from telemetrix import telemetrix
+from telemetrix.private_constants import PrivateConstants
+
+"""
+Monitor an analog input pin with a callback that is too slow to be
+called by the reporter thread, such as one that stores each value in
+a database. The 'ordered' callback policy runs the callback on a
+worker thread of its own, so that digital input reports continue to
+be processed without delay.
+"""
+
+ANALOG_PIN = 2  # arduino pin number (A2)
+DIGITAL_PIN = 12  # arduino pin number
+
+# Callback data indices
+CB_PIN_MODE = 0
+CB_PIN = 1
+CB_VALUE = 2
+CB_TIME = 3
+
+
+def store_analog_value(data):
+    """
+    Simulate storing the value in a slow database.
+
+    :param data: [pin_mode, pin, current reported value, timestamp]
+    """
+    time.sleep(.1)
+    print(f'Stored Pin: {data[CB_PIN]} Value: {data[CB_VALUE]}')
+
+
+def digital_callback(data):
+    """
+    :param data: [pin_mode, pin, current reported value, timestamp]
+    """
+    print(f'Digital Pin: {data[CB_PIN]} Value: {data[CB_VALUE]}')
+
+
+board = telemetrix.Telemetrix()
+
+# analog callbacks run in order on their own worker thread
+board.set_callback_policy('ordered', [PrivateConstants.ANALOG_REPORT])
+
+board.set_pin_mode_analog_input(ANALOG_PIN, differential=5,
+                                callback=store_analog_value)
+board.set_pin_mode_digital_input(DIGITAL_PIN, callback=digital_callback)
+
+print('Enter Control-C to quit.')
+try:
+    while True:
+        time.sleep(5)
+        metrics = board.get_callback_metrics()[PrivateConstants.ANALOG_REPORT]
+        print(f'Analog callbacks waiting: {metrics["pending"]} '
+              f'(maximum {metrics["maximum_pending"]})')
+except KeyboardInterrupt:
+    board.shutdown()
+    sys.exit(0)
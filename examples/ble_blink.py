@@ -0,0 +1,60 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import sys
+import time
+
+from telemetrix import telemetrix
+
+"""
+Setup a pin for digital output on a Bluetooth LE connected board
+and toggle the pin 5 times.
+
+The board must provide a Nordic UART style service.
+"""
+
+# some globals
+DIGITAL_PIN = 6  # the board LED
+
+# Bluetooth address of the board. Use "bleak-lescan" to find it.
+BLE_ADDRESS = '00:11:22:33:44:55'
+
+# Create a Telemetrix instance.
+board = telemetrix.Telemetrix(ble_address=BLE_ADDRESS)
+
+# Set the DIGITAL_PIN as an output pin
+board.set_pin_mode_digital_output(DIGITAL_PIN)
+
+# Blink the LED and provide feedback as
+# to the LED state on the console.
+for blink in range(5):
+    # When hitting control-c to end the program
+    # in this loop, we are likely to get a KeyboardInterrupt
+    # exception. Catch the exception and exit gracefully.
+    try:
+        print('1')
+        board.digital_write(DIGITAL_PIN, 1)
+        time.sleep(1)
+        print('0')
+        board.digital_write(DIGITAL_PIN, 0)
+        time.sleep(1)
+    except KeyboardInterrupt:
+        board.shutdown()
+        sys.exit(0)
+
+board.shutdown()
@@ -0,0 +1,54 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import sys
+import time
+
+from telemetrix import telemetrix
+
+"""
+Setup a bank of 8 pins for digital output.
+Alternate the even and odd pins, changing all 8 pins at once,
+and then run a chaser pattern using a bit mask.
+"""
+
+# some globals
+DIGITAL_PINS = [2, 3, 4, 5, 6, 7, 8, 9]
+
+# Create a Telemetrix instance.
+board = telemetrix.Telemetrix()
+
+for pin in DIGITAL_PINS:
+    board.set_pin_mode_digital_output(pin)
+
+try:
+    # all pins change within the same pass of the sketch's loop
+    for flip in range(10):
+        board.digital_write_many({pin: (index + flip) % 2
+                                  for index, pin in enumerate(DIGITAL_PINS)})
+        time.sleep(.5)
+
+    # bit n of the mask sets DIGITAL_PINS[n]
+    for step in range(3 * len(DIGITAL_PINS)):
+        board.digital_write_mask(DIGITAL_PINS, 1 << (step % len(DIGITAL_PINS)))
+        time.sleep(.1)
+
+    board.digital_write_mask(DIGITAL_PINS, 0)
+    board.shutdown()
+except KeyboardInterrupt:
+    board.shutdown()
+    sys.exit(0)
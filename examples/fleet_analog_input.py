@@ -0,0 +1,70 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import sys
+import time
+
+from telemetrix import telemetrix_fleet
+
+"""
+Monitor an analog input pin on several boards that share
+a single receive thread.
+"""
+
+# The arduino_instance_id of each board. Each board must be
+# flashed with a unique id.
+INSTANCE_IDS = [1, 2]
+
+ANALOG_PIN = 2  # arduino pin number (A2)
+
+# Callback data indices
+CB_PIN_MODE = 0
+CB_PIN = 1
+CB_VALUE = 2
+CB_TIME = 3
+
+
+def make_callback(instance_id):
+    """
+    Create a callback that reports data changes for one board.
+
+    :param instance_id: arduino_instance_id of the board
+    """
+
+    def the_callback(data):
+        date = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(data[CB_TIME]))
+        print(f'Board: {instance_id} Pin: {data[CB_PIN]} Value: {data[CB_VALUE]} '
+              f'Time Stamp: {date}')
+
+    return the_callback
+
+
+fleet = telemetrix_fleet.TelemetrixFleet()
+
+try:
+    for board_id in INSTANCE_IDS:
+        board = fleet.add_board(arduino_instance_id=board_id)
+        board.set_pin_mode_analog_input(ANALOG_PIN, differential=5,
+                                        callback=make_callback(board_id))
+
+    print('Enter Control-C to quit.')
+    while True:
+        time.sleep(1)
+except KeyboardInterrupt:
+    fleet.shutdown()
+    sys.exit(0)
@@ -20,6 +20,7 @@ This example demonstrates OneWire operations by reading a
 DS18B20 or DS1822 temperature sensor.
 """
 
+import concurrent.futures
 import serial
 import sys
 import time
@@ -75,8 +76,9 @@ class OneWireTemp:
         self.board.set_pin_mode_one_wire(self.pin)
 
         # find the devices address
-        self.board.onewire_search(self.onewire_callback)
-        time.sleep(.3)
+        # each request returns a future, so wait for the reply
+        # instead of sleeping
+        self.wait_for_replies(self.board.onewire_search(self.onewire_callback))
 
         if not self.address:
             print('Did not receive address')
@@ -85,8 +87,11 @@ class OneWireTemp:
 
         # check crc of the address
         # the callback does the actual compare
-        self.board.onewire_crc8(list(self.address), self.onewire_callback)
-        time.sleep(.3)
+        if not self.wait_for_replies(
+                self.board.onewire_crc8(list(self.address), self.onewire_callback)):
+            print('Did not receive crc')
+            self.board.shutdown()
+            sys.exit(0)
 
         # identify and print the chip type based on the address
         chip_type = self.chip_types[self.address[0]]
@@ -119,10 +124,13 @@ class OneWireTemp:
                 # read the data from the scratch pad
                 self.board.onewire_write(0xBE)
 
-                for x in range(10):
-                    self.board.onewire_read(self.onewire_callback)
+                reads = [self.board.onewire_read(self.onewire_callback)
+                         for x in range(10)]
 
-                time.sleep(.3)
+                if not self.wait_for_replies(*reads):
+                    print('Did not receive the scratch pad data\n')
+                    self.temperature_data = []
+                    continue
 
                 # the temperature is contained in the first two bytes of the data
                 raw = (self.temperature_data[1] << 8) | self.temperature_data[0]
@@ -137,6 +145,25 @@ class OneWireTemp:
                 self.board.shutdown()
                 sys.exit(0)
 
+    def wait_for_replies(self, *futures):
+        """
+        Wait for the replies to requests. If they do not arrive, the
+        requests are cancelled, so that replies arriving later are not
+        matched to them.
+
+        :param futures: the futures returned by the requests
+
+        :return: True if all of the replies were received
+        """
+        try:
+            for future in futures:
+                future.result(timeout=1)
+            return True
+        except concurrent.futures.TimeoutError:
+            for future in futures:
+                future.cancel()
+            return False
+
     def onewire_callback(self, report):
         # This is the main callback distributor.
         # Call the specific handler to service the callback
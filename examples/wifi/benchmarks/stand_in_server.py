@@ -0,0 +1,172 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+"""
+A minimal stand-in for a Telemetrix4Esp8266 server, used by the
+benchmarks in this directory. It listens on a loopback port and
+answers just enough of the protocol for a Telemetrix client to connect.
+
+Analog inputs that are enabled by the client are reported continuously,
+as fast as the connection allows, so that the client receive path is
+the bottleneck being measured.
+
+When the client enables udp reporting, the reports are sent as
+datagrams instead. Each datagram holds a 16 bit sequence number
+followed by as many complete reports as fit.
+"""
+
+import socket
+import threading
+import time
+
+# commands understood by the stand-in
+LOOP_COMMAND = 0
+SET_PIN_MODE = 1
+GET_FIRMWARE_VERSION = 5
+ARE_U_THERE = 6
+STOP_ALL_REPORTS = 15
+GET_FEATURES = 54
+ANALOG_BLOCK_REPORTING = 60
+SET_UDP_REPORTING = 62
+
+AT_ANALOG = 3
+
+# reports sent by the stand-in
+ANALOG_REPORT = 3
+FIRMWARE_REPORT = 5
+I_AM_HERE_REPORT = 6
+FEATURES = 20
+ANALOG_BLOCK_REPORT = 21
+
+# number of analog reports packed into each socket write
+REPORTS_PER_WRITE = 64
+
+# maximum udp payload, chosen to fit an ethernet frame
+UDP_DATAGRAM_SIZE = 1400
+
+
+class StandInServer:
+    """
+    Accept a single Telemetrix client connection on the loopback interface.
+    """
+
+    def __init__(self, ip_port=0):
+        """
+
+        :param ip_port: port to listen on. 0 selects a free port.
+        """
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('127.0.0.1', ip_port))
+        self.listener.listen(1)
+        self.ip_port = self.listener.getsockname()[1]
+
+        self.analog_pins = []
+        self.block_reports = False
+        self.streaming = threading.Event()
+        self.connection = None
+
+        # set when the client has enabled udp reporting
+        self.udp_address = None
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_sequence = 0
+
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        self.connection, _ = self.listener.accept()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=self._stream_analog_reports, daemon=True).start()
+
+        pending = bytearray()
+        while True:
+            try:
+                data = self.connection.recv(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            pending += data
+            while pending and len(pending) > pending[0]:
+                command = bytes(pending[1:pending[0] + 1])
+                del pending[:pending[0] + 1]
+                self._process_command(command)
+        self.streaming.clear()
+
+    def _process_command(self, command):
+        if command[0] == LOOP_COMMAND:
+            self.connection.sendall(bytes([2, LOOP_COMMAND, command[1]]))
+        elif command[0] == GET_FIRMWARE_VERSION:
+            self.connection.sendall(bytes([4, FIRMWARE_REPORT, 1, 0, 0]))
+        elif command[0] == ARE_U_THERE:
+            self.connection.sendall(bytes([2, I_AM_HERE_REPORT, 1]))
+        elif command[0] == GET_FEATURES:
+            self.connection.sendall(bytes([2, FEATURES, 0xff]))
+        elif command[0] == SET_PIN_MODE and command[2] == AT_ANALOG:
+            self.analog_pins.append(command[1])
+            self.streaming.set()
+        elif command[0] == ANALOG_BLOCK_REPORTING:
+            self.block_reports = bool(command[1])
+        elif command[0] == SET_UDP_REPORTING:
+            if command[1]:
+                self.udp_sequence = 0
+                self.udp_address = (self.connection.getpeername()[0],
+                                    (command[2] << 8) | command[3])
+            else:
+                self.udp_address = None
+        elif command[0] == STOP_ALL_REPORTS:
+            self.streaming.clear()
+
+    def _stream_analog_reports(self):
+        value = 0
+        while True:
+            self.streaming.wait()
+            report_block = bytearray()
+            for _ in range(REPORTS_PER_WRITE):
+                scan = bytearray()
+                for pin in self.analog_pins:
+                    value = (value + 1) & 0x3ff
+                    scan += bytes([pin, value >> 8, value & 0xff])
+                if self.block_reports:
+                    report_block += bytes([len(scan) + 1, ANALOG_BLOCK_REPORT])
+                    report_block += scan
+                else:
+                    for index in range(0, len(scan), 3):
+                        report_block += bytes([4, ANALOG_REPORT])
+                        report_block += scan[index:index + 3]
+            try:
+                if self.udp_address:
+                    self._send_datagrams(report_block)
+                else:
+                    self.connection.sendall(report_block)
+            except OSError:
+                break
+
+    def _send_datagrams(self, report_block):
+        offset = 0
+        while offset < len(report_block):
+            # whole reports only, frames never span datagrams
+            end = offset
+            while end < len(report_block) and \
+                    end + report_block[end] + 1 - offset <= UDP_DATAGRAM_SIZE - 2:
+                end += report_block[end] + 1
+            datagram = bytes([self.udp_sequence >> 8, self.udp_sequence & 0xff])
+            self.udp_socket.sendto(datagram + report_block[offset:end], self.udp_address)
+            self.udp_sequence = (self.udp_sequence + 1) & 0xffff
+            offset = end
+            # udp has no flow control, so let the client threads run
+            time.sleep(0)
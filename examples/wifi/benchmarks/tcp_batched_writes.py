@@ -0,0 +1,97 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import statistics
+import sys
+import time
+
+from telemetrix import telemetrix
+
+from stand_in_server import StandInServer
+
+"""
+Compare the cost of a control tick that sets 20 digital outputs when
+each command is written separately and when the tick is sent as a batch.
+
+A stand-in server on the loopback interface accepts the commands,
+so no hardware is required.
+Run this script from within its directory.
+"""
+
+# digital outputs updated on each tick
+OUTPUT_PINS = range(2, 22)
+
+# number of ticks measured for each mode
+NUMBER_OF_TICKS = 2000
+
+
+def run_ticks(board, batched):
+    """
+    Send NUMBER_OF_TICKS ticks and return the time taken by each tick.
+
+    :param board: a connected Telemetrix instance
+
+    :param batched: send each tick within board.batch()
+    """
+    tick_times = []
+    for tick in range(NUMBER_OF_TICKS):
+        start = time.perf_counter()
+        if batched:
+            with board.batch():
+                for pin in OUTPUT_PINS:
+                    board.digital_write(pin, tick & 1)
+        else:
+            for pin in OUTPUT_PINS:
+                board.digital_write(pin, tick & 1)
+        tick_times.append(time.perf_counter() - start)
+    return tick_times
+
+
+def report(title, tick_times, writes):
+    """
+    Print the writes per tick and the tick time distribution.
+
+    :param title: measurement title
+
+    :param tick_times: time taken by each tick in seconds
+
+    :param writes: transport writes used by all ticks
+    """
+    tick_times = sorted(t * 1000000 for t in tick_times)
+    print(f'\n{title}')
+    print(f'Writes per tick: {writes / NUMBER_OF_TICKS:.1f}')
+    print(f'Tick time: median {statistics.median(tick_times):.1f} us, '
+          f'99th percentile {tick_times[int(.99 * len(tick_times))]:.1f} us')
+
+
+server = StandInServer()
+board = telemetrix.Telemetrix(ip_address='127.0.0.1', ip_port=server.ip_port)
+
+try:
+    for pin in OUTPUT_PINS:
+        board.set_pin_mode_digital_output(pin)
+
+    for title, batched in (('One write per command', False),
+                           ('One write per tick', True)):
+        start_writes = board.transport_writes
+        times = run_ticks(board, batched)
+        report(title, times, board.transport_writes - start_writes)
+
+    board.shutdown()
+except KeyboardInterrupt:
+    board.shutdown()
+    sys.exit(0)
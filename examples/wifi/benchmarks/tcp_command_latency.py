@@ -0,0 +1,92 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import statistics
+import sys
+import time
+
+from telemetrix import telemetrix
+
+from stand_in_server import StandInServer
+
+"""
+Measure the time from sending a command to receiving the loop back
+reply that follows it, with Nagle's algorithm enabled and disabled
+on the client socket.
+
+Each round sends a digital write followed by a loop back request,
+as a control loop that updates an output and then waits for the
+server would. With Nagle's algorithm enabled, the loop back request
+is held back until the digital write has been acknowledged.
+
+A stand-in server on the loopback interface answers the requests,
+so no hardware is required.
+Run this script from within its directory.
+"""
+
+DIGITAL_PIN = 6
+
+# number of rounds measured for each mode
+NUMBER_OF_ROUNDS = 200
+
+
+def run_rounds(board):
+    """
+    Send NUMBER_OF_ROUNDS rounds and return the latency of each round.
+
+    :param board: a connected Telemetrix instance
+    """
+    latencies = []
+    for round_number in range(NUMBER_OF_ROUNDS):
+        start = time.perf_counter()
+        board.digital_write(DIGITAL_PIN, round_number & 1)
+        board.loop_back('a').result()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(title, latencies):
+    """
+    Print the latency distribution.
+
+    :param title: measurement title
+
+    :param latencies: latency of each round in seconds
+    """
+    latencies = sorted(t * 1000 for t in latencies)
+    print(f'\n{title}')
+    print(f'Command to reply latency: median {statistics.median(latencies):.3f} ms, '
+          f'99th percentile {latencies[int(.99 * len(latencies))]:.3f} ms, '
+          f'maximum {latencies[-1]:.3f} ms')
+
+
+results = []
+for title, nodelay in (('Nagle enabled', False),
+                       ('Nagle disabled (TCP_NODELAY)', True)):
+    server = StandInServer()
+    board = telemetrix.Telemetrix(ip_address='127.0.0.1', ip_port=server.ip_port,
+                                  tcp_nodelay=nodelay)
+    try:
+        board.set_pin_mode_digital_output(DIGITAL_PIN)
+        results.append((title, run_rounds(board)))
+        board.shutdown()
+    except KeyboardInterrupt:
+        board.shutdown()
+        sys.exit(0)
+
+for title, latencies in results:
+    report(title, latencies)
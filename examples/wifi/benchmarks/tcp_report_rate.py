@@ -0,0 +1,105 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import sys
+import time
+
+from telemetrix import telemetrix
+
+from stand_in_server import StandInServer
+
+"""
+Measure how many analog reports per second the tcp receive path
+can deliver to a callback.
+
+A stand-in server on the loopback interface streams analog reports
+as fast as the connection allows, so no hardware is required.
+Run this script from within its directory.
+
+Run with --block to have the values of each scan delivered in one
+analog block report.
+
+Run with --udp to have the reports sent as udp datagrams. Datagrams
+that the client cannot keep up with are dropped, and are counted as lost.
+"""
+
+# number of analog pins streamed by the stand-in server
+NUMBER_OF_PINS = 16
+
+# length of each measurement in seconds
+MEASUREMENT_TIME = 5
+
+report_count = 0
+
+
+def the_callback(data):
+    """
+    Count each analog report received.
+
+    :param data: [pin_type, pin_number, pin_value, raw_time_stamp]
+    """
+    global report_count
+    report_count += 1
+
+
+def the_block_callback(data):
+    """
+    Count each analog value in a block report.
+
+    :param data: [pin_type, [pin_number, ...], [pin_value, ...], raw_time_stamp]
+    """
+    global report_count
+    report_count += len(data[1])
+
+
+server = StandInServer()
+if '--udp' in sys.argv:
+    board = telemetrix.Telemetrix(ip_address='127.0.0.1', ip_port=server.ip_port,
+                                  udp_port=0)
+else:
+    board = telemetrix.Telemetrix(ip_address='127.0.0.1', ip_port=server.ip_port)
+
+try:
+    if '--block' in sys.argv:
+        board.enable_analog_block_reporting(the_block_callback)
+
+    for pin in range(NUMBER_OF_PINS):
+        board.set_pin_mode_analog_input(pin, callback=the_callback)
+
+    # let the stream settle before measuring
+    time.sleep(1)
+    start_count = report_count
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+
+    time.sleep(MEASUREMENT_TIME)
+
+    elapsed = time.perf_counter() - start_time
+    cpu = time.process_time() - start_cpu
+    received = report_count - start_count
+
+    print(f'\nValues received: {received} in {elapsed:.2f} seconds')
+    print(f'Values per second: {received / elapsed:.0f}')
+    print(f'Client cpu time: {cpu:.2f} seconds ({100 * cpu / elapsed:.0f}%)')
+    if '--udp' in sys.argv:
+        print(f'Datagrams received: {board.udp_datagrams_received} '
+              f'lost: {board.udp_datagrams_lost} '
+              f'stale: {board.udp_datagrams_stale}')
+    board.shutdown()
+except KeyboardInterrupt:
+    board.shutdown()
+    sys.exit(0)
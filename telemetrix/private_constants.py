@@ -80,6 +80,12 @@ class PrivateConstants:
     GET_FEATURES = 54
     SONAR_DISABLE = 55
     SONAR_ENABLE = 56
+    I2C_START_PERIODIC_READ = 57
+    I2C_STOP_PERIODIC_READ = 58
+    DIGITAL_WRITE_MULTI = 59  # set several digital pins with a single command
+    ANALOG_BLOCK_REPORTING = 60  # report each analog scan in a single frame
+    SET_BAUD_RATE = 61  # switch the serial link to a new baud rate
+    SET_UDP_REPORTING = 62  # send reports to the client as udp datagrams
 
     # reports
     # debug data from Arduino
@@ -101,6 +107,8 @@ class PrivateConstants:
     STEPPER_RUNNING_REPORT = 18
     STEPPER_RUN_COMPLETE_REPORT = 19
     FEATURES = 20
+    ANALOG_BLOCK_REPORT = 21
+    BAUD_RATE_REPORT = 22
     DEBUG_PRINT = 99
 
     TELEMETRIX_VERSION = "1.46"
@@ -134,6 +142,41 @@ class PrivateConstants:
     # maximum number of DHT devices allowed
     MAX_DHTS = 6
 
+    # maximum number of pin/value pairs in a DIGITAL_WRITE_MULTI command
+    MAX_DIGITAL_WRITE_MULTI_PINS = 14
+
+    # delay before the first reconnect attempt, doubled after each
+    # failed attempt up to the maximum, in seconds
+    RECONNECT_INITIAL_DELAY = 0.1
+    RECONNECT_MAXIMUM_DELAY = 5
+
+    # seconds that a request waits for its reply before a newer request
+    # for the same reply takes its place
+    REQUEST_LIFETIME = 5
+
+    # number of bytes requested from the socket for each tcp receive
+    TCP_RECEIVE_BUFFER_SIZE = 4096
+
+    # size of the buffer that each udp datagram is received into
+    UDP_RECEIVE_BUFFER_SIZE = 65536
+
+    # each udp report datagram starts with a 16 bit sequence number
+    UDP_SEQUENCE_NUMBER_SIZE = 2
+    UDP_SEQUENCE_MODULUS = 0x10000
+
+    # Nordic UART service used for Bluetooth LE boards
+    BLE_SERVICE_UUID = '6e400001-b5a3-f393-e0a9-e50e24dcca9e'
+    # written by the client
+    BLE_RX_CHARACTERISTIC_UUID = '6e400002-b5a3-f393-e0a9-e50e24dcca9e'
+    # notified by the server
+    BLE_TX_CHARACTERISTIC_UUID = '6e400003-b5a3-f393-e0a9-e50e24dcca9e'
+
+    # payload bytes of a BLE packet at the default MTU of 23
+    BLE_MINIMUM_PACKET_SIZE = 20
+
+    # seconds to wait for a BLE connection
+    BLE_CONNECT_TIMEOUT = 10
+
     # DHT Report sub-types
     DHT_DATA = 0
     DHT_ERROR = 1
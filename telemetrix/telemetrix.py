@@ -15,11 +15,19 @@
  Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 """
+import array
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import os
+import queue
 import socket
 import sys
 import threading
 import time
-from collections import deque
+import traceback
+from collections import OrderedDict, deque
 
 import serial
 # noinspection PyPackageRequirementscd
@@ -29,6 +37,8 @@ from serial.tools import list_ports
 
 # noinspection PyUnresolvedReferences
 from telemetrix.private_constants import PrivateConstants
+# noinspection PyUnresolvedReferences
+from telemetrix.telemetrix_ble import TelemetrixBleTransport
 
 
 class TelemetrixPortRegister:
@@ -52,6 +62,554 @@ class TelemetrixPortRegister:
         self.active.remove(port)
 
 
+class TelemetrixDiscoveryCache:
+    """
+    This class keeps an on-disk record of the arduino_instance_id and
+    firmware version last found on each USB serial device, so that
+    discovery can probe the expected port first.
+
+    Devices are identified by VID:PID and USB serial number, or by
+    VID:PID and USB location for devices without a serial number.
+    """
+
+    def __init__(self, file_path):
+        """
+
+        :param file_path: path of the JSON cache file
+        """
+        self.file_path = file_path
+        self.entries = self._load()
+
+        # entries changed by this process, merged into the file on save
+        self.updates = {}
+
+    def _load(self):
+        try:
+            with open(self.file_path) as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    @staticmethod
+    def device_key(port):
+        """
+        :param port: serial.tools.list_ports ListPortInfo
+
+        :return: key identifying the physical device
+        """
+        usb_id = f'{port.vid or 0:04x}:{port.pid or 0:04x}'
+        if port.serial_number:
+            return f'{usb_id}:{port.serial_number}'
+        return f'{usb_id}@{port.location}'
+
+    def lookup(self, port):
+        """
+        :param port: serial.tools.list_ports ListPortInfo
+
+        :return: the cached arduino_instance_id, or None
+        """
+        entry = self.entries.get(self.device_key(port))
+        if isinstance(entry, dict):
+            return entry.get('arduino_instance_id')
+        return None
+
+    def update(self, port, arduino_instance_id, firmware_version=None):
+        """
+        Record the board found on a device.
+
+        :param port: serial.tools.list_ports ListPortInfo
+
+        :param arduino_instance_id: id reported by the board
+
+        :param firmware_version: optional [major, minor, patch]
+        """
+        entry = {'arduino_instance_id': arduino_instance_id}
+        if firmware_version:
+            entry['firmware_version'] = list(firmware_version)
+        key = self.device_key(port)
+        self.entries[key] = entry
+        self.updates[key] = entry
+
+    def save(self):
+        """
+        Write the cache file. Entries written by other processes since
+        the file was loaded are kept. Errors are ignored, since the cache
+        only speeds up discovery.
+        """
+        if not self.updates:
+            return
+        entries = self._load()
+        entries.update(self.updates)
+        temporary_path = f'{self.file_path}.{os.getpid()}.tmp'
+        try:
+            with open(temporary_path, 'w') as cache_file:
+                json.dump(entries, cache_file, indent=1)
+            os.replace(temporary_path, self.file_path)
+            self.updates = {}
+        except OSError:
+            pass
+
+
+class TelemetrixReportFramer:
+    """
+    This class incrementally splits a received byte stream into
+    report frames.
+
+    Each report on the wire is a length byte followed by that many
+    bytes, the first of which is the report type. Chunks of any size
+    may be fed in. Each complete frame is passed to frame_handler as a
+    memoryview that starts with the report type. Frames are sliced out
+    of the received chunk, so no per-byte work is done in Python.
+    """
+
+    def __init__(self, frame_handler):
+        """
+
+        :param frame_handler: called with each complete report frame
+        """
+        self.frame_handler = frame_handler
+
+        # bytes of an incomplete frame carried over to the next chunk
+        self.pending = b''
+
+    def feed(self, chunk):
+        """
+        Process a chunk of received bytes.
+
+        :param chunk: bytes-like object containing received data
+        """
+        if self.pending:
+            data = self.pending + chunk
+        else:
+            data = bytes(chunk)
+
+        # the memoryview is taken over an immutable copy so that frames
+        # remain valid after this method returns
+        view = memoryview(data)
+        end = len(data)
+        offset = 0
+
+        while offset < end:
+            packet_length = data[offset]
+            if not packet_length:
+                self.pending = b''
+                raise RuntimeError('A report with a packet length of zero was received.')
+            if offset + packet_length >= end:
+                break
+            self.frame_handler(view[offset + 1:offset + packet_length + 1])
+            offset += packet_length + 1
+
+        self.pending = data[offset:]
+
+    def reset(self):
+        """
+        Discard any partially received frame.
+        """
+        self.pending = b''
+
+
+class TelemetrixRequestFuture(concurrent.futures.Future):
+    """
+    The future returned by a request method, such as i2c_read.
+
+    Replies are matched to requests in the order that the requests were
+    sent, so a request whose reply is no longer wanted must be
+    cancelled. Otherwise it would take the next reply, and each later
+    request would receive the reply meant for the one before it.
+
+    A call of result or exception that times out cancels the request.
+    """
+
+    def result(self, timeout=None):
+        """
+        :param timeout: maximum number of seconds to wait, or None
+
+        :return: the callback data list of the reply
+        """
+        try:
+            return super().result(timeout)
+        except concurrent.futures.TimeoutError:
+            if self.cancel():
+                raise
+            # the reply arrived after the wait timed out
+            return super().result()
+
+    def exception(self, timeout=None):
+        """
+        :param timeout: maximum number of seconds to wait, or None
+
+        :return: the exception raised by the request, or None
+        """
+        try:
+            return super().exception(timeout)
+        except concurrent.futures.TimeoutError:
+            if self.cancel():
+                raise
+            return super().exception()
+
+
+class TelemetrixCallbackExecutor:
+    """
+    This class runs user callbacks according to an execution policy,
+    so that slow callbacks do not delay the processing of reports.
+
+    The policies are:
+
+    'thread_pool' - callbacks run on a pool of threads. Calls may run
+    concurrently and complete out of order.
+
+    'ordered' - each callback function has a worker thread of its own.
+    The calls of a callback run in the order that the reports were
+    received, and a slow callback does not delay the others.
+
+    'process_pool' - callbacks run in a pool of processes, for cpu
+    heavy processing. The callback must be a module level function,
+    and it runs in another process, so it cannot use the board.
+
+    The number of calls waiting to run is tracked so that the queue
+    depth can be monitored.
+    """
+
+    POLICIES = ('thread_pool', 'ordered', 'process_pool')
+
+    def __init__(self, policy, max_workers=None):
+        """
+
+        :param policy: 'thread_pool', 'ordered' or 'process_pool'
+
+        :param max_workers: number of threads or processes in a pool.
+                            None selects the concurrent.futures default.
+        """
+        self.policy = policy
+
+        self.pool = None
+        if policy == 'thread_pool':
+            self.pool = concurrent.futures.ThreadPoolExecutor(max_workers)
+        elif policy == 'process_pool':
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers)
+
+        # a (queue, thread) pair for each callback of the ordered policy
+        self.workers = {}
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.maximum_pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, callback, data):
+        """
+        Queue a callback for execution.
+
+        :param callback: user callback function
+
+        :param data: callback data list
+        """
+        with self.lock:
+            self.pending += 1
+            self.maximum_pending = max(self.maximum_pending, self.pending)
+
+        if self.pool:
+            future = self.pool.submit(callback, data)
+            future.add_done_callback(self._pool_call_done)
+            return
+
+        worker = self.workers.get(callback)
+        if not worker:
+            worker_queue = queue.SimpleQueue()
+            worker_thread = threading.Thread(target=self._ordered_worker,
+                                             args=(callback, worker_queue))
+            worker_thread.daemon = True
+            worker = self.workers[callback] = (worker_queue, worker_thread)
+            worker_thread.start()
+        worker[0].put(data)
+
+    def metrics(self):
+        """
+        :return: a dictionary with the number of calls waiting or running,
+                 the largest number seen, and the number of calls that
+                 completed and that raised an exception
+        """
+        with self.lock:
+            return {'pending': self.pending,
+                    'maximum_pending': self.maximum_pending,
+                    'completed': self.completed,
+                    'failed': self.failed}
+
+    def shutdown(self):
+        """
+        Stop the workers. Calls that have not started are discarded.
+        """
+        if self.pool:
+            if sys.version_info >= (3, 9):
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            else:
+                self.pool.shutdown(wait=False)
+        for worker_queue, _ in self.workers.values():
+            worker_queue.put(None)
+
+    def _call_done(self, exception):
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+            if exception:
+                self.failed += 1
+        if exception:
+            traceback.print_exception(type(exception), exception,
+                                      exception.__traceback__)
+
+    def _pool_call_done(self, future):
+        if future.cancelled():
+            with self.lock:
+                self.pending -= 1
+            return
+        self._call_done(future.exception())
+
+    def _ordered_worker(self, callback, worker_queue):
+        while True:
+            data = worker_queue.get()
+            if data is None:
+                break
+            try:
+                callback(data)
+            except Exception as e:
+                self._call_done(e)
+            else:
+                self._call_done(None)
+
+
+class TelemetrixReportQueue:
+    """
+    A bounded queue of report frames, passed from the receive thread
+    to the reporter thread.
+
+    When the queue is full, the overflow policy decides what happens
+    to a new streaming report, that is, an analog, digital, sonar, dht
+    or analog block report:
+
+    'block' - the receive thread waits for room, so that the transport's
+    flow control slows the server down.
+
+    'drop_oldest' - the oldest queued streaming report is discarded.
+
+    'drop_newest' - the new report is discarded.
+
+    'coalesce' - the new report replaces the queued report of the same
+    type and pin, so that the latest value is processed. A report for a
+    pin that has no queued report is still queued, so the queue can
+    exceed its size by at most one report per pin.
+
+    Other reports, such as the replies to requests, are never dropped
+    or delayed.
+    """
+
+    POLICIES = ('block', 'drop_oldest', 'drop_newest', 'coalesce')
+
+    # the offset of the pin number in each type of streaming report, or
+    # None if a report applies to all pins
+    STREAMING_REPORTS = {PrivateConstants.ANALOG_REPORT: 1,
+                         PrivateConstants.DIGITAL_REPORT: 1,
+                         PrivateConstants.SONAR_DISTANCE: 1,
+                         PrivateConstants.DHT_REPORT: 2,
+                         PrivateConstants.ANALOG_BLOCK_REPORT: None}
+
+    def __init__(self, maximum_size, overflow_policy='block'):
+        """
+
+        :param maximum_size: maximum number of queued streaming reports
+
+        :param overflow_policy: 'block', 'drop_oldest', 'drop_newest'
+                                or 'coalesce'
+        """
+        self.maximum_size = maximum_size
+        self.overflow_policy = overflow_policy
+
+        # [key, frame] entries. The key identifies the report type and
+        # pin of a streaming report, and is None for other reports.
+        self.entries = deque()
+
+        # the queued entry of each streaming report key, for coalescing
+        self.latest_entries = {}
+
+        self.condition = threading.Condition(threading.Lock())
+
+        # set when the None entry that stops the reporter thread is queued
+        self.stopped = False
+
+        self.dropped_frames = 0
+        self.maximum_depth = 0
+
+    def put(self, frame):
+        """
+        Queue a report frame, applying the overflow policy if full.
+
+        :param frame: report frame, or None to stop the reporter thread
+        """
+        key = None
+        if frame is not None and frame[0] in self.STREAMING_REPORTS:
+            pin_offset = self.STREAMING_REPORTS[frame[0]]
+            key = (frame[0], frame[pin_offset] if pin_offset else None)
+
+        with self.condition:
+            if frame is None:
+                self.stopped = True
+            elif key and len(self.entries) >= self.maximum_size:
+                if self.overflow_policy == 'block':
+                    while len(self.entries) >= self.maximum_size and not self.stopped:
+                        self.condition.wait()
+                elif self.overflow_policy == 'drop_newest':
+                    self.dropped_frames += 1
+                    return
+                elif self.overflow_policy == 'drop_oldest':
+                    self._drop_oldest()
+                else:
+                    entry = self.latest_entries.get(key)
+                    if entry:
+                        entry[1] = frame
+                        self.dropped_frames += 1
+                        return
+
+            entry = [key, frame]
+            self.entries.append(entry)
+            if key and self.overflow_policy == 'coalesce':
+                self.latest_entries[key] = entry
+            self.maximum_depth = max(self.maximum_depth, len(self.entries))
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Wait for the next report frame.
+
+        :param timeout: maximum number of seconds to wait, or None
+
+        :return: report frame, or None if the reporter thread should stop
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.entries, timeout):
+                raise queue.Empty
+            entry = self.entries.popleft()
+            if entry[0] and self.latest_entries.get(entry[0]) is entry:
+                del self.latest_entries[entry[0]]
+            if self.overflow_policy == 'block':
+                # make room for a waiting receive thread
+                self.condition.notify_all()
+            return entry[1]
+
+    def metrics(self):
+        """
+        :return: a dictionary with the number of queued frames, the largest
+                 number seen, and the number of frames dropped
+        """
+        with self.condition:
+            return {'depth': len(self.entries),
+                    'maximum_depth': self.maximum_depth,
+                    'dropped_frames': self.dropped_frames}
+
+    def _drop_oldest(self):
+        for entry in self.entries:
+            if entry[0]:
+                self.entries.remove(entry)
+                if self.latest_entries.get(entry[0]) is entry:
+                    del self.latest_entries[entry[0]]
+                self.dropped_frames += 1
+                return
+
+
+class TelemetrixShadowTable:
+    """
+    This class keeps the latest reported value of each pin of one type,
+    with the time it was reported and a sequence number that counts the
+    reports received for the pin. The sequence number of a pin that has
+    not reported is 0.
+
+    The table is stored in arrays indexed by pin number. It is updated
+    only by the thread that dispatches reports, and is read without
+    taking a lock: reading a single pin is one array lookup, and
+    snapshot copies the arrays, retrying if an update ran while it was
+    copying.
+    """
+
+    def __init__(self, number_of_pins):
+        """
+
+        :param number_of_pins: number of pins in the table
+        """
+        self.values = array.array('l', [0]) * number_of_pins
+        self.timestamps = array.array('d', [0]) * number_of_pins
+        self.sequences = array.array('Q', [0]) * number_of_pins
+
+        # incremented before and after each update, so it is odd while an
+        # update is in progress
+        self.updates = 0
+
+    def update(self, pin, value, time_stamp):
+        """
+        Record a reported value. Pins outside of the table are ignored.
+
+        :param pin: pin number
+
+        :param value: reported value
+
+        :param time_stamp: time the value was reported
+        """
+        if pin >= len(self.values):
+            return
+        self.updates += 1
+        self.values[pin] = value
+        self.timestamps[pin] = time_stamp
+        self.sequences[pin] += 1
+        self.updates += 1
+
+    def update_pins(self, pins, values, time_stamp):
+        """
+        Record values reported together for several pins.
+
+        :param pins: pin numbers
+
+        :param values: reported values
+
+        :param time_stamp: time the values were reported
+        """
+        number_of_pins = len(self.values)
+        self.updates += 1
+        for pin, value in zip(pins, values):
+            if pin < number_of_pins:
+                self.values[pin] = value
+                self.timestamps[pin] = time_stamp
+                self.sequences[pin] += 1
+        self.updates += 1
+
+    def value(self, pin):
+        """
+        :param pin: pin number
+
+        :return: the latest value of the pin, or None if it has not reported
+        """
+        if pin >= len(self.values) or not self.sequences[pin]:
+            return None
+        return self.values[pin]
+
+    def snapshot(self):
+        """
+        Copy the table.
+
+        :return: values, timestamps and sequence numbers, each an array
+                 indexed by pin number
+        """
+        while True:
+            updates = self.updates
+            if updates % 2:
+                # an update is in progress
+                time.sleep(0)
+                continue
+            values = self.values[:]
+            timestamps = self.timestamps[:]
+            sequences = self.sequences[:]
+            if updates == self.updates:
+                return values, timestamps, sequences
+
+
 # noinspection PyPep8,PyMethodMayBeStatic,GrazieInspection,PyBroadException,PyCallingNonCallable,PyTypeChecker
 class Telemetrix(threading.Thread):
     """
@@ -62,11 +620,27 @@ class Telemetrix(threading.Thread):
 
     """
 
+    # reports whose latest value is kept for each pin, and whose
+    # callbacks may be rate limited
+    LATEST_VALUE_REPORTS = (PrivateConstants.ANALOG_REPORT,
+                            PrivateConstants.DIGITAL_REPORT,
+                            PrivateConstants.SONAR_DISTANCE)
+
     # noinspection PyPep8,PyPep8,PyPep8
     def __init__(self, com_port=None, arduino_instance_id=1,
                  arduino_wait=4, sleep_tune=0.000001,
                  shutdown_on_exception=True,
-                 ip_address=None, ip_port=31335):
+                 ip_address=None, ip_port=31335,
+                 write_coalesce_interval=0,
+                 handshake_timeout=0.5, handshake_retries=2,
+                 discovery_cache=None, reset_on_connect=True,
+                 auto_reconnect=False, baud_rate=115200,
+                 negotiated_baud_rate=None, fleet=None, ble_address=None,
+                 ble_client_class=None, udp_port=None,
+                 tcp_nodelay=True, tcp_receive_buffer_size=None,
+                 tcp_send_buffer_size=None, tcp_keepalive=None,
+                 tcp_connect_timeout=5, report_queue_size=0,
+                 report_queue_policy='block'):
 
         self.serial_port_register = TelemetrixPortRegister()
         """
@@ -78,10 +652,12 @@ class Telemetrix(threading.Thread):
         :param arduino_instance_id: Match with the value installed on the
                                     arduino-telemetrix sketch.
 
-        :param arduino_wait: Amount of time to wait for an Arduino to
-                             fully reset itself.
+        :param arduino_wait: Maximum amount of time to wait for an Arduino
+                             to reset itself and reply. The connection
+                             continues as soon as the Arduino replies.
 
-        :param sleep_tune: A tuning parameter (typically not changed by user)
+        :param sleep_tune: Retained for backwards compatibility. Received data
+                           is now event driven and this value is not used.
 
         :param shutdown_on_exception: call shutdown before raising
                                       a RunTimeError exception, or
@@ -90,27 +666,169 @@ class Telemetrix(threading.Thread):
         :param ip_address: ip address of tcp/ip connected device.
 
         :param ip_port: ip port of tcp/ip connected device
+
+        :param write_coalesce_interval: When non-zero, commands are not
+                                        written immediately. Commands sent
+                                        within this many seconds of each
+                                        other are coalesced and written to
+                                        the transport in a single write.
+
+        :param handshake_timeout: Time in seconds to wait for the server
+                                  to reply to each startup request.
+
+        :param handshake_retries: Number of times a startup request is
+                                  repeated if no reply is received.
+
+        :param discovery_cache: Path of a file used to remember which
+                                serial device each arduino_instance_id was
+                                found on. When set, discovery probes the
+                                remembered device first and scans all
+                                ports only if the board is not found there.
+
+        :param reset_on_connect: If False, serial ports are opened with DTR
+                                 and RTS held low, so that a board with
+                                 auto-reset keeps running its sketch.
+                                 Where the platform briefly raises DTR on
+                                 open and the board resets anyway, the
+                                 connection waits for it as usual.
+
+        :param auto_reconnect: If True, a lost serial or tcp/ip connection
+                               is restored automatically, and the pin modes
+                               and device configuration set by the
+                               application are sent to the server again.
+                               Commands sent while the connection is being
+                               restored are discarded.
+
+        :param baud_rate: Serial baud rate that the sketch is started with.
+
+        :param negotiated_baud_rate: Optional higher baud rate, such as
+                                     500000, 1000000 or 2000000, that the
+                                     serial link is switched to after the
+                                     connection is established. If the
+                                     server declines the rate or it cannot
+                                     be confirmed, baud_rate remains in use.
+
+        :param fleet: A TelemetrixFleet whose shared threads receive and
+                      dispatch the reports of this board. This is set by
+                      TelemetrixFleet.add_board.
+
+        :param ble_address: Bluetooth address of a Bluetooth LE board that
+                            provides a Nordic UART style service. On
+                            macOS, this is the identifier reported by
+                            bleak for the board.
+
+        :param ble_client_class: bleak.BleakClient compatible class used for
+                                 the Bluetooth LE connection. This allows a
+                                 local fake transport to be used for
+                                 testing. Defaults to bleak.BleakClient.
+
+        :param udp_port: For a tcp/ip connected server, the local udp port
+                         that the server is asked to send its reports to,
+                         or 0 to use any free port. Reports then arrive as
+                         udp datagrams, and a datagram that is lost or
+                         arrives after a newer one is dropped instead of
+                         delaying the reports that follow it. Commands and
+                         the replies to requests remain on the tcp/ip
+                         connection.
+
+        :param tcp_nodelay: If True, Nagle's algorithm is disabled on the
+                            tcp/ip connection, so that each small command
+                            is sent immediately instead of being held back
+                            until earlier data is acknowledged.
+
+        :param tcp_receive_buffer_size: Size in bytes requested for the tcp/ip
+                                        socket receive buffer. None keeps the
+                                        operating system default.
+
+        :param tcp_send_buffer_size: Size in bytes requested for the tcp/ip
+                                     socket send buffer. None keeps the
+                                     operating system default.
+
+        :param tcp_keepalive: Seconds that the tcp/ip connection may be idle
+                              before keepalive probes are sent, so that a
+                              server that disappears without closing the
+                              connection is detected. None disables
+                              keepalive.
+
+        :param tcp_connect_timeout: Seconds to wait for the tcp/ip connection
+                                    to be established.
+
+        :param report_queue_size: Maximum number of streaming reports, such
+                                  as analog, digital and sonar reports, held
+                                  between the receive thread and the
+                                  reporter thread. 0 leaves the queue
+                                  unbounded. Not used by boards in a fleet.
+
+        :param report_queue_policy: What happens to a streaming report when
+                                    the report queue is full.
+                                    'block' - receiving waits for room.
+                                    'drop_oldest' - the oldest queued report
+                                    is dropped.
+                                    'drop_newest' - the new report is dropped.
+                                    'coalesce' - the new report replaces the
+                                    queued report for the same pin.
         """
 
         # initialize threading parent
         threading.Thread.__init__(self)
 
+        self.ip_address = ip_address
+        self.ip_port = ip_port
+
+        self.ble_address = ble_address
+        self.ble_client_class = ble_client_class
+
+        self.udp_port = udp_port
+        if self.udp_port is not None and not self.ip_address:
+            raise RuntimeError('udp_port may only be used with an ip_address')
+
+        # socket that udp reports are received on
+        self.udp_sock = None
+
+        if report_queue_policy not in TelemetrixReportQueue.POLICIES:
+            raise RuntimeError(f'Unknown report queue policy: {report_queue_policy}')
+
+        # a board that is part of a fleet uses the fleet's threads
+        self.fleet = fleet
+
         # create the threads and set them as daemons so
         # that they stop when the program is closed
+        if not self.fleet:
+            # create a thread to interpret received serial data
+            self.the_reporter_thread = threading.Thread(target=self._reporter)
+            self.the_reporter_thread.daemon = True
+
+            if self.ble_address:
+                # the Bluetooth LE connection is run by an event loop
+                # in the receive thread
+                self.ble_loop = asyncio.new_event_loop()
+                self.the_data_receive_thread = threading.Thread(
+                    target=self._ble_receiver)
+            elif not self.ip_address:
+                self.the_data_receive_thread = threading.Thread(
+                    target=self._serial_receiver)
+            else:
+                self.the_data_receive_thread = threading.Thread(target=self._tcp_receiver)
 
-        # create a thread to interpret received serial data
-        self.the_reporter_thread = threading.Thread(target=self._reporter)
-        self.the_reporter_thread.daemon = True
+            self.the_data_receive_thread.daemon = True
 
-        self.ip_address = ip_address
-        self.ip_port = ip_port
+        # create a thread to receive udp reports
+        self.the_udp_receive_thread = None
+        if self.udp_port is not None:
+            self.the_udp_receive_thread = threading.Thread(target=self._udp_receiver)
+            self.the_udp_receive_thread.daemon = True
 
-        if not self.ip_address:
-            self.the_data_receive_thread = threading.Thread(target=self._serial_receiver)
-        else:
-            self.the_data_receive_thread = threading.Thread(target=self._tcp_receiver)
+        # create a thread to write coalesced commands
+        self.write_coalesce_interval = write_coalesce_interval
+        self.the_write_thread = None
+        if self.write_coalesce_interval:
+            self.the_write_thread = threading.Thread(target=self._coalescing_writer)
+            self.the_write_thread.daemon = True
 
-        self.the_data_receive_thread.daemon = True
+        # commands waiting to be written by the write thread
+        self.coalesced_writes = bytearray()
+        self.write_lock = threading.RLock()
+        self.write_ready = threading.Event()
 
         # flag to allow the reporter and receive threads to run.
         self.run_event = threading.Event()
@@ -130,87 +848,258 @@ class Telemetrix(threading.Thread):
         self.arduino_wait = arduino_wait
         self.sleep_tune = sleep_tune
         self.shutdown_on_exception = shutdown_on_exception
+        self.handshake_timeout = handshake_timeout
+        self.handshake_retries = handshake_retries
+        self.reset_on_connect = reset_on_connect
+        self.auto_reconnect = auto_reconnect
+        self.baud_rate = baud_rate
+        self.negotiated_baud_rate = negotiated_baud_rate
+        self.tcp_nodelay = tcp_nodelay
+        self.tcp_receive_buffer_size = tcp_receive_buffer_size
+        self.tcp_send_buffer_size = tcp_send_buffer_size
+        self.tcp_keepalive = tcp_keepalive
+        self.tcp_connect_timeout = tcp_connect_timeout
+
+        self.discovery_cache = None
+        if discovery_cache and not self.com_port and not ip_address and \
+                not ble_address:
+            self.discovery_cache = TelemetrixDiscoveryCache(discovery_cache)
+
+        # the list_ports entries of the ports probed by _find_arduino
+        # and the arduino ids they reported
+        self.probed_ports = {}
+        self.probed_ids = {}
+
+        # initialize the report dispatch table and the client side
+        # data structures. This is done before the board joins a fleet,
+        # whose dispatch threads use them as soon as it is attached.
+        self._init_client_state()
+
+        if self.fleet:
+            self.the_data_receive_thread, self.the_reporter_thread, \
+                frame_handler = self.fleet._attach(self)
+        else:
+            # complete report frames are queued here by the receive thread
+            # and processed by the reporter thread
+            if report_queue_size:
+                self.report_queue = TelemetrixReportQueue(report_queue_size,
+                                                          report_queue_policy)
+            else:
+                self.report_queue = queue.SimpleQueue()
+            frame_handler = self.report_queue.put
 
-        # create a deque to receive and process data from the arduino
-        self.the_deque = deque()
-
-        # The report_dispatch dictionary is used to process
-        # incoming report messages by looking up the report message
-        # and executing its associated processing method.
-
-        self.report_dispatch = {}
-
-        # To add a command to the command dispatch table, append here.
-        self.report_dispatch.update(
-            {PrivateConstants.LOOP_COMMAND: self._report_loop_data})
-        self.report_dispatch.update(
-            {PrivateConstants.DEBUG_PRINT: self._report_debug_data})
-        self.report_dispatch.update(
-            {PrivateConstants.DIGITAL_REPORT: self._digital_message})
-        self.report_dispatch.update(
-            {PrivateConstants.ANALOG_REPORT: self._analog_message})
-        self.report_dispatch.update(
-            {PrivateConstants.FIRMWARE_REPORT: self._firmware_message})
-        self.report_dispatch.update({PrivateConstants.I_AM_HERE_REPORT: self._i_am_here})
-        self.report_dispatch.update(
-            {PrivateConstants.SERVO_UNAVAILABLE: self._servo_unavailable})
-        self.report_dispatch.update(
-            {PrivateConstants.I2C_READ_REPORT: self._i2c_read_report})
-        self.report_dispatch.update(
-            {PrivateConstants.I2C_TOO_FEW_BYTES_RCVD: self._i2c_too_few})
-        self.report_dispatch.update(
-            {PrivateConstants.I2C_TOO_MANY_BYTES_RCVD: self._i2c_too_many})
-        self.report_dispatch.update(
-            {PrivateConstants.SONAR_DISTANCE: self._sonar_distance_report})
-        self.report_dispatch.update({PrivateConstants.DHT_REPORT: self._dht_report})
-        self.report_dispatch.update(
-            {PrivateConstants.SPI_REPORT: self._spi_report})
-        self.report_dispatch.update(
-            {PrivateConstants.ONE_WIRE_REPORT: self._onewire_report})
-        self.report_dispatch.update(
-            {PrivateConstants.STEPPER_DISTANCE_TO_GO:
-                 self._stepper_distance_to_go_report})
-        self.report_dispatch.update(
-            {PrivateConstants.STEPPER_TARGET_POSITION:
-                 self._stepper_target_position_report})
-        self.report_dispatch.update(
-            {PrivateConstants.STEPPER_CURRENT_POSITION:
-                 self._stepper_current_position_report})
-        self.report_dispatch.update(
-            {PrivateConstants.STEPPER_RUNNING_REPORT:
-                 self._stepper_is_running_report})
-        self.report_dispatch.update(
-            {PrivateConstants.STEPPER_RUN_COMPLETE_REPORT:
-                 self._stepper_run_complete_report})
-
-        self.report_dispatch.update(
-            {PrivateConstants.STEPPER_DISTANCE_TO_GO:
-                 self._stepper_distance_to_go_report})
-        self.report_dispatch.update(
-            {PrivateConstants.STEPPER_TARGET_POSITION:
-                 self._stepper_target_position_report})
-        self.report_dispatch.update(
-            {PrivateConstants.FEATURES:
-                 self._features_report})
-
-        # dictionaries to store the callbacks for each pin
-        self.analog_callbacks = {}
-
-        self.digital_callbacks = {}
-
-        self.i2c_callback = None
-        self.i2c_callback2 = None
-
-        self.i2c_1_active = False
-        self.i2c_2_active = False
+        # splits the received byte stream into report frames
+        self.report_framer = TelemetrixReportFramer(frame_handler)
 
-        self.spi_callback = None
+        # splits each udp datagram into report frames
+        self.udp_framer = TelemetrixReportFramer(frame_handler)
 
-        self.onewire_callback = None
+        if not self.fleet:
+            self.the_reporter_thread.start()
+            self.the_data_receive_thread.start()
+        if self.write_coalesce_interval:
+            self.the_write_thread.start()
+        if self.the_udp_receive_thread:
+            self.the_udp_receive_thread.start()
 
-        self.cs_pins_enabled = []
+        print(f"Telemetrix:  Version {PrivateConstants.TELEMETRIX_VERSION}\n\n"
+              f"Copyright (c) 2021-2025 Alan Yorinks All Rights Reserved.\n")
 
-        # the trigger pin will be the key to retrieve
+        # using the serial link
+        if self.ble_address:
+            try:
+                self._connect_ble()
+            except OSError as e:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Could not connect to {self.ble_address}: {e}')
+            print(f'Successfully connected to: {self.ble_address}')
+        elif not self.ip_address:
+            if not self.com_port:
+                # user did not specify a com_port
+                try:
+                    self._find_arduino()
+                except KeyboardInterrupt:
+                    if self.shutdown_on_exception:
+                        self.shutdown()
+            else:
+                # com_port specified - set com_port and baud rate
+                try:
+                    self._manual_open()
+                except KeyboardInterrupt:
+                    if self.shutdown_on_exception:
+                        self.shutdown()
+
+            if self.serial_port:
+                print(f"Arduino compatible device found and connected to {self.serial_port.port}")
+                self.serial_port.reset_input_buffer()
+                self.serial_port.reset_output_buffer()
+                self.serial_port_register.add(self.serial_port)
+
+            # no com_port found - raise a runtime exception
+            else:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError('No Arduino Found or User Aborted Program')
+        else:
+            try:
+                self._connect_tcp()
+            except OSError as e:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Could not connect to '
+                                   f'{self.ip_address}:{self.ip_port}: {e}')
+            print(f'Successfully connected to: {self.ip_address}:{self.ip_port}')
+            if self.udp_port is not None:
+                self._open_udp_socket()
+
+        # allow the threads to run
+        self._run_threads()
+
+        # get telemetrix firmware version and print it
+        print('\nRetrieving Telemetrix4Arduino firmware ID...')
+        self._get_firmware_version()
+        if not self.firmware_version:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError(f'Telemetrix4Arduino firmware version')
+
+        else:
+            # if self.firmware_version[0] < 5:
+            #   raise RuntimeError('Please upgrade the server firmware to version '
+            #                        '5.0.0 or greater')
+            print(f'Telemetrix4Arduino firmware version: {self.firmware_version[0]}.'
+                  f'{self.firmware_version[1]}.{self.firmware_version[2]}')
+
+        if self.discovery_cache:
+            self._update_discovery_cache()
+
+        if self.serial_port and self.negotiated_baud_rate:
+            self._negotiate_baud_rate()
+
+        command = [PrivateConstants.ENABLE_ALL_REPORTS]
+        self._send_command(command)
+
+        # get the features list
+        command = [PrivateConstants.GET_FEATURES]
+        self._handshake(command, (PrivateConstants.FEATURES,))
+
+        # Have the server reset its data structures, and wait for a
+        # loop back to confirm that the reset has been processed
+        command = [PrivateConstants.RESET]
+        self._send_command(command)
+        command = [PrivateConstants.LOOP_COMMAND, 0]
+        self._handshake(command, (PrivateConstants.LOOP_COMMAND,))
+
+        if self.udp_sock:
+            self._enable_udp_reports(self.udp_sock.getsockname()[1])
+
+    def _init_client_state(self):
+        """
+        Initialize the report dispatch table and the data structures
+        maintained by the client. These are shared by all client
+        implementations, independent of the transport in use.
+        """
+        # The report_dispatch dictionary is used to process
+        # incoming report messages by looking up the report message
+        # and executing its associated processing method.
+
+        self.report_dispatch = {}
+
+        # To add a command to the command dispatch table, append here.
+        self.report_dispatch.update(
+            {PrivateConstants.LOOP_COMMAND: self._report_loop_data})
+        self.report_dispatch.update(
+            {PrivateConstants.DEBUG_PRINT: self._report_debug_data})
+        self.report_dispatch.update(
+            {PrivateConstants.DIGITAL_REPORT: self._digital_message})
+        self.report_dispatch.update(
+            {PrivateConstants.ANALOG_REPORT: self._analog_message})
+        self.report_dispatch.update(
+            {PrivateConstants.ANALOG_BLOCK_REPORT: self._analog_block_message})
+        self.report_dispatch.update(
+            {PrivateConstants.FIRMWARE_REPORT: self._firmware_message})
+        self.report_dispatch.update({PrivateConstants.I_AM_HERE_REPORT: self._i_am_here})
+        self.report_dispatch.update(
+            {PrivateConstants.SERVO_UNAVAILABLE: self._servo_unavailable})
+        self.report_dispatch.update(
+            {PrivateConstants.I2C_READ_REPORT: self._i2c_read_report})
+        self.report_dispatch.update(
+            {PrivateConstants.I2C_TOO_FEW_BYTES_RCVD: self._i2c_too_few})
+        self.report_dispatch.update(
+            {PrivateConstants.I2C_TOO_MANY_BYTES_RCVD: self._i2c_too_many})
+        self.report_dispatch.update(
+            {PrivateConstants.SONAR_DISTANCE: self._sonar_distance_report})
+        self.report_dispatch.update({PrivateConstants.DHT_REPORT: self._dht_report})
+        self.report_dispatch.update(
+            {PrivateConstants.SPI_REPORT: self._spi_report})
+        self.report_dispatch.update(
+            {PrivateConstants.ONE_WIRE_REPORT: self._onewire_report})
+        self.report_dispatch.update(
+            {PrivateConstants.STEPPER_DISTANCE_TO_GO:
+                 self._stepper_distance_to_go_report})
+        self.report_dispatch.update(
+            {PrivateConstants.STEPPER_TARGET_POSITION:
+                 self._stepper_target_position_report})
+        self.report_dispatch.update(
+            {PrivateConstants.STEPPER_CURRENT_POSITION:
+                 self._stepper_current_position_report})
+        self.report_dispatch.update(
+            {PrivateConstants.STEPPER_RUNNING_REPORT:
+                 self._stepper_is_running_report})
+        self.report_dispatch.update(
+            {PrivateConstants.STEPPER_RUN_COMPLETE_REPORT:
+                 self._stepper_run_complete_report})
+
+        self.report_dispatch.update(
+            {PrivateConstants.STEPPER_DISTANCE_TO_GO:
+                 self._stepper_distance_to_go_report})
+        self.report_dispatch.update(
+            {PrivateConstants.STEPPER_TARGET_POSITION:
+                 self._stepper_target_position_report})
+        self.report_dispatch.update(
+            {PrivateConstants.FEATURES:
+                 self._features_report})
+        self.report_dispatch.update(
+            {PrivateConstants.BAUD_RATE_REPORT:
+                 self._baud_rate_report})
+
+        # dictionaries to store the callbacks for each pin
+        self.analog_callbacks = {}
+
+        # receives all of the values of an analog block report at once
+        self.analog_block_callback = None
+
+        self.digital_callbacks = {}
+
+        # the latest reported value of each pin. Sonar distances are
+        # indexed by trigger pin.
+        self.analog_inputs = TelemetrixShadowTable(PrivateConstants.NUMBER_OF_ANALOG_PINS)
+        self.digital_inputs = TelemetrixShadowTable(PrivateConstants.NUMBER_OF_DIGITAL_PINS)
+        self.sonar_distances = TelemetrixShadowTable(PrivateConstants.NUMBER_OF_DIGITAL_PINS)
+
+        # minimum interval between callbacks for each rate limited
+        # report type
+        self.callback_rate_limits = {}
+
+        # [time the next callback may be called, latest unsent callback
+        # data, callback] for each rate limited (report type, pin)
+        self.rate_limited_callbacks = {}
+
+        # earliest time that an unsent rate limited callback is due,
+        # or None if there are none
+        self.rate_limit_deadline = None
+
+        self.i2c_1_active = False
+        self.i2c_2_active = False
+
+        # callbacks for periodic i2c reads performed by the server,
+        # keyed by (i2c_port, address, register)
+        self.i2c_periodic_callbacks = {}
+
+        self.cs_pins_enabled = []
+
+        # the trigger pin will be the key to retrieve
         # the callback for a specific HC-SR04
         self.sonar_callbacks = {}
 
@@ -226,11 +1115,17 @@ class Telemetrix(threading.Thread):
         # socket for tcp/ip communications
         self.sock = None
 
+        # TelemetrixBleTransport for Bluetooth LE communications
+        self.ble_transport = None
+
         # flag to indicate we are in shutdown mode
         self.shutdown_flag = False
 
+        # set to a RuntimeError when the connection is lost and not
+        # restored. It is raised by any further command.
+        self.connection_error = None
+
         # debug loopback callback method
-        self.loop_back_callback = None
 
         # flag to indicate the start of a new report
         # self.new_report_start = True
@@ -277,186 +1172,294 @@ class Telemetrix(threading.Thread):
                              'motion_complete_callback': None,
                              'acceleration_callback': None}
 
+        # Requests waiting for a reply from the server, keyed by the
+        # report that answers them. Each entry is a [future, callback,
+        # deadline] list. The server answers requests in the order they
+        # are received, so replies are matched first in, first out.
+        # A key is removed when it has no requests.
+        self.pending_requests = {}
+        self.pending_requests_lock = threading.Lock()
+
+        # Commands that configure the server, replayed after a reconnect.
+        # Each is keyed by the pin, device or setting that it configures.
+        self.configuration = OrderedDict()
+
+        # set while a lost connection is being restored
+        self.reconnecting = False
+
+        # commands sent by a thread within a batch() block are
+        # accumulated here and written when the block exits
+        self.write_batch = threading.local()
+
+        # the number of commands sent and the number of transport
+        # writes used to send them
+        self.commands_sent = 0
+        self.transport_writes = 0
+
+        # the last value written to each output pin and the time it must
+        # be written again, keyed by pin, or None if the output cache is
+        # disabled
+        self.output_cache = None
+        self.output_cache_lock = threading.Lock()
+        self.output_refresh_interval = None
+
+        # output writes sent and suppressed while the output cache is enabled
+        self.output_writes_sent = 0
+        self.output_writes_suppressed = 0
+
+        # callback policy executors keyed by report type, or None for
+        # the default policy. A value of None selects inline execution.
+        self.callback_executors = {}
+
+        # type of the report being processed by _dispatch_report
+        self.dispatched_report_type = None
+
+        # sequence number of the last udp report datagram processed
+        self.udp_sequence = None
+
+        # udp report datagrams processed, missing from the sequence, and
+        # dropped because they arrived after a newer datagram
+        self.udp_datagrams_received = 0
+        self.udp_datagrams_lost = 0
+        self.udp_datagrams_stale = 0
+
         # build a list of stepper motor info items
         self.stepper_info_list = []
         # a list of dictionaries to hold stepper information
         for motor in range(self.max_number_of_steppers):
             self.stepper_info_list.append(self.stepper_info.copy())
 
-        self.the_reporter_thread.start()
-        self.the_data_receive_thread.start()
-
-        print(f"Telemetrix:  Version {PrivateConstants.TELEMETRIX_VERSION}\n\n"
-              f"Copyright (c) 2021-2025 Alan Yorinks All Rights Reserved.\n")
-
-        # using the serial link
-        if not self.ip_address:
-            if not self.com_port:
-                # user did not specify a com_port
-                try:
-                    self._find_arduino()
-                except KeyboardInterrupt:
-                    if self.shutdown_on_exception:
-                        self.shutdown()
-            else:
-                # com_port specified - set com_port and baud rate
-                try:
-                    self._manual_open()
-                except KeyboardInterrupt:
-                    if self.shutdown_on_exception:
-                        self.shutdown()
-
-            if self.serial_port:
-                print(f"Arduino compatible device found and connected to {self.serial_port.port}")
-                self.serial_port.reset_input_buffer()
-                self.serial_port.reset_output_buffer()
-                self.serial_port_register.add(self.serial_port)
-
-            # no com_port found - raise a runtime exception
-            else:
-                if self.shutdown_on_exception:
-                    self.shutdown()
-                raise RuntimeError('No Arduino Found or User Aborted Program')
-        else:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((self.ip_address, self.ip_port))
-            print(f'Successfully connected to: {self.ip_address}:{self.ip_port}')
-
-        # allow the threads to run
-        self._run_threads()
-        print(f'Waiting for Arduino to reset')
-        print(f'Reset Complete')
-
-        # get telemetrix firmware version and print it
-        print('\nRetrieving Telemetrix4Arduino firmware ID...')
-        self._get_firmware_version()
-        if not self.firmware_version:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError(f'Telemetrix4Arduino firmware version')
-
-        else:
-            # if self.firmware_version[0] < 5:
-            #   raise RuntimeError('Please upgrade the server firmware to version '
-            #                        '5.0.0 or greater')
-            print(f'Telemetrix4Arduino firmware version: {self.firmware_version[0]}.'
-                  f'{self.firmware_version[1]}.{self.firmware_version[2]}')
-        command = [PrivateConstants.ENABLE_ALL_REPORTS]
-        self._send_command(command)
-
-        # get the features list
-        command = [PrivateConstants.GET_FEATURES]
-        self._send_command(command)
-        time.sleep(.2)
-
-        # Have the server reset its data structures
-        command = [PrivateConstants.RESET]
-        self._send_command(command)
-
     def _find_arduino(self):
         """
         This method will search all potential serial ports for an Arduino
         containing a sketch that has a matching arduino_instance_id as
         specified in the input parameters of this class.
 
+        All ports are probed concurrently, and the search ends as soon
+        as a matching board replies. If a discovery cache is in use, the
+        port the board was last found on is probed first.
+
         This is used explicitly with the Telemetrix4Arduino sketch.
         """
-
-        # a list of serial ports to be checked
-        serial_ports = []
-
         print('Opening all potential serial ports...')
-        the_ports_list = list_ports.comports()
 
         registered_ports = list(map(lambda p: p.port, self.serial_port_register.active))
-        for port in the_ports_list:
-            if port.pid is None or port.device in registered_ports:
-                continue
-            try:
-                self.serial_port = serial.Serial(port.device, 115200,
-                                                 timeout=1, writeTimeout=0)
-            except SerialException:
-                continue
-            # create a list of serial ports that we opened
-            serial_ports.append(self.serial_port)
+        self.probed_ports = {port.device: port for port in list_ports.comports()
+                             if port.pid is not None and
+                             port.device not in registered_ports}
+        devices = list(self.probed_ports)
 
-            # display to the user
-            print('\t' + port.device)
-
-            # clear out any possible data in the input buffer
-        # wait for arduino to reset
         print(
-            f'\nWaiting {self.arduino_wait} seconds(arduino_wait) for Arduino devices to '
-            'reset...')
-        # temporary for testing
-        time.sleep(self.arduino_wait)
-        self._run_threads()
-
-        for serial_port in serial_ports:
+            f'\nWaiting up to {self.arduino_wait} seconds(arduino_wait) for Arduino '
+            'devices to reset...')
+
+        serial_port = None
+        if self.discovery_cache:
+            cached = [device for device in devices if self.discovery_cache.lookup(
+                self.probed_ports[device]) == self.arduino_instance_id]
+            if cached:
+                serial_port = self._probe_ports(cached)
+            if not serial_port:
+                devices = [device for device in devices if device not in cached]
+
+        if not serial_port:
+            serial_port = self._probe_ports(devices)
+
+        if serial_port:
             self.serial_port = serial_port
+            self.reported_arduino_id = self.arduino_instance_id
+            print('Valid Arduino ID Found.')
+            self._run_threads()
+            return
 
-            # Since opening the port, there might be e.g., boot logs in the
-            # buffer. Clear them before proceeding.
-            self.serial_port.reset_input_buffer()
+        if self.discovery_cache:
+            self._update_discovery_cache()
 
-            self._get_arduino_id()
-            retries = 50
-            while self.reported_arduino_id is None and retries > 0:
-                time.sleep(.2)
-                retries -= 1
-            if self.reported_arduino_id != self.arduino_instance_id:
-                continue
-            else:
-                print('Valid Arduino ID Found.')
-                self.serial_port.reset_input_buffer()
-                self.serial_port.reset_output_buffer()
-                return
         if self.shutdown_on_exception:
             self.shutdown()
-        raise RuntimeError(f'Incorrect Arduino ID: {self.reported_arduino_id}')
+        raise RuntimeError(f'No Arduino with an ID of {self.arduino_instance_id} '
+                           f'was found')
 
-    def _manual_open(self):
+    def _probe_ports(self, devices):
         """
-        Com port was specified by the user - try to open up that port
+        Probe serial ports concurrently, each in its own thread.
 
+        :param devices: list of serial port device names
+
+        :return: the open serial port of the matching board, or None
         """
-        # if port is not found, a serial exception will be thrown
-        try:
-            print(f'Opening {self.com_port}...')
-            self.serial_port = serial.Serial(self.com_port, 115200,
-                                             timeout=1, writeTimeout=0)
+        if not devices:
+            return None
 
-            print(
-                f'\nWaiting {self.arduino_wait} seconds(arduino_wait) for Arduino devices to '
-                'reset...')
-            self._run_threads()
-            time.sleep(self.arduino_wait)
+        # set when a matching board is found, to end the remaining probes
+        found = threading.Event()
+        found_lock = threading.Lock()
 
-            self._get_arduino_id()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(devices))
+        probes = [executor.submit(self._probe_port, device, found, found_lock)
+                  for device in devices]
+        # the remaining probes close their ports once found is set
+        executor.shutdown(wait=False)
 
-            if self.reported_arduino_id != self.arduino_instance_id:
-                if self.shutdown_on_exception:
-                    self.shutdown()
-                raise RuntimeError(f'Incorrect Arduino ID: {self.reported_arduino_id}')
-            print('Valid Arduino ID Found.')
-            # get arduino firmware version and print it
-            print('\nRetrieving Telemetrix4Arduino firmware ID...')
-            self._get_firmware_version()
+        for probe in concurrent.futures.as_completed(probes):
+            serial_port = probe.result()
+            if serial_port:
+                return serial_port
+        return None
 
-            if not self.firmware_version:
-                if self.shutdown_on_exception:
-                    self.shutdown()
-                raise RuntimeError(
-                    f'Telemetrix4Arduino Sketch Firmware Version Not Found')
+    def _update_discovery_cache(self):
+        """
+        Record the ids reported by the probed ports, along with the
+        firmware version of the connected board, in the discovery cache.
+        """
+        for device, arduino_id in self.probed_ids.items():
+            if arduino_id is not None:
+                firmware_version = None
+                if self.serial_port and device == self.serial_port.port:
+                    firmware_version = self.firmware_version
+                self.discovery_cache.update(self.probed_ports[device], arduino_id,
+                                            firmware_version)
+        self.discovery_cache.save()
 
-            else:
-                print(f'Telemetrix4Arduino firmware version: {self.firmware_version[0]}.'
-                      f'{self.firmware_version[1]}')
+    def _probe_port(self, device, found, found_lock):
+        """
+        Open a serial port and check whether the connected board has a
+        matching arduino_instance_id. This is run by a discovery thread.
+
+        :param device: serial port device name
+
+        :param found: event set when a matching board has been found
+
+        :param found_lock: lock that allows only one probe to claim a match
+
+        :return: the open serial port if the board matches, otherwise None
+        """
+        try:
+            serial_port = self._open_serial_port(device)
+        except SerialException:
+            return None
+
+        print('\t' + device)
+
+        try:
+            arduino_id = self._wait_for_arduino_id(serial_port, found)
+        except (OSError, SerialException):
+            arduino_id = None
+        self.probed_ids[device] = arduino_id
+
+        if arduino_id == self.arduino_instance_id:
+            with found_lock:
+                if not found.is_set():
+                    found.set()
+                    return serial_port
+
+        serial_port.close()
+        return None
+
+    def _open_serial_port(self, device):
+        """
+        Open a serial port. DTR and RTS are held low while the port is
+        opened if reset_on_connect is False.
+
+        :param device: serial port device name
+
+        :return: the open serial port
+        """
+        serial_port = serial.Serial(None, self.baud_rate, timeout=.1, writeTimeout=0)
+        serial_port.port = device
+        if not self.reset_on_connect:
+            serial_port.dtr = False
+            serial_port.rts = False
+        serial_port.open()
+        return serial_port
+
+    def _wait_for_arduino_id(self, serial_port, found=None):
+        """
+        Send ARE_U_THERE until the board replies or arduino_wait seconds
+        have passed. The request is repeated every handshake_timeout
+        seconds, so a board that is still resetting is answered as soon
+        as it is ready. Anything that is not a Telemetrix report, such
+        as boot messages, is discarded.
+
+        :param serial_port: an open serial port
+
+        :param found: optional event that ends the wait when set
+
+        :return: the reported arduino id, or None
+        """
+        replies = []
+        framer = TelemetrixReportFramer(replies.append)
+        deadline = time.monotonic() + self.arduino_wait + self.handshake_timeout
+        next_request = 0
+
+        while not (found and found.is_set()):
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now >= next_request:
+                serial_port.write(bytes([1, PrivateConstants.ARE_U_THERE]))
+                next_request = now + self.handshake_timeout
+
+            data = serial_port.read(serial_port.in_waiting or 1)
+            try:
+                framer.feed(data)
+            except RuntimeError:
+                framer.reset()
+            for frame in replies:
+                if frame[0] == PrivateConstants.I_AM_HERE_REPORT:
+                    return frame[1]
+            replies.clear()
+        return None
+
+    def _manual_open(self):
+        """
+        Com port was specified by the user - try to open up that port
+
+        """
+        # if port is not found, a serial exception will be thrown
+        try:
+            print(f'Opening {self.com_port}...')
+            self.serial_port = self._open_serial_port(self.com_port)
+
+            print(
+                f'\nWaiting up to {self.arduino_wait} seconds(arduino_wait) for Arduino '
+                'devices to reset...')
+            self.reported_arduino_id = self._wait_for_arduino_id(self.serial_port)
+            self._run_threads()
+
+            if self.reported_arduino_id != self.arduino_instance_id:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Incorrect Arduino ID: {self.reported_arduino_id}')
+            print('Valid Arduino ID Found.')
+            # get arduino firmware version and print it
+            print('\nRetrieving Telemetrix4Arduino firmware ID...')
+            self._get_firmware_version()
+
+            if not self.firmware_version:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(
+                    f'Telemetrix4Arduino Sketch Firmware Version Not Found')
+
+            else:
+                print(f'Telemetrix4Arduino firmware version: {self.firmware_version[0]}.'
+                      f'{self.firmware_version[1]}')
         except KeyboardInterrupt:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('User Hit Control-C')
 
+    def analog_value(self, pin):
+        """
+        Retrieve the latest value reported for an analog input pin.
+
+        :param pin: analog pin number (ie. A2 = 2)
+
+        :return: the value, or None if the pin has not reported
+        """
+        return self.analog_inputs.value(pin)
+
     def analog_write(self, pin, value):
         """
         Set the specified pin to the specified value.
@@ -469,7 +1472,43 @@ class Telemetrix(threading.Thread):
         value_msb = value >> 8
         value_lsb = value & 0xff
         command = [PrivateConstants.ANALOG_WRITE, pin, value_msb, value_lsb]
-        self._send_command(command)
+        self._send_output_command(command)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        A context manager that collects the commands sent by the calling
+        thread and writes them in a single transport write when the
+        with block exits. Batches may be nested; the outermost block
+        performs the write.
+
+        Example:
+            with board.batch():
+                for pin in servo_pins:
+                    board.servo_write(pin, angle)
+        """
+        if getattr(self.write_batch, 'buffer', None) is not None:
+            yield
+            return
+
+        self.write_batch.buffer = bytearray()
+        try:
+            yield
+        finally:
+            batch = self.write_batch.buffer
+            self.write_batch.buffer = None
+            if batch:
+                self._queue_write(bytes(batch))
+
+    def digital_value(self, pin):
+        """
+        Retrieve the latest value reported for a digital input pin.
+
+        :param pin: pin number
+
+        :return: the value, or None if the pin has not reported
+        """
+        return self.digital_inputs.value(pin)
 
     def digital_write(self, pin, value):
         """
@@ -482,7 +1521,41 @@ class Telemetrix(threading.Thread):
         """
 
         command = [PrivateConstants.DIGITAL_WRITE, pin, value]
-        self._send_command(command)
+        self._send_output_command(command)
+
+    def digital_write_many(self, pin_values):
+        """
+        Set several digital pins with a single command, so that the
+        server changes all of them within one pass of its loop.
+
+        :param pin_values: a dictionary of {pin_number: value (1 or 0)}
+
+        If more pins are specified than fit in one command, the
+        commands are sent together in a single write.
+        """
+        pairs = []
+        for pin, value in pin_values.items():
+            self._forget_output(pin)
+            pairs += [pin, 1 if value else 0]
+
+        maximum = 2 * PrivateConstants.MAX_DIGITAL_WRITE_MULTI_PINS
+        with self.batch():
+            for index in range(0, len(pairs), maximum):
+                command = [PrivateConstants.DIGITAL_WRITE_MULTI]
+                command += pairs[index:index + maximum]
+                self._send_command(command)
+
+    def digital_write_mask(self, pins, mask):
+        """
+        Set a group of digital pins from a bit mask with a single command.
+
+        :param pins: list of pin numbers. Bit 0 of the mask sets pins[0],
+                     bit 1 sets pins[1], and so on.
+
+        :param mask: pin values as an integer bit mask
+        """
+        self.digital_write_many({pin: (mask >> bit) & 1
+                                 for bit, pin in enumerate(pins)})
 
     def disable_all_reporting(self):
         """
@@ -492,6 +1565,14 @@ class Telemetrix(threading.Thread):
                    PrivateConstants.REPORTING_DISABLE_ALL, 0]
         self._send_command(command)
 
+    def disable_analog_block_reporting(self):
+        """
+        Return to reporting each analog change in its own report.
+        """
+        self.analog_block_callback = None
+        command = [PrivateConstants.ANALOG_BLOCK_REPORTING, 0]
+        self._send_command(command)
+
     def disable_analog_reporting(self, pin):
         """
         Disables analog reporting for a single analog pin.
@@ -514,6 +1595,33 @@ class Telemetrix(threading.Thread):
                    PrivateConstants.REPORTING_DIGITAL_DISABLE, pin]
         self._send_command(command)
 
+    def disable_output_cache(self):
+        """
+        Send every digital_write, analog_write and servo_write again.
+        """
+        with self.output_cache_lock:
+            self.output_cache = None
+
+    def enable_analog_block_reporting(self, callback=None):
+        """
+        Have the server report all of the analog inputs that changed
+        during one scan in a single report.
+
+        :param callback: callback function for the whole block.
+                         If None, each value is passed to the callback
+                         registered for its pin, as with individual reports.
+
+        callback returns a data list:
+
+        [ANALOG_BLOCK_REPORT, [pin_number, ...], [pin_value, ...],
+        raw_time_stamp]
+
+        The ANALOG_BLOCK_REPORT = 21
+        """
+        self.analog_block_callback = callback
+        command = [PrivateConstants.ANALOG_BLOCK_REPORTING, 1]
+        self._send_command(command)
+
     def enable_analog_reporting(self, pin):
         """
         Enables analog reporting for the specified pin.
@@ -537,15 +1645,83 @@ class Telemetrix(threading.Thread):
                    PrivateConstants.REPORTING_DIGITAL_ENABLE, pin]
         self._send_command(command)
 
-    def _get_arduino_id(self):
+    def enable_output_cache(self, refresh_interval=1.0):
         """
-        Retrieve arduino-telemetrix arduino id
+        Remember the last value written to each output pin, and do not
+        send a digital_write, analog_write or servo_write that repeats
+        it. This allows control loops to set all of their outputs on
+        every pass without using the link to resend unchanged values.
 
+        Changing the mode of a pin, attaching or detaching a servo and
+        digital_write_many clear the remembered value of the pins involved.
+
+        :param refresh_interval: Seconds after which an unchanged value is
+                                 sent again, so that an output corrected
+                                 by some other means is restored. None
+                                 never sends an unchanged value again.
         """
+        if refresh_interval is not None and refresh_interval <= 0:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError('refresh_interval must be greater than 0')
+
+        with self.output_cache_lock:
+            self.output_refresh_interval = refresh_interval
+            if self.output_cache is None:
+                self.output_cache = {}
+            else:
+                # apply the new interval to the values already sent
+                self.output_cache.clear()
+
+    def get_callback_metrics(self):
+        """
+        Retrieve the queue depth metrics of the callback policies.
+
+        :return: A dictionary keyed by report type, or None for the default
+                 policy. Each value is a dictionary containing the policy
+                 name, the number of callbacks waiting or running, the
+                 largest number seen, and the number of callbacks that
+                 completed and that raised an exception.
+        """
+        callback_metrics = {}
+        for report_type, executor in self.callback_executors.items():
+            if executor:
+                callback_metrics[report_type] = dict(policy=executor.policy,
+                                                     **executor.metrics())
+        return callback_metrics
+
+    def _negotiate_baud_rate(self):
+        """
+        Ask the server to switch to negotiated_baud_rate.
+
+        The server acknowledges the request at the current rate and then
+        switches. The switch is confirmed with a loop back at the new
+        rate. If the confirmation is not received, the client returns
+        to baud_rate and waits for the server, which also reverts when
+        it does not receive a command at the new rate.
+        """
+        rate = self.negotiated_baud_rate
+        command = [PrivateConstants.SET_BAUD_RATE, (rate >> 24) & 0xff,
+                   (rate >> 16) & 0xff, (rate >> 8) & 0xff, rate & 0xff]
+        reply = self._handshake(command, (PrivateConstants.BAUD_RATE_REPORT,))
+        if not reply or not reply[0]:
+            print(f'The server did not accept a baud rate of {rate}')
+            return
+
+        self.serial_port.flush()
+        self.serial_port.baudrate = rate
+
+        command = [PrivateConstants.LOOP_COMMAND, 0]
+        if self._handshake(command, (PrivateConstants.LOOP_COMMAND,)) is not None:
+            print(f'Baud rate set to {rate}')
+            return
+
+        print(f'A baud rate of {rate} could not be confirmed. '
+              f'Continuing at {self.baud_rate}')
+        self.serial_port.baudrate = self.baud_rate
+        self.report_framer.reset()
         command = [PrivateConstants.ARE_U_THERE]
-        self._send_command(command)
-        # provide time for the reply
-        time.sleep(.5)
+        self._handshake(command, (PrivateConstants.I_AM_HERE_REPORT,))
 
     def _get_firmware_version(self):
         """
@@ -554,9 +1730,98 @@ class Telemetrix(threading.Thread):
 
         """
         command = [PrivateConstants.GET_FIRMWARE_VERSION]
-        self._send_command(command)
-        # provide time for the reply
-        time.sleep(.5)
+        self._handshake(command, (PrivateConstants.FIRMWARE_REPORT,))
+
+    def _handshake(self, command, key, retries=None):
+        """
+        Send a startup request and wait for its reply. The request is
+        repeated up to handshake_retries times if no reply arrives
+        within handshake_timeout seconds.
+
+        :param command: command data in the form of a list
+
+        :param key: tuple identifying the answering report
+
+        :param retries: overrides handshake_retries
+
+        :return: reply data list, or None if the server did not reply
+        """
+        if retries is None:
+            retries = self.handshake_retries
+
+        for attempt in range(retries + 1):
+            future = self._add_pending_request(key)
+            self._send_command(list(command))
+            try:
+                return future.result(timeout=self.handshake_timeout)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+            except concurrent.futures.CancelledError:
+                break
+        return None
+
+    def get_input_snapshot(self, report_types=None):
+        """
+        Copy the latest reported values of the input pins. The copy is
+        consistent: no report is applied part way through it. Values are
+        recorded whether or not a callback is registered for the pin.
+
+        :param report_types: A list of PrivateConstants.ANALOG_REPORT,
+                             PrivateConstants.DIGITAL_REPORT and
+                             PrivateConstants.SONAR_DISTANCE. If None,
+                             all three are copied.
+
+        :return: A dictionary keyed by report type. Each entry is a tuple of
+                 (values, timestamps, sequence numbers), each an array
+                 indexed by pin number. Sonar distances are indexed by
+                 trigger pin. The sequence number counts the reports
+                 received for a pin, and is 0 for a pin that has not
+                 reported.
+        """
+        tables = {PrivateConstants.ANALOG_REPORT: self.analog_inputs,
+                  PrivateConstants.DIGITAL_REPORT: self.digital_inputs,
+                  PrivateConstants.SONAR_DISTANCE: self.sonar_distances}
+
+        if report_types is None:
+            report_types = self.LATEST_VALUE_REPORTS
+
+        snapshot = {}
+        for report_type in report_types:
+            if report_type not in tables:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Report type {report_type} has no input values')
+            snapshot[report_type] = tables[report_type].snapshot()
+        return snapshot
+
+    def get_output_cache_metrics(self):
+        """
+        Retrieve the number of output writes sent and suppressed by the
+        output cache. Only writes made while the cache is enabled are
+        counted.
+
+        :return: A dictionary with the number of writes 'sent' and
+                 'suppressed'.
+        """
+        return {'sent': self.output_writes_sent,
+                'suppressed': self.output_writes_suppressed}
+
+    def get_report_queue_metrics(self):
+        """
+        Retrieve the metrics of the queue between the receive thread and
+        the reporter thread.
+
+        :return: A dictionary containing the number of queued reports,
+                 the largest number seen and the number of reports dropped
+                 by the report queue policy. Only the number of queued
+                 reports is available if report_queue_size is 0.
+                 None for boards in a fleet.
+        """
+        if self.fleet:
+            return None
+        if isinstance(self.report_queue, TelemetrixReportQueue):
+            return self.report_queue.metrics()
+        return {'depth': self.report_queue.qsize()}
 
     def i2c_read(self, address, register, number_of_bytes,
                  callback=None, i2c_port=0,
@@ -573,7 +1838,7 @@ class Telemetrix(threading.Thread):
 
         :param number_of_bytes: number of bytes to be read
 
-        :param callback: Required callback function to report
+        :param callback: Optional callback function to report
                          i2c data as a result of read command
 
        :param i2c_port: 0 = default, 1 = secondary
@@ -582,6 +1847,10 @@ class Telemetrix(threading.Thread):
                                        before read
                               Else, the write is suppressed
 
+       :return: A future that is resolved with the callback data list
+                when the data is received.
+                Cancel it if the reply is no longer wanted.
+
 
         callback returns a data list:
 
@@ -591,9 +1860,9 @@ class Telemetrix(threading.Thread):
 
         """
 
-        self._i2c_read_request(address, register, number_of_bytes,
-                               callback=callback, i2c_port=i2c_port,
-                               write_register=write_register)
+        return self._i2c_read_request(address, register, number_of_bytes,
+                                      callback=callback, i2c_port=i2c_port,
+                                      write_register=write_register)
 
     def i2c_read_restart_transmission(self, address, register,
                                       number_of_bytes,
@@ -613,7 +1882,7 @@ class Telemetrix(threading.Thread):
 
         :param number_of_bytes: number of bytes to be read
 
-        :param callback: Required callback function to report i2c
+        :param callback: Optional callback function to report i2c
                          data as a result of read command
 
        :param i2c_port: 0 = default 1 = secondary
@@ -621,6 +1890,10 @@ class Telemetrix(threading.Thread):
        :param write_register: If True, the register is written before read
                               Else, the write is suppressed
 
+       :return: A future that is resolved with the callback data list
+                when the data is received.
+                Cancel it if the reply is no longer wanted.
+
 
 
         callback returns a data list:
@@ -630,17 +1903,20 @@ class Telemetrix(threading.Thread):
 
         """
 
-        self._i2c_read_request(address, register, number_of_bytes,
-                               stop_transmission=False,
-                               callback=callback, i2c_port=i2c_port,
-                               write_register=write_register)
+        return self._i2c_read_request(address, register, number_of_bytes,
+                                      stop_transmission=False,
+                                      callback=callback, i2c_port=i2c_port,
+                                      write_register=write_register)
 
     def _i2c_read_request(self, address, register, number_of_bytes,
                           stop_transmission=True, callback=None, i2c_port=0,
                           write_register=True):
         """
         This method requests the read of an i2c device. Results are retrieved
-        via callback.
+        via callback and the returned future.
+
+        A read does not need to complete before the next one is issued.
+        Each reply is delivered to the callback of the request it answers.
 
         :param address: i2c device address
 
@@ -650,12 +1926,15 @@ class Telemetrix(threading.Thread):
 
         :param stop_transmission: stop transmission after read
 
-        :param callback: Required callback function to report i2c data as a
+        :param callback: Optional callback function to report i2c data as a
                    result of read command.
 
        :param write_register: If True, the register is written before read
                               Else, the write is suppressed
 
+       :return: future resolved with the callback data list
+                Cancel it if the reply is no longer wanted.
+
         """
         if not i2c_port:
             if not self.i2c_1_active:
@@ -671,16 +1950,6 @@ class Telemetrix(threading.Thread):
                 raise RuntimeError(
                     'I2C Read: set_pin_mode i2c never called for i2c port 2.')
 
-        if not callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('I2C Read: A callback function must be specified.')
-
-        if not i2c_port:
-            self.i2c_callback = callback
-        else:
-            self.i2c_callback2 = callback
-
         if not register:
             register = 0
 
@@ -697,9 +1966,124 @@ class Telemetrix(threading.Thread):
         # 5. i2c port
         # 6. suppress write flag
 
+        # The reply is matched to this request by port, address and register,
+        # so any number of reads may be outstanding at the same time.
+        future = self._add_pending_request((PrivateConstants.I2C_READ_REPORT,
+                                            i2c_port, address, register),
+                                           callback)
+
         command = [PrivateConstants.I2C_READ, address, register, number_of_bytes,
                    stop_transmission, i2c_port, write_register]
         self._send_command(command)
+        return future
+
+    def i2c_start_periodic_read(self, address, register, number_of_bytes,
+                                interval, callback=None, i2c_port=0,
+                                write_register=True, stop_transmission=True):
+        """
+        Have the server read the specified number of bytes from the
+        specified register of an i2c device every interval milliseconds.
+
+        The server samples the device on its own timer and streams an i2c
+        read report for each sample, so no commands are sent by the client
+        while the stream is running.
+
+        This requires Telemetrix4Arduino firmware that supports periodic
+        i2c reads.
+
+        :param address: i2c device address
+
+        :param register: i2c register (or None if no register
+                                       selection is needed)
+
+        :param number_of_bytes: number of bytes to be read
+
+        :param interval: sampling interval in milliseconds: 1 - 65535
+
+        :param callback: Required callback function to report
+                         i2c data for each sample
+
+        :param i2c_port: 0 = default, 1 = secondary
+
+        :param write_register: If True, the register is written
+                               before each read
+                               Else, the write is suppressed
+
+        :param stop_transmission: If False, the transmission is restarted
+                                  after each read, as with
+                                  i2c_read_restart_transmission
+
+        callback returns a data list:
+
+        [I2C_READ_REPORT, i2c_port, number of bytes read, address, register,
+        bytes read..., time-stamp]
+
+        """
+        if not i2c_port:
+            if not self.i2c_1_active:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(
+                    'I2C Periodic Read: set_pin_mode i2c never called for i2c port 1.')
+
+        if i2c_port:
+            if not self.i2c_2_active:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(
+                    'I2C Periodic Read: set_pin_mode i2c never called for i2c port 2.')
+
+        if not callback:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError('I2C Periodic Read: A callback function must be specified.')
+
+        if not 0 < interval <= 0xffff:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError('I2C Periodic Read: interval range is 1 - 65535 ms.')
+
+        if not register:
+            register = 0
+
+        self.i2c_periodic_callbacks[(i2c_port, address, register)] = callback
+
+        # message contains:
+        # 1. address
+        # 2. register
+        # 3. number of bytes
+        # 4. stop_transmission - True or False
+        # 5. i2c port
+        # 6. write register flag
+        # 7. interval msb
+        # 8. interval lsb
+
+        command = [PrivateConstants.I2C_START_PERIODIC_READ, address, register,
+                   number_of_bytes, int(bool(stop_transmission)), i2c_port,
+                   int(bool(write_register)), interval >> 8, interval & 0xff]
+        self._send_command(command)
+
+    def i2c_stop_periodic_read(self, address, register, i2c_port=0):
+        """
+        Stop a periodic read started with i2c_start_periodic_read.
+
+        :param address: i2c device address
+
+        :param register: i2c register (or None if no register
+                                       selection is needed)
+
+        :param i2c_port: 0 = default, 1 = secondary
+
+        """
+        if not register:
+            register = 0
+
+        # any samples still in flight are discarded
+        self.i2c_periodic_callbacks.pop((i2c_port, address, register), None)
+
+        command = [PrivateConstants.I2C_STOP_PERIODIC_READ, address, register,
+                   i2c_port]
+        self._send_command(command)
 
     def i2c_write(self, address, args, i2c_port=0):
         """
@@ -744,10 +2128,15 @@ class Telemetrix(threading.Thread):
 
         :param callback: Looped back character will appear in the callback method
 
+        :return: future resolved with the looped back data
+                 Cancel it if the reply is no longer wanted.
+
         """
         command = [PrivateConstants.LOOP_COMMAND, ord(start_character)]
-        self.loop_back_callback = callback
+        future = self._add_pending_request((PrivateConstants.LOOP_COMMAND,),
+                                           callback)
         self._send_command(command)
+        return future
 
     def set_analog_scan_interval(self, interval):
         """
@@ -764,6 +2153,85 @@ class Telemetrix(threading.Thread):
                 self.shutdown()
             raise RuntimeError('Analog interval must be between 0 and 255')
 
+    def set_callback_policy(self, policy, report_types=None, max_workers=None):
+        """
+        Select how user callbacks are executed. By default, callbacks are
+        called by the reporter thread, and a slow callback delays the
+        processing of all reports that follow it.
+
+        With any policy other than 'inline', the future returned by a
+        request may be resolved before its callback has run.
+
+        :param policy: 'inline' - called by the reporter thread.
+                       'thread_pool' - run on a pool of threads, possibly
+                       concurrently and out of order.
+                       'ordered' - each callback function runs on a worker
+                       thread of its own, in the order the reports were
+                       received.
+                       'process_pool' - run in a pool of processes, for cpu
+                       heavy callbacks. The callback must be a module
+                       level function and cannot use the board.
+
+        :param report_types: A list of report types, such as
+                             PrivateConstants.ANALOG_REPORT or
+                             PrivateConstants.SONAR_DISTANCE, that the
+                             policy applies to. If None, the policy applies
+                             to all report types without a policy of their own.
+
+        :param max_workers: Number of threads or processes in a pool.
+        """
+        if policy != 'inline' and policy not in TelemetrixCallbackExecutor.POLICIES:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError(f'Unknown callback policy: {policy}')
+
+        if report_types is None:
+            report_types = [None]
+
+        # None selects inline execution
+        executor = None
+        if policy != 'inline':
+            executor = TelemetrixCallbackExecutor(policy, max_workers)
+
+        for report_type in report_types:
+            previous = self.callback_executors.pop(report_type, None)
+            if previous and previous not in self.callback_executors.values():
+                previous.shutdown()
+            self.callback_executors[report_type] = executor
+
+    def set_callback_rate_limit(self, max_rate, report_types=None):
+        """
+        Limit how often the callback of each pin is called. Reports
+        received within 1/max_rate seconds of the last callback are not
+        passed to the callback immediately. Instead, the latest of them
+        is passed once the interval has passed, so the callback always
+        receives the newest value without being called for every report.
+
+        The latest values are also available at any time from
+        analog_value, digital_value and sonar_value.
+
+        :param max_rate: maximum number of callbacks per second for each
+                         pin. None or 0 removes the limit.
+
+        :param report_types: A list of PrivateConstants.ANALOG_REPORT,
+                             PrivateConstants.DIGITAL_REPORT and
+                             PrivateConstants.SONAR_DISTANCE. If None, the
+                             limit applies to all three.
+        """
+        if report_types is None:
+            report_types = self.LATEST_VALUE_REPORTS
+
+        for report_type in report_types:
+            if report_type not in self.LATEST_VALUE_REPORTS:
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Callback rates cannot be limited for '
+                                   f'report type {report_type}')
+            if max_rate:
+                self.callback_rate_limits[report_type] = 1 / max_rate
+            else:
+                self.callback_rate_limits.pop(report_type, None)
+
     def set_pin_mode_analog_output(self, pin_number):
         """
         Set a pin as a pwm (analog output) pin.
@@ -935,6 +2403,7 @@ class Telemetrix(threading.Thread):
             minv = (min_pulse).to_bytes(2, byteorder="big")
             maxv = (max_pulse).to_bytes(2, byteorder="big")
 
+            self._forget_output(pin_number)
             command = [PrivateConstants.SERVO_ATTACH, pin_number,
                        minv[0], minv[1], maxv[0], maxv[1]]
             self._send_command(command)
@@ -1101,7 +2570,7 @@ class Telemetrix(threading.Thread):
 
         """
         command = [PrivateConstants.SERVO_WRITE, pin_number, angle]
-        self._send_command(command)
+        self._send_output_command(command)
 
     def servo_detach(self, pin_number):
         """
@@ -1110,6 +2579,7 @@ class Telemetrix(threading.Thread):
         :param pin_number: attached pin
 
         """
+        self._forget_output(pin_number)
         command = [PrivateConstants.SERVO_DETACH, pin_number]
         self._send_command(command)
 
@@ -1185,8 +2655,12 @@ class Telemetrix(threading.Thread):
 
         :param motor_id: 0 - 7
 
-        :param completion_callback: call back function to receive motion complete
-                                    notification
+        :param completion_callback: optional call back function to receive motion
+                                    complete notification
+
+        :return: A future that is resolved with the callback data list
+                 when the motion completes.
+                 Cancel it if the reply is no longer wanted.
 
         callback returns a data list:
 
@@ -1194,20 +2668,18 @@ class Telemetrix(threading.Thread):
 
         The report_type = 19
         """
-        if not completion_callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('stepper_run: A motion complete callback must be '
-                               'specified.')
-
         if not self.stepper_info_list[motor_id]['instance']:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('stepper_run: Invalid motor_id.')
 
-        self.stepper_info_list[motor_id]['motion_complete_callback'] = completion_callback
+        # the motion may take any length of time
+        future = self._add_pending_request(
+            (PrivateConstants.STEPPER_RUN_COMPLETE_REPORT, motor_id),
+            completion_callback, lifetime=None)
         command = [PrivateConstants.STEPPER_RUN, motor_id]
         self._send_command(command)
+        return future
 
     def stepper_run_speed(self, motor_id):
         """
@@ -1373,97 +2845,90 @@ class Telemetrix(threading.Thread):
 
         return self.stepper_info_list[motor_id]['speed']
 
-    def stepper_get_distance_to_go(self, motor_id, distance_to_go_callback):
+    def stepper_get_distance_to_go(self, motor_id, distance_to_go_callback=None):
         """
         Request the distance from the current position to the target position
         from the server.
 
         :param motor_id: 0 - 7
 
-        :param distance_to_go_callback: required callback function to receive report
+        :param distance_to_go_callback: optional callback function to receive report
 
-        :return: The distance to go is returned via the callback as a list:
+        :return: The distance to go is returned via the callback as a list.
+                 A future, resolved with the same list, is returned.
+                 Cancel it if the reply is no longer wanted.
 
         [REPORT_TYPE=15, motor_id, distance in steps, time_stamp]
 
         A positive distance is clockwise from the current position.
 
         """
-        if not distance_to_go_callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('stepper_get_distance_to_go Read: A callback function must be specified.')
-
         if not self.stepper_info_list[motor_id]['instance']:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('stepper_get_distance_to_go: Invalid motor_id.')
-        self.stepper_info_list[motor_id][
-            'distance_to_go_callback'] = distance_to_go_callback
+        future = self._add_pending_request(
+            (PrivateConstants.STEPPER_DISTANCE_TO_GO, motor_id),
+            distance_to_go_callback)
         command = [PrivateConstants.STEPPER_GET_DISTANCE_TO_GO, motor_id]
         self._send_command(command)
+        return future
 
-    def stepper_get_target_position(self, motor_id, target_callback):
+    def stepper_get_target_position(self, motor_id, target_callback=None):
         """
         Request the most recently set target position from the server.
 
         :param motor_id: 0 - 7
 
-        :param target_callback: required callback function to receive report
+        :param target_callback: optional callback function to receive report
 
-        :return: The distance to go is returned via the callback as a list:
+        :return: The distance to go is returned via the callback as a list.
+                 A future, resolved with the same list, is returned.
+                 Cancel it if the reply is no longer wanted.
 
         [REPORT_TYPE=16, motor_id, target position in steps, time_stamp]
 
         Positive is clockwise from the 0 position.
 
         """
-        if not target_callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError(
-                'stepper_get_target_position Read: A callback function must be specified.')
-
         if not self.stepper_info_list[motor_id]['instance']:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('stepper_get_target_position: Invalid motor_id.')
 
-        self.stepper_info_list[motor_id][
-            'target_position_callback'] = target_callback
-
+        future = self._add_pending_request(
+            (PrivateConstants.STEPPER_TARGET_POSITION, motor_id), target_callback)
         command = [PrivateConstants.STEPPER_GET_TARGET_POSITION, motor_id]
         self._send_command(command)
+        return future
 
-    def stepper_get_current_position(self, motor_id, current_position_callback):
+    def stepper_get_current_position(self, motor_id, current_position_callback=None):
         """
         Request the current motor position from the server.
 
         :param motor_id: 0 - 7
 
-        :param current_position_callback: required callback function to receive report
+        :param current_position_callback: optional callback function to receive report
 
-        :return: The current motor position returned via the callback as a list:
+        :return: The current motor position returned via the callback as a list.
+                 A future, resolved with the same list, is returned.
+                 Cancel it if the reply is no longer wanted.
 
         [REPORT_TYPE=17, motor_id, current position in steps, time_stamp]
 
         Positive is clockwise from the 0 position.
         """
-        if not current_position_callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError(
-                'stepper_get_current_position Read: A callback function must be specified.')
-
         if not self.stepper_info_list[motor_id]['instance']:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('stepper_get_current_position: Invalid motor_id.')
 
-        self.stepper_info_list[motor_id]['current_position_callback'] = current_position_callback
-
+        future = self._add_pending_request(
+            (PrivateConstants.STEPPER_CURRENT_POSITION, motor_id),
+            current_position_callback)
         command = [PrivateConstants.STEPPER_GET_CURRENT_POSITION, motor_id]
         self._send_command(command)
+        return future
 
     def stepper_set_current_position(self, motor_id, position):
         """
@@ -1499,8 +2964,12 @@ class Telemetrix(threading.Thread):
 
         :param motor_id: 0 - 7
 
-        :param completion_callback: call back function to receive motion complete
-                                    notification
+        :param completion_callback: optional call back function to receive motion
+                                    complete notification
+
+        :return: A future that is resolved with the callback data list
+                 when the motion completes.
+                 Cancel it if the reply is no longer wanted.
 
         callback returns a data list:
 
@@ -1508,20 +2977,18 @@ class Telemetrix(threading.Thread):
 
         The report_type = 19
         """
-        if not completion_callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('stepper_run_speed_to_position: A motion complete '
-                               'callback must be '
-                               'specified.')
         if not self.stepper_info_list[motor_id]['instance']:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('stepper_run_speed_to_position: Invalid motor_id.')
 
-        self.stepper_info_list[motor_id]['motion_complete_callback'] = completion_callback
+        # the motion may take any length of time
+        future = self._add_pending_request(
+            (PrivateConstants.STEPPER_RUN_COMPLETE_REPORT, motor_id),
+            completion_callback, lifetime=None)
         command = [PrivateConstants.STEPPER_RUN_SPEED_TO_POSITION, motor_id]
         self._send_command(command)
+        return future
 
     def stepper_stop(self, motor_id):
         """
@@ -1529,6 +2996,9 @@ class Telemetrix(threading.Thread):
         to stop as quickly as possible, using the current speed and
         acceleration parameters.
 
+        The futures returned by stepper_run and stepper_run_speed_to_position
+        for this motor are cancelled.
+
         :param motor_id:  0 - 7
         """
         if not self.stepper_info_list[motor_id]['instance']:
@@ -1538,6 +3008,8 @@ class Telemetrix(threading.Thread):
 
         command = [PrivateConstants.STEPPER_STOP, motor_id]
         self._send_command(command)
+        self._cancel_pending_requests(
+            key=(PrivateConstants.STEPPER_RUN_COMPLETE_REPORT, motor_id))
 
     def stepper_disable_outputs(self, motor_id):
         """
@@ -1687,7 +3159,7 @@ class Telemetrix(threading.Thread):
 
         self._send_command(command)
 
-    def stepper_is_running(self, motor_id, callback):
+    def stepper_is_running(self, motor_id, callback=None):
         """
         Checks to see if the motor is currently running to a target.
 
@@ -1695,27 +3167,24 @@ class Telemetrix(threading.Thread):
 
         :param motor_id: 0-7
 
-        :param callback: required callback function to receive report
+        :param callback: optional callback function to receive report
 
-        :return: The current running state returned via the callback as a list:
+        :return: The current running state returned via the callback as a list.
+                 A future, resolved with the same list, is returned.
+                 Cancel it if the reply is no longer wanted.
 
         [REPORT_TYPE=18, motor_id, True or False for running state, time_stamp]
         """
-        if not callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError(
-                'stepper_is_running: A callback function must be specified.')
-
         if not self.stepper_info_list[motor_id]['instance']:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('stepper_is_running: Invalid motor_id.')
 
-        self.stepper_info_list[motor_id]['is_running_callback'] = callback
-
+        future = self._add_pending_request(
+            (PrivateConstants.STEPPER_RUNNING_REPORT, motor_id), callback)
         command = [PrivateConstants.STEPPER_IS_RUNNING, motor_id]
         self._send_command(command)
+        return future
 
     def _set_pin_mode(self, pin_number, pin_state, differential=0, callback=None):
         """
@@ -1746,6 +3215,8 @@ class Telemetrix(threading.Thread):
                 print('{} {}'.format('set_pin_mode: callback ignored for '
                                      'pin state:', pin_state))
 
+        self._forget_output(pin_number)
+
         if pin_state == PrivateConstants.AT_INPUT:
             command = [PrivateConstants.SET_PIN_MODE, pin_number,
                        PrivateConstants.AT_INPUT, 1]
@@ -1775,14 +3246,43 @@ class Telemetrix(threading.Thread):
         This method attempts an orderly shutdown
         If any exceptions are thrown, they are ignored.
         """
+        # When called by the application, have the server stop reporting
+        # and wait for a loop back confirming that it has done so. The
+        # client's own threads cannot wait for a reply.
+        reports_stopped = False
+        threads_running = self._is_running()
+        if threads_running and not self.shutdown_flag and \
+                threading.current_thread() not in (self.the_reporter_thread,
+                                                   self.the_data_receive_thread,
+                                                   self.the_write_thread):
+            try:
+                command = [PrivateConstants.STOP_ALL_REPORTS]
+                self._send_command(command)
+                command = [PrivateConstants.LOOP_COMMAND, 0]
+                reports_stopped = self._handshake(
+                    command, (PrivateConstants.LOOP_COMMAND,), retries=0) is not None
+            except Exception:
+                pass
+
         self.shutdown_flag = True
 
         self._stop_threads()
 
+        # nothing more will be received
+        self._cancel_pending_requests()
+
+        for executor in set(self.callback_executors.values()):
+            if executor:
+                executor.shutdown()
+
         try:
-            command = [PrivateConstants.STOP_ALL_REPORTS]
-            self._send_command(command)
-            time.sleep(.5)
+            # write any coalesced commands and send the rest directly
+            self.write_coalesce_interval = 0
+            self._flush_writes()
+
+            if not reports_stopped and not self.connection_error:
+                command = [PrivateConstants.STOP_ALL_REPORTS]
+                self._send_command(command)
 
             if self.ip_address:
                 try:
@@ -1790,10 +3290,28 @@ class Telemetrix(threading.Thread):
                     self.sock.close()
                 except Exception:
                     pass
+                if self.udp_sock:
+                    try:
+                        # an empty datagram wakes the udp receive thread
+                        self.udp_sock.sendto(b'', self.udp_sock.getsockname())
+                    except OSError:
+                        pass
+                    self.udp_sock.close()
+            elif self.ble_address:
+                self._close_ble()
             else:
                 try:
+                    # wait until all commands have been transmitted
+                    self.serial_port.flush()
                     self.serial_port.reset_input_buffer()
-                    self.serial_port.reset_output_buffer()
+
+                    # let the receive thread leave its read before the
+                    # port is closed
+                    if threads_running and not self.fleet and \
+                            threading.current_thread() is not \
+                            self.the_data_receive_thread:
+                        self.serial_port.cancel_read()
+                        self.the_data_receive_thread.join(1)
 
                     self.serial_port.close()
                     self.serial_port_register.remove(self.serial_port)
@@ -1820,6 +3338,16 @@ class Telemetrix(threading.Thread):
         command = [PrivateConstants.SONAR_ENABLE]
         self._send_command(command)
 
+    def sonar_value(self, trigger_pin):
+        """
+        Retrieve the latest distance reported by a sonar device.
+
+        :param trigger_pin: trigger pin of the device
+
+        :return: the distance, or None if the device has not reported
+        """
+        return self.sonar_distances.value(trigger_pin)
+
     def spi_cs_control(self, chip_select_pin, select):
         """
         Control an SPI chip select line
@@ -1849,13 +3377,17 @@ class Telemetrix(threading.Thread):
 
         :param number_of_bytes_to_read: Number of bytes to read
 
-        :param call_back: Required callback function to report spi data as a
+        :param call_back: Optional callback function to report spi data as a
                    result of read command
 
         :param enable_read_bit: Many SPI devices require that the register
                                 selection be OR'ed with 0x80. If set to True
                                 the bit will be set.
 
+        :return: A future that is resolved with the callback data list
+                 when the data is received.
+                 Cancel it if the reply is no longer wanted.
+
 
         callback returns a data list:
         [SPI_READ_REPORT, count of data bytes read, data bytes, time-stamp]
@@ -1869,17 +3401,13 @@ class Telemetrix(threading.Thread):
                 self.shutdown()
             raise RuntimeError(f'spi_read_blocking: SPI interface is not enabled.')
 
-        if not call_back:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('spi_read_blocking: A Callback must be specified')
-
-        self.spi_callback = call_back
+        future = self._add_pending_request((PrivateConstants.SPI_REPORT,), call_back)
 
         command = [PrivateConstants.SPI_READ_BLOCKING, number_of_bytes_to_read,
                    register_selection, enable_read_bit]
 
         self._send_command(command)
+        return future
 
     def spi_set_format(self, clock_divisor, bit_order, data_mode):
         """
@@ -1961,7 +3489,10 @@ class Telemetrix(threading.Thread):
         """
         Reset the onewire device
 
-        :param callback: required  function to report reset result
+        :param callback: optional function to report reset result
+
+        :return: A future that is resolved with the callback data list.
+                 Cancel it if the reply is no longer wanted.
 
         callback returns a list:
         [ReportType = 14, Report Subtype = 25, reset result byte,
@@ -1971,15 +3502,12 @@ class Telemetrix(threading.Thread):
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError(f'onewire_reset: OneWire interface is not enabled.')
-        if not callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('onewire_reset: A Callback must be specified')
-
-        self.onewire_callback = callback
-
+        future = self._add_pending_request((PrivateConstants.ONE_WIRE_REPORT,
+                                            PrivateConstants.ONE_WIRE_RESET),
+                                           callback)
         command = [PrivateConstants.ONE_WIRE_RESET]
         self._send_command(command)
+        return future
 
     def onewire_select(self, device_address):
         """
@@ -2047,9 +3575,12 @@ class Telemetrix(threading.Thread):
     def onewire_read(self, callback=None):
         """
         Read a byte from the onewire device
-        :param callback: required  function to report onewire data as a
+        :param callback: optional function to report onewire data as a
                    result of read command
 
+        :return: A future that is resolved with the callback data list.
+                 Cancel it if the reply is no longer wanted.
+
 
         callback returns a data list:
         [ONEWIRE_REPORT, ONEWIRE_READ=29, data byte, time-stamp]
@@ -2061,15 +3592,12 @@ class Telemetrix(threading.Thread):
                 self.shutdown()
             raise RuntimeError(f'onewire_read: OneWire interface is not enabled.')
 
-        if not callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('onewire_read A Callback must be specified')
-
-        self.onewire_callback = callback
-
+        future = self._add_pending_request((PrivateConstants.ONE_WIRE_REPORT,
+                                            PrivateConstants.ONE_WIRE_READ),
+                                           callback)
         command = [PrivateConstants.ONE_WIRE_READ]
         self._send_command(command)
+        return future
 
     def onewire_reset_search(self):
         """
@@ -2092,7 +3620,10 @@ class Telemetrix(threading.Thread):
         If no more devices are found, the address returned contains all elements set
         to 0xff.
 
-        :param callback: required  function to report a onewire device address
+        :param callback: optional function to report a onewire device address
+
+        :return: A future that is resolved with the callback data list.
+                 Cancel it if the reply is no longer wanted.
 
         callback returns a data list:
         [ONEWIRE_REPORT, ONEWIRE_SEARCH=31, 8 byte address, time-stamp]
@@ -2104,22 +3635,22 @@ class Telemetrix(threading.Thread):
                 self.shutdown()
             raise RuntimeError(f'onewire_search: OneWire interface is not enabled.')
 
-        if not callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('onewire_read A Callback must be specified')
-
-        self.onewire_callback = callback
-
+        future = self._add_pending_request((PrivateConstants.ONE_WIRE_REPORT,
+                                            PrivateConstants.ONE_WIRE_SEARCH),
+                                           callback)
         command = [PrivateConstants.ONE_WIRE_SEARCH]
         self._send_command(command)
+        return future
 
     def onewire_crc8(self, address_list, callback=None):
         """
         Compute a CRC check on an array of data.
         :param address_list:
 
-        :param callback: required  function to report a onewire device address
+        :param callback: optional function to report the crc
+
+        :return: A future that is resolved with the callback data list.
+                 Cancel it if the reply is no longer wanted.
 
         callback returns a data list:
         [ONEWIRE_REPORT, ONEWIRE_CRC8=32, CRC, time-stamp]
@@ -2133,26 +3664,24 @@ class Telemetrix(threading.Thread):
                 self.shutdown()
             raise RuntimeError(f'onewire_crc8: OneWire interface is not enabled.')
 
-        if not callback:
-            if self.shutdown_on_exception:
-                self.shutdown()
-            raise RuntimeError('onewire_crc8 A Callback must be specified')
-
         if type(address_list) is not list:
             if self.shutdown_on_exception:
                 self.shutdown()
             raise RuntimeError('onewire_crc8: address list must be a list.')
 
-        self.onewire_callback = callback
-
         address_length = len(address_list)
 
+        future = self._add_pending_request((PrivateConstants.ONE_WIRE_REPORT,
+                                            PrivateConstants.ONE_WIRE_CRC8),
+                                           callback)
+
         command = [PrivateConstants.ONE_WIRE_CRC8, address_length - 1]
 
         for data in address_list:
             command.append(data)
 
         self._send_command(command)
+        return future
 
     '''
     report message handlers
@@ -2170,14 +3699,40 @@ class Telemetrix(threading.Thread):
         value = (data[1] << 8) + data[2]
         # set the current value in the pin structure
         time_stamp = time.time()
-        # self.digital_pins[pin].event_time = time_stamp
+        self.analog_inputs.update(pin, value, time_stamp)
         try:
             if self.analog_callbacks[pin]:
                 message = [PrivateConstants.ANALOG_REPORT, pin, value, time_stamp]
-                self.analog_callbacks[pin](message)
+                self._invoke_pin_callback(self.analog_callbacks[pin], message)
         except KeyError:
             pass
 
+    def _analog_block_message(self, data):
+        """
+        This is a private message handler method.
+        It is a message handler for analog block messages.
+
+        :param data: [pin, value msb, value lsb] for each changed pin
+
+        """
+        time_stamp = time.time()
+        pins = data[0::3]
+        values = [(msb << 8) + lsb for msb, lsb in zip(data[1::3], data[2::3])]
+
+        self.analog_inputs.update_pins(pins, values, time_stamp)
+
+        if self.analog_block_callback:
+            message = [PrivateConstants.ANALOG_BLOCK_REPORT, pins, values,
+                       time_stamp]
+            self._invoke_callback(self.analog_block_callback, message)
+        else:
+            for pin, value in zip(pins, values):
+                callback = self.analog_callbacks.get(pin)
+                if callback:
+                    message = [PrivateConstants.ANALOG_REPORT, pin, value,
+                               time_stamp]
+                    self._invoke_pin_callback(callback, message)
+
     def _dht_report(self, data):
         """
         This is the dht report handler method.
@@ -2195,181 +3750,952 @@ class Telemetrix(threading.Thread):
 
                                 data[2] = dht type 11 or 22
 
-                                data[3] = humidity positivity flag
+                                data[3] = humidity positivity flag
+
+                                data[4] = temperature positivity value
+
+                                data[5] = humidity integer
+
+                                data[6] = humidity fractional value
+
+                                data[7] = temperature integer
+
+                                data[8] = temperature fractional value
+
+
+        """
+        if data[0]:  # DHT_ERROR
+            # error report
+            # data[0] = report sub type, data[1] = pin, data[2] = error message
+            if self.dht_callbacks[data[1]]:
+                # Callback 0=DHT REPORT, DHT_ERROR, PIN, Time
+                message = [PrivateConstants.DHT_REPORT, data[0], data[1], data[2],
+                           time.time()]
+                self._invoke_callback(self.dht_callbacks[data[1]], message)
+        else:
+            # got valid data DHT_DATA
+            f_humidity = float(data[5] + data[6] / 100)
+            if data[3]:
+                f_humidity *= -1.0
+            f_temperature = float(data[7] + data[8] / 100)
+            if data[4]:
+                f_temperature *= -1.0
+            message = [PrivateConstants.DHT_REPORT, data[0], data[1], data[2],
+                       f_humidity, f_temperature, time.time()]
+
+            self._invoke_callback(self.dht_callbacks[data[1]], message)
+
+    def _digital_message(self, data):
+        """
+        This is a private message handler method.
+        It is a message handler for Digital Messages.
+
+        :param data: digital message
+
+        """
+        try:
+            pin = data[0]
+            value = data[1]
+
+            time_stamp = time.time()
+            self.digital_inputs.update(pin, value, time_stamp)
+            if self.digital_callbacks[pin]:
+                message = [PrivateConstants.DIGITAL_REPORT, pin, value, time_stamp]
+                self._invoke_pin_callback(self.digital_callbacks[pin], message)
+        except:
+            # print('malformed message in _digital_message')
+            pass
+
+    def _firmware_message(self, data):
+        """
+        Telemetrix4Arduino firmware version message
+
+        :param data: data[0] = major number, data[1] = minor number.
+
+                               data[2] = patch number
+        """
+
+        self.firmware_version = [data[0], data[1], data[2]]
+        self._complete_pending_request((PrivateConstants.FIRMWARE_REPORT,), data)
+
+    def _i2c_read_report(self, data):
+        """
+        Execute callback for i2c reads and periodic i2c reads.
+
+        :param data: [I2C_READ_REPORT, i2c_port, number of bytes read, address, register, bytes read..., time-stamp]
+        """
+
+        # we receive [# data bytes, address, register, data bytes]
+        # number of bytes of data returned
+
+        # data[0] = number of bytes
+        # data[1] = i2c_port
+        # data[2] = number of bytes returned
+        # data[3] = address
+        # data[4] = register
+        # data[5] ... all the data bytes
+
+        cb_list = [PrivateConstants.I2C_READ_REPORT, data[0], data[1]] + data[2:]
+        cb_list.append(time.time())
+
+        # a reply to an i2c_read request takes precedence over
+        # a periodic read of the same register
+        if not self._complete_pending_request((PrivateConstants.I2C_READ_REPORT,
+                                               data[0], data[2], data[3]), cb_list):
+            callback = self.i2c_periodic_callbacks.get((data[0], data[2], data[3]))
+            if callback:
+                self._invoke_callback(callback, cb_list)
+
+    def _i2c_too_few(self, data):
+        """
+        I2c reports too few bytes received
+
+        :param data: data[0] = device address
+        """
+        error = RuntimeError(
+            f'i2c too few bytes received from i2c port {data[0]} i2c address {data[1]}')
+        self._fail_i2c_request(data[0], data[1], error)
+        if self.shutdown_on_exception:
+            self.shutdown()
+        raise error
+
+    def _i2c_too_many(self, data):
+        """
+        I2c reports too few bytes received
+
+        :param data: data[0] = device address
+        """
+        error = RuntimeError(
+            f'i2c too many bytes received from i2c port {data[0]} i2c address {data[1]}')
+        self._fail_i2c_request(data[0], data[1], error)
+        if self.shutdown_on_exception:
+            self.shutdown()
+        raise error
+
+    def _fail_i2c_request(self, i2c_port, address, exception):
+        """
+        Fail the oldest pending read for an i2c device.
+        The error report does not identify the register, so the
+        first device read found with a pending request is failed.
+
+        :param i2c_port: 0 = i2c1, 1 = i2c2
+
+        :param address: i2c device address
+
+        :param exception: exception raised to the waiting caller
+        """
+        with self.pending_requests_lock:
+            keys = list(self.pending_requests)
+        for key in keys:
+            if key[:3] == (PrivateConstants.I2C_READ_REPORT, i2c_port, address):
+                self._fail_pending_request(key, exception)
+                return
+
+    def _i_am_here(self, data):
+        """
+        Reply to are_u_there message
+        :param data: arduino id
+        """
+        self.reported_arduino_id = data[0]
+        self._complete_pending_request((PrivateConstants.I_AM_HERE_REPORT,), data)
+
+    def _spi_report(self, report):
+
+        cb_list = [PrivateConstants.SPI_REPORT, report[0]] + report[1:]
+
+        cb_list.append(time.time())
+
+        self._complete_pending_request((PrivateConstants.SPI_REPORT,), cb_list)
+
+    def _onewire_report(self, report):
+        cb_list = [PrivateConstants.ONE_WIRE_REPORT, report[0]] + report[1:]
+        cb_list.append(time.time())
+        self._complete_pending_request((PrivateConstants.ONE_WIRE_REPORT, report[0]),
+                                       cb_list)
+
+    def _report_debug_data(self, data):
+        """
+        Print debug data sent from Arduino
+        :param data: data[0] is a byte followed by 2
+                     bytes that comprise an integer
+        :return:
+        """
+        value = (data[1] << 8) + data[2]
+        print(f'DEBUG ID: {data[0]} Value: {value}')
+
+    def _report_loop_data(self, data):
+        """
+        Print data that was looped back
+        :param data: byte of loop back data
+        :return:
+        """
+        self._complete_pending_request((PrivateConstants.LOOP_COMMAND,), data)
+
+    def _new_request_future(self):
+        """
+        Create the future returned by a request method.
+
+        :return: TelemetrixRequestFuture
+        """
+        return TelemetrixRequestFuture()
+
+    def _add_pending_request(self, key, callback=None,
+                             lifetime=PrivateConstants.REQUEST_LIFETIME):
+        """
+        Register a request that is answered by a report.
+
+        This must be called before the request is sent, so that a
+        fast reply cannot arrive before the request is registered.
+        A request is removed when its future is cancelled.
+
+        A request that has not been answered within its lifetime fails
+        with a TimeoutError once a newer request for the same key is
+        made or answered, so that a lost reply does not leave every later
+        request with the reply meant for the one before it.
+
+        :param key: tuple identifying the answering report
+
+        :param callback: optional callback for this request only
+
+        :param lifetime: seconds to wait for the reply, or None to wait
+                         until it arrives
+
+        :return: future to be resolved with the callback data list
+        """
+        future = self._new_request_future()
+        deadline = None if lifetime is None else time.monotonic() + lifetime
+        request = [future, callback, deadline]
+        with self.pending_requests_lock:
+            pending = self.pending_requests.setdefault(key, deque())
+            expired = self._take_expired_requests(pending, 0)
+            pending.append(request)
+        self._expire_requests(expired)
+        future.add_done_callback(
+            lambda done: self._remove_cancelled_request(key, request))
+        return future
+
+    def _take_expired_requests(self, pending, keep):
+        """
+        Remove the requests at the head of a queue that are done or whose
+        lifetime has passed. Must be called with pending_requests_lock held.
+
+        :param pending: the pending requests for a key
+
+        :param keep: the number of requests that are always left in the queue
+
+        :return: the requests whose lifetime has passed
+        """
+        expired = []
+        now = time.monotonic()
+        while len(pending) > keep:
+            request = pending[0]
+            if request[0].done():
+                pending.popleft()
+            elif request[2] is not None and now > request[2]:
+                expired.append(pending.popleft())
+            else:
+                break
+        return expired
+
+    def _expire_requests(self, expired):
+        """
+        Fail requests whose lifetime has passed.
+
+        :param expired: [future, callback, deadline] for each request
+        """
+        for request in expired:
+            if not request[0].done():
+                try:
+                    request[0].set_exception(concurrent.futures.TimeoutError(
+                        'The server did not reply to the request'))
+                except (concurrent.futures.InvalidStateError,
+                        asyncio.InvalidStateError):
+                    pass
+
+    def _remove_cancelled_request(self, key, request):
+        """
+        Remove a cancelled request from the pending requests.
+
+        :param key: tuple identifying the answering report
+
+        :param request: [future, callback, deadline]
+        """
+        if not request[0].cancelled():
+            return
+        with self.pending_requests_lock:
+            pending = self.pending_requests.get(key)
+            if pending is None:
+                return
+            try:
+                pending.remove(request)
+            except ValueError:
+                # already taken by a reply
+                pass
+            if not pending:
+                del self.pending_requests[key]
+
+    def _next_pending_request(self, key):
+        """
+        Remove and return the oldest pending request for a key.
+        Requests that the caller has cancelled are skipped, and so are
+        requests whose lifetime has passed if a newer request is waiting.
+
+        :param key: tuple identifying the answering report
+
+        :return: [future, callback, deadline] or None
+        """
+        request = None
+        with self.pending_requests_lock:
+            pending = self.pending_requests.get(key)
+            if pending is None:
+                return None
+            expired = self._take_expired_requests(pending, 1)
+            while pending:
+                candidate = pending.popleft()
+                if not candidate[0].done():
+                    request = candidate
+                    break
+            if not pending:
+                del self.pending_requests[key]
+        self._expire_requests(expired)
+        return request
+
+    def _complete_pending_request(self, key, cb_list):
+        """
+        Resolve the oldest pending request for a key.
+
+        :param key: tuple identifying the answering report
+
+        :param cb_list: callback data list used as the result
+
+        :return: True if a pending request was found
+        """
+        request = self._next_pending_request(key)
+        if not request:
+            return False
+
+        future, callback, _ = request
+        if callback:
+            self._invoke_callback(callback, cb_list)
+        try:
+            future.set_result(cb_list)
+        except (concurrent.futures.InvalidStateError, asyncio.InvalidStateError):
+            # cancelled by the caller after the check above
+            pass
+        return True
+
+    def _fail_pending_request(self, key, exception):
+        """
+        Set an exception on the oldest pending request for a key.
+
+        :param key: tuple identifying the answering report
+
+        :param exception: exception raised to the waiting caller
+        """
+        request = self._next_pending_request(key)
+        if request:
+            try:
+                request[0].set_exception(exception)
+            except (concurrent.futures.InvalidStateError, asyncio.InvalidStateError):
+                pass
+
+    def _cancel_pending_requests(self, exception=None, key=None):
+        """
+        Cancel the requests still waiting for a reply.
+
+        :param exception: if set, the requests fail with this exception
+                          instead of being cancelled
+
+        :param key: if set, only the requests for this key are cancelled
+        """
+        with self.pending_requests_lock:
+            if key is None:
+                requests = [request for pending in self.pending_requests.values()
+                            for request in pending]
+                self.pending_requests.clear()
+            else:
+                requests = list(self.pending_requests.pop(key, ()))
+
+        for request in requests:
+            if exception is None:
+                request[0].cancel()
+            elif not request[0].done():
+                request[0].set_exception(exception)
+
+    def _invoke_callback(self, callback, data):
+        """
+        Call a user callback with report data.
+
+        All user callbacks are called through this method, allowing
+        a client implementation to control how callbacks are executed.
+        The callback is run by the executor of the callback policy for
+        the report being dispatched, or called directly if there is none.
+
+        :param callback: user callback function
+
+        :param data: callback data list
+        """
+        executor = self._callback_executor()
+        if executor:
+            executor.submit(callback, data)
+        else:
+            callback(data)
+
+    def _callback_executor(self):
+        """
+        :return: the executor of the callback policy for the report being
+                 dispatched, or None if callbacks are called inline
+        """
+        if self.dispatched_report_type in self.callback_executors:
+            return self.callback_executors[self.dispatched_report_type]
+        return self.callback_executors.get(None)
+
+    def _invoke_pin_callback(self, callback, data):
+        """
+        Call the callback of an analog, digital or sonar pin, applying
+        the rate limit of the report type if one has been set.
+
+        :param callback: user callback function
+
+        :param data: callback data list, starting with the report type
+                     and pin number
+        """
+        interval = self.callback_rate_limits.get(data[0])
+        if not interval:
+            self._invoke_callback(callback, data)
+            return
+
+        now = time.monotonic()
+        key = (data[0], data[1])
+        slot = self.rate_limited_callbacks.get(key)
+        if not slot:
+            slot = self.rate_limited_callbacks[key] = [0, None, callback]
+
+        if now >= slot[0] and slot[1] is None:
+            slot[0] = now + interval
+            self._invoke_callback(callback, data)
+            return
+
+        # keep the latest data until the interval has passed
+        slot[1] = data
+        slot[2] = callback
+        if self.rate_limit_deadline is None or slot[0] < self.rate_limit_deadline:
+            self.rate_limit_deadline = slot[0]
+            self._rate_limit_deadline_changed()
+
+    def _flush_rate_limited_callbacks(self):
+        """
+        Call the rate limited callbacks whose interval has passed with
+        the latest data they were held back from. This is run by the
+        thread that dispatches the reports.
+        """
+        now = time.monotonic()
+        deadline = None
+        for key, slot in self.rate_limited_callbacks.items():
+            if slot[1] is None:
+                continue
+            if now >= slot[0]:
+                data, slot[1] = slot[1], None
+                slot[0] = now + self.callback_rate_limits.get(key[0], 0)
+                self.dispatched_report_type = key[0]
+                self._invoke_callback(slot[2], data)
+            elif deadline is None or slot[0] < deadline:
+                deadline = slot[0]
+        self.rate_limit_deadline = deadline
+
+    def _rate_limit_timeout(self):
+        """
+        :return: seconds until a rate limited callback is due,
+                 or None if none are waiting
+        """
+        if self.rate_limit_deadline is None:
+            return None
+        return max(0, self.rate_limit_deadline - time.monotonic())
+
+    def _rate_limit_deadline_changed(self):
+        """
+        Called when a rate limited callback is held back. The reporter
+        thread recalculates its timeout after every report, so nothing
+        needs to be done here.
+        """
+        pass
+
+    def _send_output_command(self, command):
+        """
+        Send a command that sets an output pin, unless the output cache
+        shows that it would not change the pin.
+
+        :param command: command data in the form of a list, with the pin
+                        number following the command id
+        """
+        if self.output_cache is None:
+            self._send_command(command)
+            return
+
+        pin = command[1]
+        state = (command[0], *command[2:])
+        with self.output_cache_lock:
+            if self.output_cache is None:
+                self._send_command(command)
+                return
+
+            now = time.monotonic()
+            entry = self.output_cache.get(pin)
+            if entry and entry[0] == state and (entry[1] is None or now < entry[1]):
+                self.output_writes_suppressed += 1
+                return
+
+            self._send_command(command)
+            if self.output_refresh_interval is None:
+                refresh_time = None
+            else:
+                refresh_time = now + self.output_refresh_interval
+            self.output_cache[pin] = (state, refresh_time)
+            self.output_writes_sent += 1
+
+    def _forget_output(self, pin):
+        """
+        Clear the cached value of an output pin, so that the next write
+        to it is sent.
+
+        :param pin: pin number
+        """
+        if self.output_cache is not None:
+            with self.output_cache_lock:
+                if self.output_cache is not None:
+                    self.output_cache.pop(pin, None)
+
+    def _send_command(self, command):
+        """
+        This is a private utility method.
+
 
-                                data[4] = temperature positivity value
+        :param command:  command data in the form of a list
 
-                                data[5] = humidity integer
+        """
+        if self.connection_error:
+            raise RuntimeError(str(self.connection_error))
 
-                                data[6] = humidity fractional value
+        if self.auto_reconnect:
+            self._record_configuration(command)
 
-                                data[7] = temperature integer
+        # the length of the list is added at the head
+        command.insert(0, len(command))
+        send_message = bytes(command)
+        self.commands_sent += 1
 
-                                data[8] = temperature fractional value
+        batch = getattr(self.write_batch, 'buffer', None)
+        if batch is not None:
+            batch += send_message
+        else:
+            self._queue_write(send_message)
 
+    def _queue_write(self, send_message):
+        """
+        Write one or more encoded commands, or queue them for the write
+        thread if writes are being coalesced.
 
+        :param send_message: command frames as bytes
         """
-        if data[0]:  # DHT_ERROR
-            # error report
-            # data[0] = report sub type, data[1] = pin, data[2] = error message
-            if self.dht_callbacks[data[1]]:
-                # Callback 0=DHT REPORT, DHT_ERROR, PIN, Time
-                message = [PrivateConstants.DHT_REPORT, data[0], data[1], data[2],
-                           time.time()]
-                self.dht_callbacks[data[1]](message)
+        if self.write_coalesce_interval:
+            with self.write_lock:
+                self.coalesced_writes += send_message
+            self.write_ready.set()
         else:
-            # got valid data DHT_DATA
-            f_humidity = float(data[5] + data[6] / 100)
-            if data[3]:
-                f_humidity *= -1.0
-            f_temperature = float(data[7] + data[8] / 100)
-            if data[4]:
-                f_temperature *= -1.0
-            message = [PrivateConstants.DHT_REPORT, data[0], data[1], data[2],
-                       f_humidity, f_temperature, time.time()]
+            self._write(send_message)
 
-            self.dht_callbacks[data[1]](message)
+    def _flush_writes(self):
+        """
+        Write all coalesced commands in a single transport write.
+        """
+        with self.write_lock:
+            self.write_ready.clear()
+            if self.coalesced_writes:
+                send_message = bytes(self.coalesced_writes)
+                self.coalesced_writes.clear()
+                self._write(send_message)
 
-    def _digital_message(self, data):
+    def _coalescing_writer(self):
         """
-        This is a private message handler method.
-        It is a message handler for Digital Messages.
+        This is the write thread. When the first command of a tick is
+        queued, it waits write_coalesce_interval seconds for the rest
+        of the tick's commands and then writes them all at once.
+        """
+        self.run_event.wait()
 
-        :param data: digital message
+        while self._is_running() and not self.shutdown_flag:
+            self.write_ready.wait()
+            time.sleep(self.write_coalesce_interval)
+            try:
+                self._flush_writes()
+            except RuntimeError:
+                break
 
+    def _write(self, send_message):
         """
-        try:
-            pin = data[0]
-            value = data[1]
-
-            time_stamp = time.time()
-            if self.digital_callbacks[pin]:
-                message = [PrivateConstants.DIGITAL_REPORT, pin, value, time_stamp]
-                self.digital_callbacks[pin](message)
-        except:
-            # print('malformed message in _digital_message')
-            pass
+        Write encoded commands to the transport in use.
 
-    def _firmware_message(self, data):
+        :param send_message: command frames as bytes
         """
-        Telemetrix4Arduino firmware version message
+        if self.reconnecting:
+            return
 
-        :param data: data[0] = major number, data[1] = minor number.
+        self.transport_writes += 1
+        if self.serial_port:
+            try:
+                self.serial_port.write(send_message)
+            except SerialException:
+                # the receive thread restores the connection
+                if self.auto_reconnect:
+                    return
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError('write fail in _send_command')
+        elif self.ip_address:
+            try:
+                self.sock.sendall(send_message)
+            except OSError:
+                if not self.auto_reconnect:
+                    raise
+        elif self.ble_transport:
+            self.ble_loop.call_soon_threadsafe(self._ble_write, send_message)
+        else:
+            raise RuntimeError('No serial port or ip address set.')
 
-                               data[2] = patch number
+    def _record_configuration(self, command):
+        """
+        Record a command that configures the server, so that it can be
+        replayed after a reconnect. A command replaces any earlier command
+        for the same pin, device or setting.
+
+        :param command: command data in the form of a list
+        """
+        command_type = command[0]
+        if command_type == PrivateConstants.SET_PIN_MODE and \
+                command[2] == PrivateConstants.AT_ANALOG:
+            key = (command_type, PrivateConstants.AT_ANALOG, command[1])
+        elif command_type in (PrivateConstants.SET_PIN_MODE,
+                              PrivateConstants.SERVO_ATTACH,
+                              PrivateConstants.SONAR_NEW,
+                              PrivateConstants.DHT_NEW):
+            key = (PrivateConstants.SET_PIN_MODE, command[1])
+        elif command_type == PrivateConstants.SERVO_DETACH:
+            self.configuration.pop((PrivateConstants.SET_PIN_MODE, command[1]), None)
+            return
+        elif command_type == PrivateConstants.MODIFY_REPORTING:
+            if command[1] == PrivateConstants.REPORTING_DISABLE_ALL:
+                for key in [key for key in self.configuration
+                            if key[0] == PrivateConstants.MODIFY_REPORTING]:
+                    del self.configuration[key]
+                key = (command_type,)
+            else:
+                analog = command[1] in (PrivateConstants.REPORTING_ANALOG_ENABLE,
+                                        PrivateConstants.REPORTING_ANALOG_DISABLE)
+                key = (command_type, analog, command[2])
+        elif command_type in (PrivateConstants.SONAR_ENABLE,
+                              PrivateConstants.SONAR_DISABLE):
+            key = (PrivateConstants.SONAR_ENABLE,)
+        elif command_type == PrivateConstants.I2C_START_PERIODIC_READ:
+            # i2c port, address and register
+            key = (command_type, command[5], command[1], command[2])
+        elif command_type == PrivateConstants.I2C_STOP_PERIODIC_READ:
+            self.configuration.pop((PrivateConstants.I2C_START_PERIODIC_READ,
+                                    command[3], command[1], command[2]), None)
+            return
+        elif command_type in (PrivateConstants.I2C_BEGIN,
+                              PrivateConstants.SET_PIN_MODE_STEPPER,
+                              PrivateConstants.STEPPER_SET_MAX_SPEED,
+                              PrivateConstants.STEPPER_SET_ACCELERATION,
+                              PrivateConstants.STEPPER_SET_SPEED,
+                              PrivateConstants.STEPPER_SET_MINIMUM_PULSE_WIDTH,
+                              PrivateConstants.STEPPER_SET_ENABLE_PIN,
+                              PrivateConstants.STEPPER_SET_3_PINS_INVERTED,
+                              PrivateConstants.STEPPER_SET_4_PINS_INVERTED):
+            # i2c port or motor id
+            key = (command_type, command[1])
+        elif command_type in (PrivateConstants.SET_ANALOG_SCANNING_INTERVAL,
+                              PrivateConstants.ANALOG_BLOCK_REPORTING,
+                              PrivateConstants.SET_UDP_REPORTING,
+                              PrivateConstants.SPI_INIT,
+                              PrivateConstants.SPI_SET_FORMAT,
+                              PrivateConstants.ONE_WIRE_INIT):
+            key = (command_type,)
+        else:
+            return
+
+        self.configuration.pop(key, None)
+        self.configuration[key] = list(command)
+
+    def _replay_configuration(self):
         """
+        Reset the server and send it the recorded configuration.
+        """
+        command = [PrivateConstants.ENABLE_ALL_REPORTS]
+        self._send_command(command)
+        command = [PrivateConstants.RESET]
+        self._send_command(command)
 
-        self.firmware_version = [data[0], data[1], data[2]]
+        # the reset returned the outputs to their initial state
+        if self.output_cache is not None:
+            with self.output_cache_lock:
+                self.output_cache.clear()
 
-    def _i2c_read_report(self, data):
+        with self.batch():
+            for command in list(self.configuration.values()):
+                self._send_command(list(command))
+
+    def _connect_ble(self):
         """
-        Execute callback for i2c reads.
+        Connect to a Bluetooth LE board. The connection is made and run
+        by the event loop of the receive thread.
 
-        :param data: [I2C_READ_REPORT, i2c_port, number of bytes read, address, register, bytes read..., time-stamp]
+        :return: True once connected
         """
 
-        # we receive [# data bytes, address, register, data bytes]
-        # number of bytes of data returned
+        async def connect():
+            transport = TelemetrixBleTransport(self.ble_address, self._receive_data,
+                                               self._ble_connection_lost,
+                                               self.ble_client_class)
+            try:
+                await transport.connect(PrivateConstants.BLE_CONNECT_TIMEOUT)
+            except BaseException:
+                await transport.disconnect()
+                raise
+            return transport
 
-        # data[0] = number of bytes
-        # data[1] = i2c_port
-        # data[2] = number of bytes returned
-        # data[3] = address
-        # data[4] = register
-        # data[5] ... all the data bytes
+        future = asyncio.run_coroutine_threadsafe(connect(), self.ble_loop)
+        try:
+            self.ble_transport = future.result()
+        except OSError:
+            raise
+        except Exception as e:
+            # bleak reports most failures with its own exception types
+            raise ConnectionError(e)
+        return True
 
-        cb_list = [PrivateConstants.I2C_READ_REPORT, data[0], data[1]] + data[2:]
-        cb_list.append(time.time())
+    def _ble_write(self, send_message):
+        """
+        Run by the event loop of the receive thread. Commands sent while
+        the connection is lost are discarded.
 
-        if cb_list[1]:
-            self.i2c_callback2(cb_list)
-        else:
-            self.i2c_callback(cb_list)
+        :param send_message: command frames as bytes
+        """
+        if not self.ble_transport.closed:
+            self.ble_transport.write(send_message)
 
-    def _i2c_too_few(self, data):
+    def _ble_connection_lost(self, exc):
         """
-        I2c reports too few bytes received
+        Called by the Bluetooth LE transport when the connection closes.
 
-        :param data: data[0] = device address
+        This runs on the event loop, where an exception would not reach
+        the application. Unless the connection is being restored, the
+        pending requests fail and any further command raises the loss.
+
+        :param exc: exception causing the loss, or None for an orderly close
         """
+        if self.shutdown_flag or exc is None:
+            return
+        if self.auto_reconnect:
+            # the event loop keeps running, since it makes the new connection
+            reconnect_thread = threading.Thread(target=self._reconnect, args=(exc,))
+            reconnect_thread.daemon = True
+            reconnect_thread.start()
+            return
+        self.connection_error = RuntimeError(
+            f'The connection to {self.ble_address} was lost: {exc}')
+        self._cancel_pending_requests(self.connection_error)
+        print(self.connection_error)
         if self.shutdown_on_exception:
             self.shutdown()
-        raise RuntimeError(
-            f'i2c too few bytes received from i2c port {data[0]} i2c address {data[1]}')
 
-    def _i2c_too_many(self, data):
+    def _close_ble(self):
         """
-        I2c reports too few bytes received
+        Disconnect from a Bluetooth LE board, then stop the event loop
+        of the receive thread.
+        """
+        if not self.ble_transport or self.ble_transport.closed:
+            # never connected, or already disconnected
+            self.ble_loop.call_soon_threadsafe(self.ble_loop.stop)
+            return
 
-        :param data: data[0] = device address
+        future = asyncio.run_coroutine_threadsafe(self.ble_transport.disconnect(),
+                                                  self.ble_loop)
+        future.add_done_callback(
+            lambda _: self.ble_loop.call_soon_threadsafe(self.ble_loop.stop))
+
+        # the receive thread cannot wait for itself
+        if threading.current_thread() is not self.the_data_receive_thread:
+            try:
+                future.result(PrivateConstants.BLE_CONNECT_TIMEOUT)
+            except Exception:
+                pass
+
+    def _connect_tcp(self):
         """
-        if self.shutdown_on_exception:
-            self.shutdown()
-        raise RuntimeError(
-            f'i2c too many bytes received from i2c port {data[0]} i2c address {data[1]}')
+        Open the tcp/ip connection to the server.
+        """
+        self.sock = self._create_tcp_socket()
+        self.sock.settimeout(self.tcp_connect_timeout)
+        self.sock.connect((self.ip_address, self.ip_port))
+        self.sock.settimeout(None)
 
-    def _i_am_here(self, data):
+    def _create_tcp_socket(self):
         """
-        Reply to are_u_there message
-        :param data: arduino id
+        Create a tcp/ip socket with the requested socket options.
+        Buffer sizes are set before connecting, so that the receive
+        window is negotiated with them.
+
+        :return: unconnected socket
         """
-        self.reported_arduino_id = data[0]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-    def _spi_report(self, report):
+        if self.tcp_nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.tcp_receive_buffer_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                            self.tcp_receive_buffer_size)
+        if self.tcp_send_buffer_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                            self.tcp_send_buffer_size)
 
-        cb_list = [PrivateConstants.SPI_REPORT, report[0]] + report[1:]
+        if self.tcp_keepalive:
+            idle = max(1, int(self.tcp_keepalive))
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, idle)
+            elif hasattr(socket, 'TCP_KEEPALIVE'):
+                # macOS
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle)
+            elif hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+                # Windows
+                sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, idle * 1000, idle * 1000))
 
-        cb_list.append(time.time())
+        return sock
 
-        self.spi_callback(cb_list)
+    def _open_udp_socket(self):
+        """
+        Open the socket that udp reports are received on. It is bound to
+        the local address of the tcp/ip connection.
+        """
+        self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_sock.bind((self.sock.getsockname()[0], self.udp_port))
 
-    def _onewire_report(self, report):
-        cb_list = [PrivateConstants.ONE_WIRE_REPORT, report[0]] + report[1:]
-        cb_list.append(time.time())
-        self.onewire_callback(cb_list)
+    def _enable_udp_reports(self, port):
+        """
+        Ask the server to send its reports as udp datagrams.
 
-    def _report_debug_data(self, data):
+        :param port: local udp port that the datagrams are sent to
         """
-        Print debug data sent from Arduino
-        :param data: data[0] is a byte followed by 2
-                     bytes that comprise an integer
-        :return:
+        command = [PrivateConstants.SET_UDP_REPORTING, 1, port >> 8, port & 0xff]
+        self._send_command(command)
+
+    def _receive_datagram(self, datagram):
         """
-        value = (data[1] << 8) + data[2]
-        print(f'DEBUG ID: {data[0]} Value: {value}')
+        Process a udp report datagram. It contains a 16 bit sequence
+        number followed by one or more complete report frames.
+        Datagrams that arrive after a newer one are dropped.
 
-    def _report_loop_data(self, data):
+        :param datagram: bytes-like object containing the datagram
         """
-        Print data that was looped back
-        :param data: byte of loop back data
-        :return:
+        if len(datagram) <= PrivateConstants.UDP_SEQUENCE_NUMBER_SIZE:
+            return
+
+        sequence = (datagram[0] << 8) | datagram[1]
+        if self.udp_sequence is not None:
+            advance = (sequence - self.udp_sequence) % \
+                PrivateConstants.UDP_SEQUENCE_MODULUS
+            if not advance or advance >= PrivateConstants.UDP_SEQUENCE_MODULUS // 2:
+                self.udp_datagrams_stale += 1
+                return
+            self.udp_datagrams_lost += advance - 1
+        self.udp_sequence = sequence
+        self.udp_datagrams_received += 1
+
+        # frames never span datagrams
+        self.udp_framer.reset()
+        try:
+            self.udp_framer.feed(
+                memoryview(datagram)[PrivateConstants.UDP_SEQUENCE_NUMBER_SIZE:])
+        except RuntimeError:
+            # a corrupted datagram is dropped like a lost one
+            pass
+
+    def _reopen_serial_port(self):
         """
-        if self.loop_back_callback:
-            self.loop_back_callback(data)
+        Close the lost serial port and find the board again. Unless
+        com_port was specified, all candidate ports are probed, since a
+        board may reappear on a different device.
 
-    def _send_command(self, command):
+        :return: True if the board was found
         """
-        This is a private utility method.
+        try:
+            self.serial_port_register.remove(self.serial_port)
+        except ValueError:
+            pass
+        try:
+            self.serial_port.close()
+        except (OSError, SerialException):
+            pass
 
+        if self.com_port:
+            devices = [self.com_port]
+        else:
+            registered_ports = list(map(lambda p: p.port,
+                                        self.serial_port_register.active))
+            devices = [port.device for port in list_ports.comports()
+                       if port.pid is not None and port.device not in registered_ports]
 
-        :param command:  command data in the form of a list
+        serial_port = self._probe_ports(devices)
+        if not serial_port:
+            return False
 
+        self.serial_port = serial_port
+        self.serial_port_register.add(self.serial_port)
+        return True
+
+    def _reconnect(self, reason):
         """
-        # the length of the list is added at the head
-        command.insert(0, len(command))
-        send_message = bytes(command)
+        Restore a lost connection. This is run by the receive thread,
+        which resumes receiving once the connection has been restored.
+        Attempts are repeated with an increasing delay until one succeeds
+        or shutdown is called.
 
-        if self.serial_port:
+        :param reason: the exception or description of the loss
+        """
+        print(f'Connection lost ({reason}). Reconnecting...')
+        self.reconnecting = True
+
+        # replies to outstanding requests will not arrive
+        self._cancel_pending_requests()
+
+        delay = PrivateConstants.RECONNECT_INITIAL_DELAY
+        while not self.shutdown_flag:
             try:
-                self.serial_port.write(send_message)
-            except SerialException:
-                if self.shutdown_on_exception:
-                    self.shutdown()
-                raise RuntimeError('write fail in _send_command')
-        elif self.ip_address:
-            self.sock.sendall(send_message)
-        else:
-            raise RuntimeError('No serial port or ip address set.')
+                if self.ip_address:
+                    self.sock.close()
+                    self._connect_tcp()
+                    restored = True
+                elif self.ble_address:
+                    restored = self._connect_ble()
+                else:
+                    restored = self._reopen_serial_port()
+            except (OSError, SerialException):
+                restored = False
+            if restored:
+                break
+            time.sleep(delay)
+            delay = min(2 * delay, PrivateConstants.RECONNECT_MAXIMUM_DELAY)
+
+        if self.shutdown_flag:
+            return
+
+        self.report_framer.reset()
+        # the server numbers udp datagrams from 0 again
+        self.udp_sequence = None
+        self.reconnecting = False
+        self._replay_configuration()
+        print('Connection restored')
 
     def _servo_unavailable(self, report):
         """
@@ -2392,11 +4718,14 @@ class Telemetrix(threading.Thread):
         # get callback from pin number
         cb = self.sonar_callbacks[report[0]]
 
+        distance = (report[1] << 8) + report[2]
+        time_stamp = time.time()
+        self.sonar_distances.update(report[0], distance, time_stamp)
+
         # build report data
-        cb_list = [PrivateConstants.SONAR_DISTANCE, report[0],
-                   ((report[1] << 8) + report[2]), time.time()]
+        cb_list = [PrivateConstants.SONAR_DISTANCE, report[0], distance, time_stamp]
 
-        cb(cb_list)
+        self._invoke_pin_callback(cb, cb_list)
 
     def _stepper_distance_to_go_report(self, report):
         """
@@ -2409,9 +4738,6 @@ class Telemetrix(threading.Thread):
                                  steps, time_stamp]
         """
 
-        # get callback
-        cb = self.stepper_info_list[report[0]]['distance_to_go_callback']
-
         # isolate the steps bytes and covert list to bytes
         steps = bytes(report[1:])
 
@@ -2421,7 +4747,8 @@ class Telemetrix(threading.Thread):
         cb_list = [PrivateConstants.STEPPER_DISTANCE_TO_GO, report[0], num_steps,
                    time.time()]
 
-        cb(cb_list)
+        self._complete_pending_request(
+            (PrivateConstants.STEPPER_DISTANCE_TO_GO, report[0]), cb_list)
 
     def _stepper_target_position_report(self, report):
         """
@@ -2436,9 +4763,6 @@ class Telemetrix(threading.Thread):
                                  target_position, time_stamp]
         """
 
-        # get callback
-        cb = self.stepper_info_list[report[0]]['target_position_callback']
-
         # isolate the steps bytes and covert list to bytes
         target = bytes(report[1:])
 
@@ -2448,7 +4772,8 @@ class Telemetrix(threading.Thread):
         cb_list = [PrivateConstants.STEPPER_TARGET_POSITION, report[0], target_position,
                    time.time()]
 
-        cb(cb_list)
+        self._complete_pending_request(
+            (PrivateConstants.STEPPER_TARGET_POSITION, report[0]), cb_list)
 
     def _stepper_current_position_report(self, report):
         """
@@ -2463,9 +4788,6 @@ class Telemetrix(threading.Thread):
                                  current_position, time_stamp]
         """
 
-        # get callback
-        cb = self.stepper_info_list[report[0]]['current_position_callback']
-
         # isolate the steps bytes and covert list to bytes
         position = bytes(report[1:])
 
@@ -2475,7 +4797,8 @@ class Telemetrix(threading.Thread):
         cb_list = [PrivateConstants.STEPPER_CURRENT_POSITION, report[0], current_position,
                    time.time()]
 
-        cb(cb_list)
+        self._complete_pending_request(
+            (PrivateConstants.STEPPER_CURRENT_POSITION, report[0]), cb_list)
 
     def _stepper_is_running_report(self, report):
         """
@@ -2487,13 +4810,11 @@ class Telemetrix(threading.Thread):
                                  running_state, time_stamp]
         """
 
-        # get callback
-        cb = self.stepper_info_list[report[0]]['is_running_callback']
-
         cb_list = [PrivateConstants.STEPPER_RUNNING_REPORT, report[0], report[1],
                    time.time()]
 
-        cb(cb_list)
+        self._complete_pending_request(
+            (PrivateConstants.STEPPER_RUNNING_REPORT, report[0]), cb_list)
 
     def _stepper_run_complete_report(self, report):
         """
@@ -2505,74 +4826,134 @@ class Telemetrix(threading.Thread):
                                  time_stamp]
         """
 
-        # get callback
-        cb = self.stepper_info_list[report[0]]['motion_complete_callback']
-
         cb_list = [PrivateConstants.STEPPER_RUN_COMPLETE_REPORT, report[0],
                    time.time()]
 
-        cb(cb_list)
+        # the motion completes every run request made for the motor
+        key = (PrivateConstants.STEPPER_RUN_COMPLETE_REPORT, report[0])
+        while self._complete_pending_request(key, cb_list):
+            pass
+
+    def _baud_rate_report(self, report):
+        self._complete_pending_request((PrivateConstants.BAUD_RATE_REPORT,), report)
 
     def _features_report(self, report):
         self.reported_features = report[0]
+        self._complete_pending_request((PrivateConstants.FEATURES,), report)
 
     def _run_threads(self):
+        if self.run_event.is_set():
+            # already started while connecting
+            return
         self.run_event.set()
+        if self.fleet:
+            self.fleet._register(self)
 
     def _is_running(self):
         return self.run_event.is_set()
 
     def _stop_threads(self):
         self.run_event.clear()
+        if self.fleet:
+            # stop receiving before the port or socket is closed
+            self.fleet._unregister(self)
+        else:
+            # wake the reporter thread if it is waiting for a report
+            self.report_queue.put(None)
+        # wake the write thread if it is waiting for a command
+        self.write_ready.set()
 
     def _reporter(self):
         """
-        This is the reporter thread. It continuously pulls data from
-        the deque. When a full message is detected, that message is
-        processed.
+        This is the reporter thread. It blocks on the report queue and
+        processes each complete report as soon as it is received.
         """
         self.run_event.wait()
 
         while self._is_running() and not self.shutdown_flag:
-            if len(self.the_deque):
-                # response_data will be populated with the received data for the report
-                response_data = []
-                packet_length = self.the_deque.popleft()
-                if packet_length:
-                    # get all the data for the report and place it into response_data
-                    for i in range(packet_length):
-                        while not len(self.the_deque):
-                            time.sleep(self.sleep_tune)
-                        data = self.the_deque.popleft()
-                        response_data.append(data)
-
-                    # print(response_data)
-
-                    # get the report type and look up its dispatch method
-                    # here we pop the report type off of response_data
-                    report_type = response_data.pop(0)
-                    # print(report_type)
-
-                    # retrieve the report handler from the dispatch table
-                    dispatch_entry = self.report_dispatch.get(report_type)
-
-                    # if there is additional data for the report,
-                    # it will be contained in response_data
-                    # noinspection PyArgumentList
-                    dispatch_entry(response_data)
-                    continue
-                else:
-                    if self.shutdown_on_exception:
-                        self.shutdown()
-                    raise RuntimeError(
-                        'A report with a packet length of zero was received.')
-            else:
-                time.sleep(self.sleep_tune)
+            try:
+                report = self.report_queue.get(timeout=self._rate_limit_timeout())
+            except queue.Empty:
+                # a rate limited callback is due
+                self._flush_rate_limited_callbacks()
+                continue
+
+            # a None entry is queued to wake the thread for shutdown
+            if report is None:
+                break
+
+            self._dispatch_report(report)
+
+            if self.rate_limit_deadline is not None and \
+                    time.monotonic() >= self.rate_limit_deadline:
+                self._flush_rate_limited_callbacks()
+
+    def _dispatch_report(self, report):
+        """
+        Look up the handler for a report and call it.
+
+        :param report: report frame, starting with the report type
+        """
+        # retrieve the report handler from the dispatch table
+        dispatch_entry = self.report_dispatch.get(report[0])
+
+        # selects the callback policy used by _invoke_callback
+        self.dispatched_report_type = report[0]
+
+        # if there is additional data for the report,
+        # it is passed to the handler as a list
+        if dispatch_entry:
+            dispatch_entry(report[1:].tolist())
+
+    def _receive_data(self, data):
+        """
+        Pass received data to the report framer.
+
+        :param data: bytes-like object containing received data
+        """
+        try:
+            self.report_framer.feed(data)
+        except RuntimeError:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise
+
+    def _ble_receiver(self):
+        """
+        Thread to run the event loop of the Bluetooth LE connection.
+
+        Notifications are received by the event loop and their data is
+        passed to the report framer.
+        """
+        asyncio.set_event_loop(self.ble_loop)
+        self.ble_loop.run_forever()
+
+    def _udp_receiver(self):
+        """
+        Thread to receive udp report datagrams.
+        """
+        self.run_event.wait()
+
+        receive_buffer = bytearray(PrivateConstants.UDP_RECEIVE_BUFFER_SIZE)
+        receive_view = memoryview(receive_buffer)
+
+        while self._is_running() and not self.shutdown_flag:
+            try:
+                number_of_bytes = self.udp_sock.recv_into(receive_buffer)
+            except OSError:
+                # the socket is closed during shutdown
+                break
+            self._receive_datagram(receive_view[:number_of_bytes])
 
     def _serial_receiver(self):
         """
         Thread to continuously check for incoming data.
-        When a byte comes in, place it onto the deque.
+
+        Everything that is available is read in a single call and
+        passed to the report framer. When nothing is available, the read
+        blocks until a byte arrives or the port timeout expires,
+        so no cpu is consumed while the link is idle. A read error ends
+        the thread unless auto_reconnect is set.
         """
         self.run_event.wait()
 
@@ -2584,32 +4965,63 @@ class Telemetrix(threading.Thread):
             # we can get an OSError: [Errno9] Bad file descriptor when shutting down
             # just ignore it
             try:
-                if self.serial_port.inWaiting():
-                    c = self.serial_port.read()
-                    self.the_deque.append(ord(c))
-                    # print(ord(c))
-                else:
-                    time.sleep(self.sleep_tune)
-                    # continue
-            except OSError:
-                pass
+                data = self.serial_port.read(self.serial_port.in_waiting or 1)
+                if data:
+                    self._receive_data(data)
+            except (OSError, SerialException) as e:
+                # the port may be closed out from under us during shutdown
+                if self.shutdown_flag:
+                    break
+                if self.auto_reconnect:
+                    self._reconnect(e)
+                    continue
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Serial receive failed: {e}')
 
     def _tcp_receiver(self):
         """
         Thread to continuously check for incoming data.
-        When a byte comes in, place it onto the deque.
+
+        Data is received in large chunks into a preallocated buffer
+        and passed to the report framer. A closed connection or a socket
+        error ends the thread instead of being retried in a tight loop.
         """
         self.run_event.wait()
 
         # Start this thread only if ip_address is set
+        if not self.ip_address:
+            return
 
-        if self.ip_address:
+        receive_buffer = bytearray(PrivateConstants.TCP_RECEIVE_BUFFER_SIZE)
+        receive_view = memoryview(receive_buffer)
 
-            while self._is_running() and not self.shutdown_flag:
-                try:
-                    payload = self.sock.recv(1)
-                    self.the_deque.append(ord(payload))
-                except Exception:
-                    pass
-        else:
-            return
\ No newline at end of file
+        while self._is_running() and not self.shutdown_flag:
+            try:
+                number_of_bytes = self.sock.recv_into(receive_buffer)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                # the socket is closed out from under us during shutdown
+                if self.shutdown_flag:
+                    break
+                if self.auto_reconnect:
+                    self._reconnect(e)
+                    continue
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'TCP receive failed: {e}')
+
+            if not number_of_bytes:
+                # an orderly close of the connection by the server
+                if self.shutdown_flag:
+                    break
+                if self.auto_reconnect:
+                    self._reconnect('closed by the server')
+                    continue
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Connection to {self.ip_address}:{self.ip_port} '
+                                   f'was closed by the server')
+
+            self._receive_data(receive_view[:number_of_bytes])
\ No newline at end of file
@@ -0,0 +1,997 @@
+"""
+ Copyright (c) 2021-2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import asyncio
+import socket
+import sys
+import threading
+
+import serial
+# noinspection PyPackageRequirements
+from serial.serialutil import SerialException
+# noinspection PyPackageRequirements
+from serial.tools import list_ports
+
+# noinspection PyUnresolvedReferences
+from telemetrix.private_constants import PrivateConstants
+# noinspection PyUnresolvedReferences
+from telemetrix.telemetrix import Telemetrix, TelemetrixDiscoveryCache, \
+    TelemetrixPortRegister, TelemetrixReportFramer
+# noinspection PyUnresolvedReferences
+from telemetrix.telemetrix_ble import TelemetrixBleTransport
+
+
+class TelemetrixAIOSerial:
+    """
+    This class adapts a pyserial port to an asyncio event loop.
+
+    Received data is read when the event loop reports that the port
+    is readable, and is passed to a data handler. Writes never block.
+    Anything the driver does not accept immediately is buffered and
+    written when the port becomes writable.
+
+    Platforms that cannot wait on a serial port file descriptor, such
+    as Windows, read and write the port from executor threads instead.
+    One write is run at a time, so the data is written in order.
+    """
+
+    def __init__(self, com_port, loop, data_handler, connection_lost_handler=None,
+                 reset_on_connect=True, baud_rate=115200):
+        """
+
+        :param com_port: e.g. COM3 or /dev/ttyACM0.
+
+        :param loop: asyncio event loop
+
+        :param data_handler: called with each chunk of received bytes
+
+        :param connection_lost_handler: called with the exception if
+                                        the port fails
+
+        :param reset_on_connect: if False, DTR and RTS are held low while
+                                 the port is opened
+
+        :param baud_rate: serial baud rate
+        """
+        self.loop = loop
+        self.data_handler = data_handler
+        self.connection_lost_handler = connection_lost_handler
+
+        # bytes waiting for the port to become writable
+        self.write_buffer = bytearray()
+
+        # the executor write in progress, when file descriptors are not used
+        self.writer = None
+
+        self.closed = False
+
+        self.use_file_descriptor = sys.platform != 'win32'
+
+        if self.use_file_descriptor:
+            # non-blocking reads and writes
+            self.serial_port = serial.Serial(None, baud_rate,
+                                             timeout=0, write_timeout=0)
+        else:
+            self.serial_port = serial.Serial(None, baud_rate, timeout=1)
+
+        self.serial_port.port = com_port
+        if not reset_on_connect:
+            self.serial_port.dtr = False
+            self.serial_port.rts = False
+        self.serial_port.open()
+
+        if self.use_file_descriptor:
+            self.file_descriptor = self.serial_port.fileno()
+            self.loop.add_reader(self.file_descriptor, self._read_ready)
+        else:
+            self.file_descriptor = None
+            self.reader = self.loop.run_in_executor(None, self._blocking_reader)
+
+    def write(self, data):
+        """
+        Write data to the port without blocking.
+
+        :param data: bytes to write
+        """
+        if self.closed:
+            raise RuntimeError('write to a closed serial port')
+
+        if not self.use_file_descriptor:
+            self.write_buffer += data
+            if not self.writer:
+                self._start_blocking_write()
+            return
+
+        if self.write_buffer:
+            self.write_buffer += data
+            return
+
+        try:
+            number_written = self.serial_port.write(data)
+        except (OSError, SerialException) as e:
+            self._connection_lost(e)
+            return
+
+        if number_written < len(data):
+            self.write_buffer += data[number_written:]
+            self.loop.add_writer(self.file_descriptor, self._write_ready)
+
+    def close(self):
+        """
+        Write any buffered data and close the port.
+        """
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.use_file_descriptor:
+            self.loop.remove_reader(self.file_descriptor)
+            self.loop.remove_writer(self.file_descriptor)
+
+        if self.writer:
+            # close once the write in progress is done
+            self.writer.add_done_callback(lambda _: self._close_port())
+        else:
+            self._close_port()
+
+    def _close_port(self):
+        try:
+            if self.write_buffer:
+                self.serial_port.write_timeout = 1
+                self.serial_port.write(bytes(self.write_buffer))
+                self.write_buffer.clear()
+            self.serial_port.close()
+        except (OSError, SerialException):
+            pass
+
+    def _read_ready(self):
+        try:
+            data = self.serial_port.read(self.serial_port.in_waiting or 1)
+        except (OSError, SerialException) as e:
+            self._connection_lost(e)
+            return
+        if data:
+            self.data_handler(data)
+
+    def _write_ready(self):
+        try:
+            number_written = self.serial_port.write(bytes(self.write_buffer))
+        except (OSError, SerialException) as e:
+            self._connection_lost(e)
+            return
+        del self.write_buffer[:number_written]
+        if not self.write_buffer:
+            self.loop.remove_writer(self.file_descriptor)
+
+    def _start_blocking_write(self):
+        data = bytes(self.write_buffer)
+        self.write_buffer.clear()
+        self.writer = self.loop.run_in_executor(None, self.serial_port.write, data)
+        self.writer.add_done_callback(self._blocking_write_done)
+
+    def _blocking_write_done(self, writer):
+        self.writer = None
+        exception = None if writer.cancelled() else writer.exception()
+        if exception:
+            self._connection_lost(exception)
+        elif self.write_buffer and not self.closed:
+            self._start_blocking_write()
+
+    def _blocking_reader(self):
+        while not self.closed:
+            try:
+                data = self.serial_port.read(self.serial_port.in_waiting or 1)
+            except (OSError, SerialException) as e:
+                if not self.closed:
+                    self.loop.call_soon_threadsafe(self._connection_lost, e)
+                return
+            if data:
+                self.loop.call_soon_threadsafe(self.data_handler, data)
+
+    def _connection_lost(self, exc):
+        if self.closed:
+            return
+        self.close()
+        if self.connection_lost_handler:
+            self.connection_lost_handler(exc)
+
+
+class TelemetrixAIOProtocol(asyncio.Protocol):
+    """
+    An asyncio protocol for a tcp/ip connected server.
+    """
+
+    def __init__(self, data_handler, connection_lost_handler):
+        """
+
+        :param data_handler: called with each chunk of received bytes
+
+        :param connection_lost_handler: called when the connection closes
+        """
+        self.data_handler = data_handler
+        self.connection_lost_handler = connection_lost_handler
+
+    def data_received(self, data):
+        self.data_handler(data)
+
+    def connection_lost(self, exc):
+        self.connection_lost_handler(exc)
+
+
+class TelemetrixAIODatagramProtocol(asyncio.DatagramProtocol):
+    """
+    An asyncio protocol for the udp reports of a tcp/ip connected server.
+    """
+
+    def __init__(self, datagram_handler):
+        """
+
+        :param datagram_handler: called with each received datagram
+        """
+        self.datagram_handler = datagram_handler
+
+    def datagram_received(self, data, addr):
+        self.datagram_handler(data)
+
+
+# noinspection PyPep8,PyMethodMayBeStatic,PyBroadException
+class TelemetrixAIO(Telemetrix):
+    """
+    This class exposes the telemetrix API for use with asyncio.
+
+    Received data is processed by the event loop, so no threads are
+    created, and a single event loop can drive any number of boards.
+
+    Methods that send a command to the server only queue bytes on an
+    asyncio transport and never block. They are shared with Telemetrix
+    and may be called directly from a coroutine. Methods that need to
+    wait for the server, start_aio and shutdown, are awaitable.
+
+    Request methods, such as i2c_read or stepper_get_current_position,
+    return an asyncio future that may be awaited for the reply. Replies
+    are matched to requests in the order sent, so a request whose reply
+    is no longer wanted must be cancelled. asyncio.wait_for does this
+    when it times out.
+
+    If the connection to the server is lost, the pending requests fail,
+    further commands raise a RuntimeError, and the connection_failed
+    future, created by start_aio, is set to the exception. Awaiting it
+    detects the loss. It is set to None by shutdown.
+
+    Callbacks may be regular functions or coroutine functions.
+    """
+
+    # noinspection PyMissingConstructor
+    def __init__(self, com_port=None, arduino_instance_id=1,
+                 arduino_wait=4, shutdown_on_exception=True,
+                 ip_address=None, ip_port=31335,
+                 write_coalesce_interval=0,
+                 handshake_timeout=0.5, handshake_retries=2,
+                 discovery_cache=None, reset_on_connect=True,
+                 baud_rate=115200, negotiated_baud_rate=None,
+                 ble_address=None, ble_client_class=None, udp_port=None,
+                 tcp_nodelay=True, tcp_receive_buffer_size=None,
+                 tcp_send_buffer_size=None, tcp_keepalive=None,
+                 tcp_connect_timeout=5):
+        """
+
+        :param com_port: e.g. COM3 or /dev/ttyACM0.
+                         Only use if you wish to bypass auto com port
+                         detection.
+
+        :param arduino_instance_id: Match with the value installed on the
+                                    arduino-telemetrix sketch.
+
+        :param arduino_wait: Maximum amount of time to wait for an Arduino
+                             to reset itself and reply. The connection
+                             continues as soon as the Arduino replies.
+
+        :param shutdown_on_exception: call shutdown before raising
+                                      a RunTimeError exception
+
+        :param ip_address: ip address of tcp/ip connected device.
+
+        :param ip_port: ip port of tcp/ip connected device
+
+        :param write_coalesce_interval: When non-zero, commands sent
+                                        within this many seconds of each
+                                        other are coalesced and written to
+                                        the transport in a single write.
+
+        :param handshake_timeout: Time in seconds to wait for the server
+                                  to reply to each startup request.
+
+        :param handshake_retries: Number of times a startup request is
+                                  repeated if no reply is received.
+
+        :param discovery_cache: Path of a file used to remember which
+                                serial device each arduino_instance_id was
+                                found on. When set, discovery probes the
+                                remembered device first and scans all
+                                ports only if the board is not found there.
+
+        :param reset_on_connect: If False, serial ports are opened with DTR
+                                 and RTS held low, so that a board with
+                                 auto-reset keeps running its sketch.
+                                 Where the platform briefly raises DTR on
+                                 open and the board resets anyway, the
+                                 connection waits for it as usual.
+
+        :param baud_rate: Serial baud rate that the sketch is started with.
+
+        :param negotiated_baud_rate: Optional higher baud rate, such as
+                                     500000, 1000000 or 2000000, that the
+                                     serial link is switched to after the
+                                     connection is established. If the
+                                     server declines the rate or it cannot
+                                     be confirmed, baud_rate remains in use.
+
+        :param ble_address: Bluetooth address of a Bluetooth LE board that
+                            provides a Nordic UART style service. On
+                            macOS, this is the identifier reported by
+                            bleak for the board.
+
+        :param ble_client_class: bleak.BleakClient compatible class used for
+                                 the Bluetooth LE connection. This allows a
+                                 local fake transport to be used for
+                                 testing. Defaults to bleak.BleakClient.
+
+        :param udp_port: For a tcp/ip connected server, the local udp port
+                         that the server is asked to send its reports to,
+                         or 0 to use any free port. Reports then arrive as
+                         udp datagrams, and a datagram that is lost or
+                         arrives after a newer one is dropped instead of
+                         delaying the reports that follow it. Commands and
+                         the replies to requests remain on the tcp/ip
+                         connection.
+
+        :param tcp_nodelay: If True, Nagle's algorithm is disabled on the
+                            tcp/ip connection, so that each small command
+                            is sent immediately instead of being held back
+                            until earlier data is acknowledged.
+
+        :param tcp_receive_buffer_size: Size in bytes requested for the tcp/ip
+                                        socket receive buffer. None keeps the
+                                        operating system default.
+
+        :param tcp_send_buffer_size: Size in bytes requested for the tcp/ip
+                                     socket send buffer. None keeps the
+                                     operating system default.
+
+        :param tcp_keepalive: Seconds that the tcp/ip connection may be idle
+                              before keepalive probes are sent, so that a
+                              server that disappears without closing the
+                              connection is detected. None disables
+                              keepalive.
+
+        :param tcp_connect_timeout: Seconds to wait for the tcp/ip connection
+                                    to be established.
+
+        The connection is established by awaiting start_aio.
+        """
+        # The threads created by Telemetrix are not used, so
+        # its constructor is intentionally not called. The Thread base
+        # is still initialized, since its methods, such as __repr__,
+        # depend on it.
+        threading.Thread.__init__(self, daemon=True)
+
+        self.serial_port_register = TelemetrixPortRegister()
+
+        self.com_port = com_port
+        self.arduino_instance_id = arduino_instance_id
+        self.arduino_wait = arduino_wait
+        self.shutdown_on_exception = shutdown_on_exception
+        self.handshake_timeout = handshake_timeout
+        self.handshake_retries = handshake_retries
+        self.reset_on_connect = reset_on_connect
+        self.baud_rate = baud_rate
+        self.negotiated_baud_rate = negotiated_baud_rate
+        self.tcp_nodelay = tcp_nodelay
+        self.tcp_receive_buffer_size = tcp_receive_buffer_size
+        self.tcp_send_buffer_size = tcp_send_buffer_size
+        self.tcp_keepalive = tcp_keepalive
+        self.tcp_connect_timeout = tcp_connect_timeout
+
+        # a lost connection is reported through connection_lost
+        self.auto_reconnect = False
+
+        self.discovery_cache = None
+        if discovery_cache and not com_port and not ip_address and \
+                not ble_address:
+            self.discovery_cache = TelemetrixDiscoveryCache(discovery_cache)
+
+        # the list_ports entries of the ports probed by _find_arduino
+        # and the arduino ids they reported
+        self.probed_ports = {}
+        self.probed_ids = {}
+        self.ip_address = ip_address
+        self.ip_port = ip_port
+        self.ble_address = ble_address
+        self.ble_client_class = ble_client_class
+
+        self.udp_port = udp_port
+        if self.udp_port is not None and not self.ip_address:
+            raise RuntimeError('udp_port may only be used with an ip_address')
+
+        # the asyncio transport that udp reports are received on
+        self.udp_transport = None
+
+        # the event loop is captured by start_aio
+        self.loop = None
+
+        # a TelemetrixAIOSerial instance, a TelemetrixBleTransport
+        # instance or an asyncio transport
+        self.transport = None
+
+        # resolved when the transport has been closed
+        self.transport_closed = None
+
+        # created by start_aio. Set to the exception if the connection
+        # to the server is lost, or to None by shutdown.
+        self.connection_failed = None
+
+        # reports are dispatched by the event loop as soon as they are framed
+        self.report_framer = TelemetrixReportFramer(self._dispatch_report)
+        self.udp_framer = TelemetrixReportFramer(self._dispatch_report)
+
+        # references to running coroutine callbacks
+        self.callback_tasks = set()
+
+        # commands waiting for the scheduled coalesced write
+        self.write_coalesce_interval = write_coalesce_interval
+        self.coalesced_writes = bytearray()
+        self.write_flush_handle = None
+
+        # the scheduled call of the rate limited callbacks that are due
+        self.rate_limit_flush_handle = None
+
+        self._init_client_state()
+
+    async def start_aio(self):
+        """
+        Connect to the server and initialize it.
+        This must be awaited before any other method is called.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.transport_closed = self.loop.create_future()
+        self.connection_failed = self.loop.create_future()
+
+        print(f"TelemetrixAIO:  Version {PrivateConstants.TELEMETRIX_VERSION}\n\n"
+              f"Copyright (c) 2021-2025 Alan Yorinks All Rights Reserved.\n")
+
+        if self.ble_address:
+            transport = TelemetrixBleTransport(self.ble_address, self._receive_data,
+                                               client_class=self.ble_client_class)
+            try:
+                await transport.connect(PrivateConstants.BLE_CONNECT_TIMEOUT)
+            except Exception as e:
+                await transport.disconnect()
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Could not connect to {self.ble_address}: {e}')
+            transport.connection_lost_handler = self._connection_lost
+            self.transport = transport
+            print(f'Successfully connected to: {self.ble_address}')
+
+        # using the serial link
+        elif not self.ip_address:
+            if not self.com_port:
+                # user did not specify a com_port
+                await self._find_arduino()
+            else:
+                # com_port specified - set com_port and baud rate
+                await self._manual_open()
+
+            print(f"Arduino compatible device found and connected to "
+                  f"{self.serial_port.port}")
+            self.serial_port_register.add(self.serial_port)
+        else:
+            sock = self._create_tcp_socket()
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(
+                    self.loop.sock_connect(sock, (self.ip_address, self.ip_port)),
+                    self.tcp_connect_timeout)
+                self.transport, _ = await self.loop.create_connection(
+                    lambda: TelemetrixAIOProtocol(self._receive_data,
+                                                  self._connection_lost),
+                    sock=sock)
+                if not self.tcp_nodelay:
+                    # asyncio enables TCP_NODELAY on every connection
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+            except (OSError, asyncio.TimeoutError):
+                sock.close()
+                if self.shutdown_on_exception:
+                    self.shutdown()
+                raise RuntimeError(f'Could not connect to '
+                                   f'{self.ip_address}:{self.ip_port}')
+            print(f'Successfully connected to: {self.ip_address}:{self.ip_port}')
+
+            if self.udp_port is not None:
+                # bound to the local address of the tcp/ip connection
+                local_address = self.transport.get_extra_info('sockname')[0]
+                self.udp_transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: TelemetrixAIODatagramProtocol(self._receive_datagram),
+                    local_addr=(local_address, self.udp_port))
+
+        # get telemetrix firmware version and print it
+        print('\nRetrieving Telemetrix4Arduino firmware ID...')
+        await self._get_firmware_version()
+        if not self.firmware_version:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError('Could not retrieve the Telemetrix4Arduino firmware version')
+
+        print(f'Telemetrix4Arduino firmware version: {self.firmware_version[0]}.'
+              f'{self.firmware_version[1]}.{self.firmware_version[2]}')
+
+        if self.discovery_cache:
+            self._update_discovery_cache()
+
+        if self.serial_port and self.negotiated_baud_rate:
+            await self._negotiate_baud_rate()
+
+        command = [PrivateConstants.ENABLE_ALL_REPORTS]
+        self._send_command(command)
+
+        # get the features list
+        command = [PrivateConstants.GET_FEATURES]
+        await self._handshake(command, (PrivateConstants.FEATURES,))
+
+        # Have the server reset its data structures, and wait for a
+        # loop back to confirm that the reset has been processed
+        command = [PrivateConstants.RESET]
+        self._send_command(command)
+        command = [PrivateConstants.LOOP_COMMAND, 0]
+        await self._handshake(command, (PrivateConstants.LOOP_COMMAND,))
+
+        if self.udp_transport:
+            self._enable_udp_reports(self.udp_transport.get_extra_info('sockname')[1])
+
+    async def _find_arduino(self):
+        """
+        This method will search all potential serial ports for an Arduino
+        containing a sketch that has a matching arduino_instance_id as
+        specified in the input parameters of this class.
+
+        All ports are probed concurrently, and the search ends as soon
+        as a matching board replies. If a discovery cache is in use, the
+        port the board was last found on is probed first.
+        """
+        print('Opening all potential serial ports...')
+
+        registered_ports = list(map(lambda p: p.port, self.serial_port_register.active))
+        self.probed_ports = {port.device: port for port in list_ports.comports()
+                             if port.pid is not None and
+                             port.device not in registered_ports}
+        devices = list(self.probed_ports)
+
+        print(f'\nWaiting up to {self.arduino_wait} seconds(arduino_wait) for '
+              f'Arduino devices to reset...')
+
+        transport = None
+        if self.discovery_cache:
+            cached = [device for device in devices if self.discovery_cache.lookup(
+                self.probed_ports[device]) == self.arduino_instance_id]
+            transport = await self._probe_ports(cached)
+            if not transport:
+                devices = [device for device in devices if device not in cached]
+
+        if not transport:
+            transport = await self._probe_ports(devices)
+
+        if not transport:
+            if self.discovery_cache:
+                self._update_discovery_cache()
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError(f'No Arduino with an ID of {self.arduino_instance_id} '
+                               f'was found')
+
+        print('Valid Arduino ID Found.')
+        self.reported_arduino_id = self.arduino_instance_id
+        self._attach_serial(transport)
+
+    async def _probe_ports(self, devices):
+        """
+        Probe serial ports concurrently.
+
+        :param devices: list of serial port device names
+
+        :return: TelemetrixAIOSerial instance of the matching board, or None
+        """
+        probes = [asyncio.ensure_future(self._probe_port(device))
+                  for device in devices]
+        transport = None
+        try:
+            for probe in asyncio.as_completed(probes):
+                transport = await probe
+                if transport:
+                    break
+        finally:
+            # the remaining probes close their ports when cancelled
+            for probe in probes:
+                probe.cancel()
+        return transport
+
+    async def _probe_port(self, device):
+        """
+        Open a serial port and check whether the connected board has a
+        matching arduino_instance_id.
+
+        :param device: serial port device name
+
+        :return: TelemetrixAIOSerial instance if the board matches,
+                 otherwise None
+        """
+        reply = self.loop.create_future()
+
+        def frame_handler(frame):
+            if frame[0] == PrivateConstants.I_AM_HERE_REPORT and not reply.done():
+                reply.set_result(frame[1])
+
+        framer = TelemetrixReportFramer(frame_handler)
+
+        def data_handler(data):
+            # boot messages from non-telemetrix devices are discarded
+            try:
+                framer.feed(data)
+            except RuntimeError:
+                framer.reset()
+
+        try:
+            transport = TelemetrixAIOSerial(device, self.loop, data_handler,
+                                            reset_on_connect=self.reset_on_connect,
+                                            baud_rate=self.baud_rate)
+        except SerialException:
+            return None
+
+        print('\t' + device)
+
+        try:
+            arduino_id = await self._wait_for_arduino_id(transport, reply)
+        except asyncio.CancelledError:
+            transport.close()
+            raise
+        self.probed_ids[device] = arduino_id
+
+        if arduino_id != self.arduino_instance_id:
+            transport.close()
+            return None
+        return transport
+
+    async def _manual_open(self):
+        """
+        Com port was specified by the user - try to open up that port
+        """
+        print(f'Opening {self.com_port}...')
+        print(f'\nWaiting up to {self.arduino_wait} seconds(arduino_wait) for '
+              f'Arduino devices to reset...')
+        transport = await self._probe_port(self.com_port)
+
+        if not transport:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise RuntimeError(f'No Arduino with an ID of {self.arduino_instance_id} '
+                               f'was found on {self.com_port}')
+
+        print('Valid Arduino ID Found.')
+        self.reported_arduino_id = self.arduino_instance_id
+        self._attach_serial(transport)
+
+    def _attach_serial(self, transport):
+        """
+        Route data received by a serial transport to this instance.
+
+        :param transport: TelemetrixAIOSerial instance
+        """
+        transport.data_handler = self._receive_data
+        transport.connection_lost_handler = self._connection_lost
+        self.transport = transport
+        self.serial_port = transport.serial_port
+
+    async def _wait_for_arduino_id(self, transport, reply):
+        """
+        Send ARE_U_THERE until the board replies or arduino_wait seconds
+        have passed. The request is repeated every handshake_timeout
+        seconds, so a board that is still resetting is answered as soon
+        as it is ready.
+
+        :param transport: TelemetrixAIOSerial instance
+
+        :param reply: future resolved with the reported arduino id
+
+        :return: the reported arduino id, or None
+        """
+        deadline = self.loop.time() + self.arduino_wait + self.handshake_timeout
+        while self.loop.time() < deadline:
+            transport.write(bytes([1, PrivateConstants.ARE_U_THERE]))
+            try:
+                return await asyncio.wait_for(asyncio.shield(reply),
+                                              self.handshake_timeout)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+    async def _negotiate_baud_rate(self):
+        """
+        Ask the server to switch to negotiated_baud_rate.
+
+        The server acknowledges the request at the current rate and then
+        switches. The switch is confirmed with a loop back at the new
+        rate. If the confirmation is not received, the client returns
+        to baud_rate and waits for the server, which also reverts when
+        it does not receive a command at the new rate.
+        """
+        rate = self.negotiated_baud_rate
+        command = [PrivateConstants.SET_BAUD_RATE, (rate >> 24) & 0xff,
+                   (rate >> 16) & 0xff, (rate >> 8) & 0xff, rate & 0xff]
+        reply = await self._handshake(command, (PrivateConstants.BAUD_RATE_REPORT,))
+        if not reply or not reply[0]:
+            print(f'The server did not accept a baud rate of {rate}')
+            return
+
+        self.serial_port.flush()
+        self.serial_port.baudrate = rate
+
+        command = [PrivateConstants.LOOP_COMMAND, 0]
+        if await self._handshake(command, (PrivateConstants.LOOP_COMMAND,)) is not None:
+            print(f'Baud rate set to {rate}')
+            return
+
+        print(f'A baud rate of {rate} could not be confirmed. '
+              f'Continuing at {self.baud_rate}')
+        self.serial_port.baudrate = self.baud_rate
+        self.report_framer.reset()
+        command = [PrivateConstants.ARE_U_THERE]
+        await self._handshake(command, (PrivateConstants.I_AM_HERE_REPORT,))
+
+    async def _get_firmware_version(self):
+        """
+        This method retrieves the
+        arduino-telemetrix firmware version
+
+        """
+        command = [PrivateConstants.GET_FIRMWARE_VERSION]
+        await self._handshake(command, (PrivateConstants.FIRMWARE_REPORT,))
+
+    async def _handshake(self, command, key):
+        """
+        Send a startup request and wait for its reply. The request is
+        repeated up to handshake_retries times if no reply arrives
+        within handshake_timeout seconds.
+
+        :param command: command data in the form of a list
+
+        :param key: tuple identifying the answering report
+
+        :return: reply data list, or None if the server did not reply
+        """
+        for attempt in range(self.handshake_retries + 1):
+            future = self._add_pending_request(key)
+            self._send_command(list(command))
+            try:
+                return await asyncio.wait_for(future, self.handshake_timeout)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+    def shutdown(self):
+        """
+        This method attempts an orderly shutdown.
+        If any exceptions are thrown, they are ignored.
+
+        It may be called directly or awaited. When awaited, it
+        returns once the transport has been closed.
+
+        :return: a future that is done once the transport has been closed
+        """
+        if not self.shutdown_flag:
+            self.shutdown_flag = True
+
+            # nothing more will be received
+            self._cancel_pending_requests()
+            if self.connection_failed and not self.connection_failed.done():
+                self.connection_failed.set_result(None)
+
+            for executor in set(self.callback_executors.values()):
+                if executor:
+                    executor.shutdown()
+
+            if self.rate_limit_flush_handle:
+                self.rate_limit_flush_handle.cancel()
+                self.rate_limit_flush_handle = None
+
+            try:
+                # write any coalesced commands and send the rest directly
+                self.write_coalesce_interval = 0
+                self._flush_writes()
+
+                command = [PrivateConstants.STOP_ALL_REPORTS]
+                self._send_command(command)
+            except Exception:
+                pass
+
+            if self.transport:
+                self.transport.close()
+            else:
+                # the connection was never made, so there is nothing to close
+                self._transport_closed()
+
+            if self.udp_transport:
+                self.udp_transport.close()
+
+            if self.serial_port:
+                try:
+                    self.serial_port_register.remove(self.serial_port)
+                except ValueError:
+                    pass
+                # the serial transport closes synchronously
+                self._transport_closed()
+
+        if self.transport_closed is None:
+            # start_aio was never awaited, so there is nothing to wait for
+            try:
+                loop = asyncio.get_running_loop()
+                self.transport_closed = loop.create_future()
+            except RuntimeError:
+                # no event loop is running. A future that is already
+                # done may be awaited on any loop.
+                loop = asyncio.new_event_loop()
+                self.transport_closed = loop.create_future()
+                loop.close()
+            self.transport_closed.set_result(None)
+        return self.transport_closed
+
+    def _transport_closed(self):
+        if self.transport_closed and not self.transport_closed.done():
+            self.transport_closed.set_result(None)
+
+    def _connection_lost(self, exc):
+        """
+        Called by the transport when the connection is closed.
+
+        An exception raised here would only reach the event loop's
+        exception handler, so an unexpected loss is reported by failing
+        the pending requests and connection_failed, and by raising it
+        from any further command.
+
+        :param exc: exception causing the loss, or None for an orderly close
+        """
+        self._transport_closed()
+        if self.shutdown_flag:
+            return
+        self.transport = None
+        self.connection_error = RuntimeError(
+            f'The connection to the server was lost: {exc or "closed by the server"}')
+        self._cancel_pending_requests(self.connection_error)
+        if not self.connection_failed.done():
+            self.connection_failed.set_exception(self.connection_error)
+        if self.shutdown_on_exception:
+            self.shutdown()
+
+    def get_report_queue_metrics(self):
+        """
+        Reports are processed by the event loop as they are received,
+        so there is no report queue.
+
+        :return: None
+        """
+        return None
+
+    def _new_request_future(self):
+        """
+        Create the future returned by a request method.
+
+        :return: asyncio.Future that may be awaited
+        """
+        return self.loop.create_future()
+
+    def _receive_data(self, data):
+        """
+        Pass received data to the report framer.
+
+        :param data: bytes-like object containing received data
+        """
+        try:
+            self.report_framer.feed(data)
+        except RuntimeError:
+            if self.shutdown_on_exception:
+                self.shutdown()
+            raise
+
+    def _invoke_callback(self, callback, data):
+        """
+        Call a user callback with report data. If the callback is a
+        coroutine function, it is scheduled as a task on the event loop.
+        Other callbacks follow the callback policy set for the report.
+
+        :param callback: user callback function or coroutine function
+
+        :param data: callback data list
+        """
+        if not asyncio.iscoroutinefunction(callback):
+            executor = self._callback_executor()
+            if executor:
+                executor.submit(callback, data)
+                return
+
+        result = callback(data)
+        if asyncio.iscoroutine(result):
+            task = self.loop.create_task(result)
+            self.callback_tasks.add(task)
+            task.add_done_callback(self.callback_tasks.discard)
+
+    def _rate_limit_deadline_changed(self):
+        """
+        Schedule a call of the rate limited callbacks for when the first
+        of them is due.
+        """
+        if self.rate_limit_flush_handle:
+            self.rate_limit_flush_handle.cancel()
+        self.rate_limit_flush_handle = self.loop.call_later(
+            self._rate_limit_timeout(), self._flush_rate_limited_callbacks)
+
+    def _flush_rate_limited_callbacks(self):
+        """
+        Call the rate limited callbacks that are due, and schedule the
+        next call if others are still waiting.
+        """
+        self.rate_limit_flush_handle = None
+        if self.shutdown_flag:
+            return
+        super()._flush_rate_limited_callbacks()
+        if self.rate_limit_deadline is not None:
+            self._rate_limit_deadline_changed()
+
+    def _queue_write(self, send_message):
+        """
+        Write one or more encoded commands, or hold them for a single
+        write scheduled write_coalesce_interval seconds from now.
+
+        :param send_message: command frames as bytes
+        """
+        if self.write_coalesce_interval:
+            self.coalesced_writes += send_message
+            if not self.write_flush_handle:
+                self.write_flush_handle = self.loop.call_later(
+                    self.write_coalesce_interval, self._flush_writes)
+        else:
+            self._write(send_message)
+
+    def _flush_writes(self):
+        """
+        Write all coalesced commands in a single transport write.
+        """
+        if self.write_flush_handle:
+            self.write_flush_handle.cancel()
+            self.write_flush_handle = None
+        if self.coalesced_writes:
+            send_message = bytes(self.coalesced_writes)
+            self.coalesced_writes.clear()
+            self._write(send_message)
+
+    def _write(self, send_message):
+        """
+        Queue encoded commands on the transport in use.
+
+        :param send_message: command frames as bytes
+        """
+        self.transport_writes += 1
+        if not self.transport:
+            raise RuntimeError('No serial port or ip address set.')
+        self.transport.write(send_message)
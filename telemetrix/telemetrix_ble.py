@@ -0,0 +1,173 @@
+"""
+ Copyright (c) 2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import asyncio
+
+# noinspection PyUnresolvedReferences
+from telemetrix.private_constants import PrivateConstants
+
+
+class TelemetrixBleTransport:
+    """
+    This class carries the telemetrix byte stream over a Bluetooth LE
+    Nordic UART style service, using a bleak client.
+
+    Commands are written to the RX characteristic and reports are
+    received as notifications of the TX characteristic. Each
+    notification may contain several report frames, and a frame may
+    span notifications, so received data is passed to the report
+    framer exactly like serial or tcp/ip data.
+
+    Writes never block. Commands written while a packet is in flight
+    are batched into the next packet, and packets are written without
+    response, each filling as much of the negotiated MTU as possible.
+
+    All methods must be called on the event loop that the client
+    runs on.
+    """
+
+    def __init__(self, address, data_handler, connection_lost_handler=None,
+                 client_class=None):
+        """
+
+        :param address: Bluetooth address of the board, or its identifier
+                        on platforms that do not expose addresses.
+
+        :param data_handler: called with each chunk of received bytes
+
+        :param connection_lost_handler: called with the exception, or None,
+                                        when the connection is closed
+
+        :param client_class: bleak.BleakClient compatible class. Allows a
+                             local fake transport to be used for testing.
+                             Defaults to bleak.BleakClient.
+        """
+        if client_class is None:
+            # bleak is only imported when a BLE board is used
+            from bleak import BleakClient
+            client_class = BleakClient
+
+        self.address = address
+        self.data_handler = data_handler
+        self.connection_lost_handler = connection_lost_handler
+
+        self.client = client_class(address,
+                                   disconnected_callback=self._disconnected)
+
+        # bytes waiting to be written
+        self.write_buffer = bytearray()
+
+        # the task writing the contents of write_buffer
+        self.writer = None
+
+        # payload size of a write without response
+        self.packet_size = PrivateConstants.BLE_MINIMUM_PACKET_SIZE
+
+        self.closed = False
+
+        # number of packets written and notifications received
+        self.packets_written = 0
+        self.notifications_received = 0
+
+    async def connect(self, timeout):
+        """
+        Connect to the board and subscribe to its notifications.
+
+        :param timeout: seconds to wait for the connection
+        """
+        await asyncio.wait_for(self.client.connect(), timeout)
+
+        # the ATT header takes 3 bytes of each packet
+        mtu_size = getattr(self.client, 'mtu_size', None)
+        if mtu_size:
+            self.packet_size = max(self.packet_size, mtu_size - 3)
+
+        await self.client.start_notify(PrivateConstants.BLE_TX_CHARACTERISTIC_UUID,
+                                       self._notification)
+
+    def write(self, data):
+        """
+        Queue data to be written to the board.
+
+        :param data: bytes to write
+        """
+        if self.closed:
+            raise RuntimeError('write to a closed BLE connection')
+
+        self.write_buffer += data
+        if not self.writer:
+            self.writer = asyncio.ensure_future(self._write_packets())
+
+    def close(self):
+        """
+        Start disconnecting. connection_lost_handler is called with None
+        once the connection has been closed.
+
+        :return: the task that disconnects
+        """
+        return asyncio.ensure_future(self.disconnect())
+
+    async def disconnect(self):
+        """
+        Write any buffered data and disconnect.
+        """
+        if self.closed:
+            return
+        if self.writer:
+            try:
+                await self.writer
+            except Exception:
+                pass
+        self.closed = True
+        try:
+            await self.client.disconnect()
+        except Exception:
+            pass
+        self._connection_lost(None)
+
+    async def _write_packets(self):
+        try:
+            while self.write_buffer:
+                packet = bytes(self.write_buffer[:self.packet_size])
+                del self.write_buffer[:self.packet_size]
+                await self.client.write_gatt_char(
+                    PrivateConstants.BLE_RX_CHARACTERISTIC_UUID, packet,
+                    response=False)
+                self.packets_written += 1
+        except Exception as e:
+            self.write_buffer.clear()
+            self._connection_lost(e)
+        finally:
+            self.writer = None
+
+    def _notification(self, _sender, data):
+        self.notifications_received += 1
+        self.data_handler(data)
+
+    def _disconnected(self, _client):
+        # an intentional disconnect is reported by close
+        if not self.closed:
+            self._connection_lost(ConnectionError(f'{self.address} disconnected'))
+
+    def _connection_lost(self, exc):
+        if self.connection_lost_handler is None:
+            return
+        self.closed = True
+        handler = self.connection_lost_handler
+        # report the loss only once
+        self.connection_lost_handler = None
+        handler(exc)
@@ -0,0 +1,435 @@
+"""
+ Copyright (c) 2015-2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import concurrent.futures
+import os
+import queue
+import selectors
+import socket
+import sys
+import threading
+import traceback
+
+from serial.serialutil import SerialException
+
+from telemetrix.private_constants import PrivateConstants
+from telemetrix.telemetrix import Telemetrix
+
+
+class TelemetrixFleet:
+    """
+    This class manages a group of boards that share a single receive
+    thread and a small pool of dispatch threads, instead of each board
+    running a receive thread and a reporter thread of its own.
+
+    The receive thread waits on the serial ports and sockets of all of
+    the boards with a selector. Each board is assigned to one dispatch
+    thread, so its reports are still processed in the order received.
+
+    Boards are added with add_board, which returns a Telemetrix
+    instance that is used exactly like a stand-alone one.
+
+    Callbacks run on a dispatch thread that may be shared with other
+    boards, so they should not wait for the reply to a request.
+
+    Serial ports cannot be waited on by a selector on Windows, so only
+    network boards may be added there.
+    """
+
+    def __init__(self, dispatch_threads=1):
+        """
+
+        :param dispatch_threads: Number of threads that process the reports
+                                 of the boards and run their callbacks.
+        """
+        if dispatch_threads < 1:
+            raise RuntimeError('dispatch_threads must be at least 1')
+
+        # the boards that have been added to the fleet
+        self.boards = []
+
+        # the board being constructed by add_board in each thread
+        self.adding = threading.local()
+
+        self.selector = selectors.DefaultSelector()
+
+        # written to by other threads to wake the receive thread so that
+        # it applies pending registration changes
+        self.wakeup_receive, self.wakeup_send = socket.socketpair()
+        self.wakeup_receive.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_receive, selectors.EVENT_READ)
+
+        # registration changes for the receive thread to apply
+        self.registration_changes = queue.SimpleQueue()
+
+        # the port or socket registered with the selector for each board
+        # that is being received from. Only used by the receive thread.
+        self.registered = {}
+
+        self.receive_buffer = bytearray(PrivateConstants.TCP_RECEIVE_BUFFER_SIZE)
+
+        self.shutdown_flag = False
+
+        # one queue of (board, report frame) pairs and one list of
+        # boards for each dispatch thread
+        self.dispatch_queues = []
+        self.dispatch_boards = []
+        self.dispatch_threads = []
+        for _ in range(dispatch_threads):
+            dispatch_queue = queue.SimpleQueue()
+            dispatch_boards = []
+            dispatch_thread = threading.Thread(target=self._dispatcher,
+                                               args=(dispatch_queue,
+                                                     dispatch_boards))
+            dispatch_thread.daemon = True
+            self.dispatch_queues.append(dispatch_queue)
+            self.dispatch_boards.append(dispatch_boards)
+            self.dispatch_threads.append(dispatch_thread)
+
+        self.the_receive_thread = threading.Thread(target=self._receiver)
+        self.the_receive_thread.daemon = True
+
+        for dispatch_thread in self.dispatch_threads:
+            dispatch_thread.start()
+        self.the_receive_thread.start()
+
+    def add_board(self, **kwargs):
+        """
+        Connect to a board and add it to the fleet.
+
+        :param kwargs: Telemetrix parameters, such as com_port,
+                       arduino_instance_id or ip_address.
+
+        :return: The Telemetrix instance for the board.
+        """
+        if self.shutdown_flag:
+            raise RuntimeError('The fleet has been shut down')
+        if kwargs.get('ble_address'):
+            raise RuntimeError('Bluetooth LE boards cannot be added to a fleet')
+        if sys.platform.startswith('win32') and not kwargs.get('ip_address'):
+            raise RuntimeError('Serial boards are not supported by a fleet on Windows')
+
+        self.adding.board = None
+        try:
+            return Telemetrix(fleet=self, **kwargs)
+        except BaseException:
+            # the board could not be connected, so remove what was added
+            if self.adding.board:
+                self._detach(self.adding.board)
+            raise
+        finally:
+            self.adding.board = None
+
+    def shutdown(self):
+        """
+        Shut down all of the boards, then stop the fleet's threads.
+        """
+        for board in list(self.boards):
+            if not board.shutdown_flag:
+                board.shutdown()
+
+        self.shutdown_flag = True
+        self._wake_receiver()
+        for dispatch_queue in self.dispatch_queues:
+            dispatch_queue.put(None)
+        self.the_receive_thread.join(1)
+
+        self.selector.close()
+        self.wakeup_receive.close()
+        self.wakeup_send.close()
+
+    def _attach(self, board):
+        """
+        Add a board that is being constructed to the fleet.
+
+        :param board: Telemetrix instance
+
+        :return: the receive thread, the board's dispatch thread and the
+                 handler for the board's report frames
+        """
+        index = len(self.boards) % len(self.dispatch_queues)
+        self.boards.append(board)
+        self.dispatch_boards[index].append(board)
+        self.adding.board = board
+        dispatch_queue = self.dispatch_queues[index]
+
+        def frame_handler(frame):
+            dispatch_queue.put((board, frame))
+
+        return self.the_receive_thread, self.dispatch_threads[index], frame_handler
+
+    def _detach(self, board):
+        """
+        Remove a board whose construction failed from the fleet.
+
+        :param board: Telemetrix instance
+        """
+        if not board.shutdown_flag:
+            try:
+                board.shutdown()
+            except Exception:
+                pass
+        self._unregister(board)
+
+        if board in self.boards:
+            self.boards.remove(board)
+        for dispatch_boards in self.dispatch_boards:
+            if board in dispatch_boards:
+                dispatch_boards.remove(board)
+
+    def _register(self, board):
+        """
+        Start receiving data for a board.
+
+        :param board: Telemetrix instance
+        """
+        self._change_registration(board, True)
+
+    def _unregister(self, board):
+        """
+        Stop receiving data for a board. When this returns, the receive
+        thread no longer reads from the board's port or socket.
+
+        :param board: Telemetrix instance
+        """
+        self._change_registration(board, False)
+
+    def _change_registration(self, board, register):
+        """
+        Registration changes are applied by the receive thread, which
+        owns the selector.
+
+        :param board: Telemetrix instance
+
+        :param register: True to register the board, False to unregister it
+        """
+        if threading.current_thread() is self.the_receive_thread:
+            self._apply_registration(board, register)
+            return
+        if self.shutdown_flag:
+            return
+        applied = concurrent.futures.Future()
+        self.registration_changes.put((board, register, applied))
+        self._wake_receiver()
+        try:
+            # an error applying the change is raised here
+            applied.result(1)
+        except concurrent.futures.TimeoutError:
+            pass
+
+    def _apply_registration(self, board, register):
+        """
+        A board is registered once, each time it starts receiving.
+        Unregistering a board that is not registered does nothing, since
+        a connection failure and the shutdown it leads to both stop
+        receiving for the board.
+
+        :param board: Telemetrix instance
+
+        :param register: True to register the board, False to unregister it
+        """
+        if register:
+            if board.ip_address:
+                file_object = board.sock
+            else:
+                file_object = board.serial_port
+            self.selector.register(file_object, selectors.EVENT_READ, board)
+            self.registered[board] = file_object
+        elif board in self.registered:
+            # the port or socket that was registered, which may since
+            # have been replaced by a reconnection
+            self.selector.unregister(self.registered.pop(board))
+
+    def _wake_receiver(self):
+        try:
+            self.wakeup_send.send(b'\x00')
+        except OSError:
+            # the wakeup socket is full, so a wakeup is already pending
+            pass
+
+    def _connection_failed(self, board, reason):
+        """
+        Handle a read error or a closed connection for a board.
+
+        :param board: Telemetrix instance
+
+        :param reason: the exception or description of the failure
+        """
+        self._apply_registration(board, False)
+        if board.shutdown_flag:
+            return
+
+        if board.auto_reconnect:
+            # reconnecting may take a while, so it is done on a separate
+            # thread while the other boards continue to be serviced
+            reconnect_thread = threading.Thread(target=self._reconnect,
+                                                args=(board, reason))
+            reconnect_thread.daemon = True
+            reconnect_thread.start()
+            return
+
+        if board.shutdown_on_exception:
+            board.shutdown()
+        print(f'Board {board.arduino_instance_id} connection failed: {reason}')
+
+    def _stream_failed(self, board, reason):
+        """
+        Handle a corrupted report stream for a board. The board has
+        already been shut down if shutdown_on_exception is set.
+
+        :param board: Telemetrix instance
+
+        :param reason: the exception raised by the report framer
+        """
+        if board.shutdown_flag:
+            self._apply_registration(board, False)
+            print(f'Board {board.arduino_instance_id} connection failed: {reason}')
+        else:
+            self._connection_failed(board, reason)
+
+    def _reconnect(self, board, reason):
+        """
+        :param board: Telemetrix instance
+
+        :param reason: the exception or description of the failure
+        """
+        board._reconnect(reason)
+        if not board.shutdown_flag:
+            self._register(board)
+
+    def _receiver(self):
+        """
+        Thread that waits for data from all of the boards and passes it
+        to each board's report framer.
+        """
+        receive_view = memoryview(self.receive_buffer)
+
+        while not self.shutdown_flag:
+            try:
+                events = self.selector.select()
+            except (OSError, ValueError):
+                # the selector was closed during shutdown
+                break
+
+            for key, _ in events:
+                board = key.data
+                if board is None:
+                    # woken by another thread
+                    try:
+                        while self.wakeup_receive.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+
+                try:
+                    if board.ip_address:
+                        number_of_bytes = board.sock.recv_into(self.receive_buffer)
+                        if not number_of_bytes:
+                            self._connection_failed(board, 'closed by the server')
+                            continue
+                    else:
+                        # the port is non-blocking, so this only takes
+                        # what has already arrived
+                        try:
+                            number_of_bytes = os.readv(board.serial_port.fileno(),
+                                                       [self.receive_buffer])
+                        except BlockingIOError:
+                            continue
+                        if not number_of_bytes:
+                            self._connection_failed(board, 'the serial port was closed')
+                            continue
+                    board._receive_data(receive_view[:number_of_bytes])
+                except (OSError, SerialException) as e:
+                    self._connection_failed(board, e)
+                except RuntimeError as e:
+                    self._stream_failed(board, e)
+
+            while not self.registration_changes.empty():
+                board, register, applied = self.registration_changes.get()
+                try:
+                    self._apply_registration(board, register)
+                except (KeyError, ValueError, OSError) as e:
+                    applied.set_exception(e)
+                else:
+                    applied.set_result(None)
+
+        # release anyone waiting for a registration change
+        while not self.registration_changes.empty():
+            self.registration_changes.get()[2].set_result(None)
+
+    def _dispatcher(self, dispatch_queue, dispatch_boards):
+        """
+        Thread that processes the report frames of its boards.
+
+        :param dispatch_queue: queue of (board, report frame) pairs
+
+        :param dispatch_boards: the boards assigned to this thread
+        """
+        while True:
+            # wake up in time for the first rate limited callback due
+            timeout = None
+            for board in dispatch_boards:
+                board_timeout = self._run_board(board, board._rate_limit_timeout)
+                if board_timeout is not None and (timeout is None or
+                                                  board_timeout < timeout):
+                    timeout = board_timeout
+
+            try:
+                item = dispatch_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+
+            if item:
+                board, frame = item
+                if not board.shutdown_flag:
+                    self._run_board(board, board._dispatch_report, frame)
+
+            if timeout is not None:
+                for board in dispatch_boards:
+                    if not board.shutdown_flag and \
+                            self._run_board(board, board._rate_limit_timeout) == 0:
+                        self._run_board(board, board._flush_rate_limited_callbacks)
+
+    @staticmethod
+    def _run_board(board, method, *args):
+        """
+        Run a board method on a dispatch thread.
+
+        :param board: Telemetrix instance
+
+        :param method: the board method to call
+
+        :param args: arguments for the method
+
+        :return: the value returned by the method, or None if it raised
+        """
+        try:
+            return method(*args)
+        except RuntimeError as e:
+            # the board has already been shut down if requested,
+            # keep serving the other boards
+            print(e)
+        except Exception:
+            # a fault in one board must not stop the thread that
+            # serves the others
+            traceback.print_exc()
+        return None
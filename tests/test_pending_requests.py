@@ -0,0 +1,115 @@
+"""
+ Copyright (c) 2015-2025 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+ Matching of server replies to the requests waiting for them.
+ No hardware is needed: commands are captured and replies are
+ passed to the report handlers directly.
+"""
+
+import concurrent.futures
+import time
+import unittest
+from unittest import mock
+
+from telemetrix.private_constants import PrivateConstants
+from telemetrix.telemetrix import Telemetrix
+
+DISTANCE_KEY = (PrivateConstants.STEPPER_DISTANCE_TO_GO, 0)
+RUN_COMPLETE_KEY = (PrivateConstants.STEPPER_RUN_COMPLETE_REPORT, 0)
+
+
+class PendingRequestsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Telemetrix.__new__(Telemetrix)
+        self.board._init_client_state()
+        self.board.auto_reconnect = False
+        self.sent = []
+        self.board._queue_write = self.sent.append
+        self.board.stepper_info_list[0]['instance'] = True
+
+    def distance_reply(self, steps):
+        self.board._stepper_distance_to_go_report(
+            [0] + list(steps.to_bytes(4, byteorder='big', signed=True)))
+
+    def test_lost_reply_then_new_request(self):
+        lost = self.board.stepper_get_distance_to_go(0)
+
+        # the reply to the first request never arrives
+        later = time.monotonic() + PrivateConstants.REQUEST_LIFETIME + 1
+        with mock.patch('time.monotonic', return_value=later):
+            answered = self.board.stepper_get_distance_to_go(0)
+            self.distance_reply(42)
+
+        self.assertEqual(answered.result(timeout=0)[2], 42)
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            lost.result(timeout=0)
+        self.assertNotIn(DISTANCE_KEY, self.board.pending_requests)
+
+    def test_late_reply_answers_the_oldest_request(self):
+        first = self.board.stepper_get_distance_to_go(0)
+        second = self.board.stepper_get_distance_to_go(0)
+        self.distance_reply(1)
+        self.distance_reply(2)
+
+        self.assertEqual(first.result(timeout=0)[2], 1)
+        self.assertEqual(second.result(timeout=0)[2], 2)
+
+    def test_only_request_waits_past_its_lifetime(self):
+        future = self.board.stepper_get_distance_to_go(0)
+
+        later = time.monotonic() + PrivateConstants.REQUEST_LIFETIME + 1
+        with mock.patch('time.monotonic', return_value=later):
+            self.distance_reply(7)
+
+        self.assertEqual(future.result(timeout=0)[2], 7)
+
+    def test_cancelled_request_removes_key(self):
+        future = self.board.stepper_get_distance_to_go(0)
+        self.assertIn(DISTANCE_KEY, self.board.pending_requests)
+
+        future.cancel()
+        self.assertNotIn(DISTANCE_KEY, self.board.pending_requests)
+
+    def test_answered_request_removes_key(self):
+        self.board.stepper_get_distance_to_go(0)
+        self.distance_reply(3)
+        self.assertEqual(self.board.pending_requests, {})
+
+    def test_stop_cancels_run_requests(self):
+        run = self.board.stepper_run(0)
+        self.board.stepper_stop(0)
+
+        self.assertTrue(run.cancelled())
+        self.assertNotIn(RUN_COMPLETE_KEY, self.board.pending_requests)
+
+        # a new run is answered by the next completion report
+        run = self.board.stepper_run(0)
+        self.board._stepper_run_complete_report([0])
+        self.assertEqual(run.result(timeout=0)[1], 0)
+
+    def test_run_completion_answers_every_run_request(self):
+        first = self.board.stepper_run(0)
+        second = self.board.stepper_run_speed_to_position(0)
+        self.board._stepper_run_complete_report([0])
+
+        self.assertTrue(first.done())
+        self.assertTrue(second.done())
+        self.assertEqual(self.board.pending_requests, {})
+
+
+if __name__ == '__main__':
+    unittest.main()